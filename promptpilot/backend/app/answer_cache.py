@@ -0,0 +1,201 @@
+import functools
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Words a question can gain or lose and still ask the same thing. Everything else,
+# negations and numbers included, must match for an answer to be reused
+_FILLER_WORDS = frozenset({"a", "an", "the", "this", "that", "these", "those", "is", "are", "am", "do", "does", "please"})
+
+
+@functools.lru_cache(maxsize=None)
+def _query_vectorizer():
+    # Imported on first use: scikit-learn dominates start-up time otherwise
+    import numpy as np
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    # Character trigrams score "what is the purpose" against "what is not the purpose"
+    # at 0.92, so they only rank questions that already have the same content_terms
+    return HashingVectorizer(
+        n_features=2 ** 18,
+        analyzer='char_wb',
+        ngram_range=(3, 3),
+        alternate_sign=False,
+        norm='l2',
+        dtype=np.float32,
+    )
+
+
+def question_vector(normalized: str):
+    """L2-normalized character-trigram vector of a normalized question (a sparse row)."""
+    return _query_vectorizer().transform([normalized])
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', question.lower()).split())
+
+
+def content_terms(normalized: str) -> FrozenSet[str]:
+    """The words of a normalized question other than fillers and stray letters (the "s" of "what's")."""
+    return frozenset(
+        word for word in normalized.split()
+        if word not in _FILLER_WORDS and (len(word) > 1 or word.isdigit())
+    )
+
+
+@dataclass
+class _Entry:
+    answer: str
+    vector: Any  # sparse row from question_vector
+    terms: FrozenSet[str]
+    context_key: Tuple
+    expires_at: float
+    cost_s: float
+
+
+class AnswerCache:
+    """LRU + TTL cache of generated answers.
+
+    The exact key is (normalized question, collection, retrieved row IDs, index
+    version). On an exact miss, a cached answer for the same retrieved rows is reused
+    when its question has the same content terms as the new one (so "2021" never
+    answers "2022", nor "is" "is not") and their vectors have cosine similarity >=
+    ``similarity_threshold``; a threshold above 1 turns this off. A collection's entries from an older index version are dropped as
+    soon as a newer version of that collection is seen.
+    """
+
+    def __init__(self, max_entries: int, ttl_s: float, similarity_threshold: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        # context key -> exact keys of the entries answered from that context
+        self._by_context: Dict[Tuple, List[Tuple]] = {}
+        self._lock = threading.Lock()
+        self.index_versions: Dict[str, int] = {}
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.latency_saved_s = 0.0
+
+    def get(self, question: str, rows: Sequence[int], index_version: int, collection: str = "") -> Optional[str]:
+        """Return a cached answer for this question and retrieved context, if any."""
+        normalized = normalize_question(question)
+        context_key = (collection, tuple(int(row) for row in rows), index_version)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(collection, index_version)
+            key = (normalized, context_key)
+            entry = self._live(key, now)
+            if entry is not None:
+                self.exact_hits += 1
+            else:
+                entry = self._similar(normalized, context_key, now)
+                if entry is None:
+                    self.misses += 1
+                    return None
+                self.semantic_hits += 1
+            self.latency_saved_s += entry.cost_s
+            return entry.answer
+
+    def put(self, question: str, rows: Sequence[int], index_version: int, answer: str, cost_s: float,
+            collection: str = ""):
+        """Cache an answer; ``cost_s`` is how long it took to generate."""
+        if self.max_entries <= 0:
+            return
+        normalized = normalize_question(question)
+        context_key = (collection, tuple(int(row) for row in rows), index_version)
+        key = (normalized, context_key)
+        entry = _Entry(
+            answer, question_vector(normalized), content_terms(normalized), context_key,
+            time.monotonic() + self.ttl_s, cost_s
+        )
+        with self._lock:
+            self._check_version(collection, index_version)
+            if index_version != self.index_versions[collection]:
+                return  # answered from an index that has since changed
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._by_context.setdefault(context_key, []).append(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "index_versions": dict(self.index_versions),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "latency_saved_s": round(self.latency_saved_s, 3),
+            }
+
+    def _check_version(self, collection: str, index_version: int):
+        current = self.index_versions.get(collection)
+        if current is None or index_version > current:
+            stale = [key for key, entry in self._entries.items() if entry.context_key[0] == collection]
+            if stale:
+                logger.info(f"Index of {collection or 'default'} changed to version {index_version}, dropping {len(stale)} cached answers")
+                self.invalidations += len(stale)
+                for key in stale:
+                    self._remove(key)
+            self.index_versions[collection] = index_version
+
+    def _live(self, key: Tuple, now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _similar(self, normalized: str, context_key: Tuple, now: float) -> Optional[_Entry]:
+        keys = self._by_context.get(context_key)
+        if not keys or self.similarity_threshold > 1:
+            return None
+        terms = content_terms(normalized)
+        vector = None
+        best_key, best_score = None, self.similarity_threshold
+        for key in list(keys):
+            entry = self._live(key, now)
+            if entry is None or entry.terms != terms:
+                continue
+            if vector is None:
+                vector = question_vector(normalized)
+            score = vector.multiply(entry.vector).sum()
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key is None:
+            return None
+        logger.debug("Reusing answer for a similar question (similarity %.3f)", best_score)
+        return self._entries[best_key]
+
+    def _remove(self, key: Tuple):
+        entry = self._entries.pop(key)
+        keys = self._by_context[entry.context_key]
+        keys.remove(key)
+        if not keys:
+            del self._by_context[entry.context_key]
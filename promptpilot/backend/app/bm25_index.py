@@ -0,0 +1,343 @@
+import copy
+import functools
+import itertools
+import json
+import logging
+import math
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from .index_store import (
+    MemoryUsage, TextStore, array_usage, load_array, load_documents, save_array, save_documents, vocabulary_usage
+)
+from .metrics import span
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def _analyzer():
+    return CountVectorizer(stop_words='english').build_analyzer()
+
+
+def _uint32_array(values) -> array:
+    result = array('I')
+    result.frombytes(np.ascontiguousarray(values, dtype=np.uint32).tobytes())
+    return result
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring and MaxScore-style early termination.
+
+    Postings are stored CSR-style: a base of flat ``uint32`` row-ID and term-frequency
+    arrays with a per-term pointer array (memory-mapped when loaded from disk), plus
+    compact ``array('I')`` deltas for rows added since. ``save`` merges the deltas
+    into the base it writes and maps that in their place, so deltas only hold what
+    was added since the last save or load. Both are kept in row order, so
+    a term's postings stay sorted and are read as numpy views without copying. A
+    query only reads the postings of its own terms: they are processed in decreasing
+    order of their score upper bound, and once the remaining terms can no longer lift
+    a new row into the top k they are only probed (by binary search) for the rows
+    already in contention.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.analyzer = _analyzer()
+        self.vocab: Dict[str, int] = {}
+        # (base term pointers, base rows, base tfs, delta rows and delta tfs by term ID), replaced
+        # as a whole when a save maps the merged postings, so searches never see half of the swap
+        self.postings: Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[int, array], Dict[int, array]] = (
+            np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32), {}, {}
+        )
+        self.doc_freq = array('I')
+        self.max_tf = array('I')
+        self.doc_len = array('I')
+        self.total_len = 0
+        self.texts = TextStore()
+        self.doc_rows: Dict[str, Tuple[int, int]] = {}
+        self.alive = bytearray()
+        self.num_live = 0
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[str, str]]) -> "BM25Index":
+        """Build an index from (doc_id, text) pairs."""
+        index = cls()
+        for doc_id, group in itertools.groupby(chunks, key=lambda chunk: chunk[0]):
+            index.add([text for _, text in group], doc_id)
+        return index
+
+    @classmethod
+    def load(cls, directory: Path, manifest: Dict) -> "BM25Index":
+        """Open a saved index; postings and texts stay memory-mapped."""
+        index = cls(k1=manifest["k1"], b=manifest["b"])
+        index.texts = TextStore.load(directory, manifest)
+        index.doc_rows = load_documents(manifest)
+        with open(directory / "vocab.json", 'r') as f:
+            index.vocab = {term: i for i, term in enumerate(json.load(f))}
+        index.postings = (
+            load_array(directory, "term_ptr"), load_array(directory, "post_rows"), load_array(directory, "post_tfs"), {}, {}
+        )
+        index.doc_freq = _uint32_array(load_array(directory, "doc_freq"))
+        index.max_tf = _uint32_array(load_array(directory, "max_tf"))
+        index.doc_len = _uint32_array(load_array(directory, "doc_len"))
+        index.alive = bytearray(load_array(directory, "alive").tobytes())
+        index.total_len = manifest["total_len"]
+        index.num_live = manifest["num_live"]
+        return index
+
+    def save(self, directory: Path) -> Dict:
+        """Merge base and delta postings into CSR arrays, write the index and map them as the new base."""
+        fields = self.texts.save(directory)
+        terms = [None] * len(self.vocab)
+        for term, i in self.vocab.items():
+            terms[i] = term
+        with open(directory / "vocab.json", 'w') as f:
+            json.dump(terms, f)
+
+        ptr, rows, tfs = self._merged_postings()
+        save_array(directory, "term_ptr", ptr)
+        save_array(directory, "post_rows", rows)
+        save_array(directory, "post_tfs", tfs)
+        save_array(directory, "doc_freq", np.frombuffer(self.doc_freq, dtype=np.uint32))
+        save_array(directory, "max_tf", np.frombuffer(self.max_tf, dtype=np.uint32))
+        save_array(directory, "doc_len", np.frombuffer(self.doc_len, dtype=np.uint32))
+        save_array(directory, "alive", np.frombuffer(self.alive, dtype=np.uint8))
+        manifest = {
+            "k1": self.k1,
+            "b": self.b,
+            "total_len": self.total_len,
+            "num_live": self.num_live,
+            "documents": save_documents(self.doc_rows),
+            **fields,
+        }
+        # The mappings outlive the rename of directory and the pruning of its generation
+        self.postings = (
+            load_array(directory, "term_ptr"), load_array(directory, "post_rows"), load_array(directory, "post_tfs"), {}, {}
+        )
+        return manifest
+
+    def _merged_postings(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Base and delta postings as one CSR (term pointers, rows, tfs), each term's rows in order."""
+        base_ptr, base_rows, base_tfs, delta_rows, delta_tfs = self.postings
+        if not delta_rows:
+            return base_ptr, base_rows, base_tfs
+        delta_ids = list(delta_rows)
+        term_ids = np.concatenate([
+            np.repeat(np.arange(len(base_ptr) - 1), np.diff(base_ptr)),
+            np.repeat(delta_ids, [len(delta_rows[term_id]) for term_id in delta_ids]),
+        ])
+        # A stable sort keeps each term's base rows ahead of its delta rows, which come later
+        order = np.argsort(term_ids, kind='stable')
+        ptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.vocab)), out=ptr[1:])
+        rows = np.concatenate([base_rows, *(np.frombuffer(delta_rows[t], dtype=np.uint32) for t in delta_ids)])
+        tfs = np.concatenate([base_tfs, *(np.frombuffer(delta_tfs[t], dtype=np.uint32) for t in delta_ids)])
+        return ptr, rows[order], tfs[order]
+
+    def __len__(self) -> int:
+        return self.num_live
+
+    @staticmethod
+    def prepare(chunks: List[str]) -> List[Dict[str, int]]:
+        """Tokenize chunks into per-chunk term counts.
+
+        Needs no index state, so it can run in another process ahead of add().
+        """
+        analyzer = _analyzer()
+        return [dict(Counter(analyzer(chunk))) for chunk in chunks]
+
+    @staticmethod
+    def concat_prepared(parts: List[List[Dict[str, int]]]) -> List[Dict[str, int]]:
+        """prepare() of several chunk lists, as if they had been prepared as one."""
+        return [counts for part in parts for counts in part]
+
+    def add(self, chunks: List[str], doc_id: str, prepared: Optional[List[Dict[str, int]]] = None):
+        """Append chunks for a new document to the delta postings lists."""
+        if doc_id in self.doc_rows:
+            raise ValueError(f"Document {doc_id} is already indexed")
+        if not chunks:
+            return
+        if prepared is None or len(prepared) != len(chunks):
+            prepared = self.prepare(chunks)
+        start = len(self.texts)
+        _, _, _, delta_rows, delta_tfs = self.postings
+        for row, counts in enumerate(prepared, start):
+            for term, tf in counts.items():
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    term_id = self.vocab[term] = len(self.doc_freq)
+                    self.doc_freq.append(0)
+                    self.max_tf.append(0)
+                if term_id not in delta_rows:
+                    delta_rows[term_id] = array('I')
+                    delta_tfs[term_id] = array('I')
+                delta_rows[term_id].append(row)
+                delta_tfs[term_id].append(tf)
+                self.doc_freq[term_id] += 1
+                if tf > self.max_tf[term_id]:
+                    self.max_tf[term_id] = tf
+            length = sum(counts.values())
+            self.doc_len.append(length)
+            self.total_len += length
+
+        self.texts.extend(chunks)
+        self.alive.extend(b'\x01' * len(chunks))
+        self.doc_rows[doc_id] = (start, len(self.texts))
+        self.num_live += len(chunks)
+
+    def clone(self) -> "BM25Index":
+        """A copy to change off to the side; the memory-mapped base postings are shared."""
+        index = copy.copy(self)
+        index.vocab = dict(self.vocab)
+        base_ptr, base_rows, base_tfs, delta_rows, delta_tfs = self.postings
+        index.postings = (
+            base_ptr, base_rows, base_tfs,
+            {term_id: array('I', rows) for term_id, rows in delta_rows.items()},
+            {term_id: array('I', tfs) for term_id, tfs in delta_tfs.items()},
+        )
+        index.doc_freq = array('I', self.doc_freq)
+        index.max_tf = array('I', self.max_tf)
+        index.doc_len = array('I', self.doc_len)
+        index.texts = self.texts.clone()
+        index.doc_rows = dict(self.doc_rows)
+        index.alive = bytearray(self.alive)
+        return index
+
+    def delete(self, doc_id: str) -> int:
+        """Tombstone every chunk of a document. Returns the number removed."""
+        if doc_id not in self.doc_rows:
+            return 0
+        start, stop = self.doc_rows.pop(doc_id)
+        for row in range(start, stop):
+            for term in set(self.analyzer(self.texts[row])):
+                self.doc_freq[self.vocab[term]] -= 1
+            self.total_len -= self.doc_len[row]
+            self.alive[row] = 0
+        self.texts.delete(start, stop)
+        self.num_live -= stop - start
+        return stop - start
+
+    def documents(self) -> Dict[str, int]:
+        """Map each indexed doc ID to its chunk count."""
+        return {doc_id: stop - start for doc_id, (start, stop) in self.doc_rows.items()}
+
+    def iter_chunks(self) -> Iterator[Tuple[str, str]]:
+        """Yield (doc_id, text) for every live chunk, in row order."""
+        for doc_id, (start, stop) in self.doc_rows.items():
+            for row in range(start, stop):
+                yield doc_id, self.texts[row]
+
+    def get_text(self, row: int) -> Optional[str]:
+        return self.texts[row]
+
+    def memory_usage(self) -> MemoryUsage:
+        """Approximate size of the postings, vocabulary, per-row statistics and texts."""
+        base_ptr, base_rows, base_tfs, delta_rows, delta_tfs = self.postings
+        deltas = sum(p.itemsize * len(p) for p in delta_rows.values())
+        deltas += sum(p.itemsize * len(p) for p in delta_tfs.values())
+        stats = (len(self.doc_freq) + len(self.max_tf) + len(self.doc_len)) * 4 + len(self.alive)
+        usage = array_usage(base_ptr, base_rows, base_tfs) + MemoryUsage(heap=deltas + stats)
+        return usage + vocabulary_usage(self.vocab) + self.texts.memory_usage()
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to k (row, BM25 score) pairs for live rows, best first."""
+        return self._search(query, k, "chat")
+
+    def _search(self, query: str, k: int, pipeline: str) -> List[Tuple[int, float]]:
+        if not self.num_live or k <= 0:
+            return []
+        with span(pipeline, "vectorize"):
+            query_tf = Counter(t for t in self.analyzer(query) if t in self.vocab)
+        if not query_tf:
+            return []
+        with span(pipeline, "score"):
+            cand_rows, cand_scores = self._score(query_tf, k)
+        with span(pipeline, "top_k"):
+            order = np.argsort(-cand_scores, kind='stable')[:k]
+            return [(int(cand_rows[j]), float(cand_scores[j])) for j in order]
+
+    def _score(self, query_tf: Counter, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """MaxScore over the query's postings: candidate rows and scores, a superset of the top k."""
+        n = self.num_live
+        avgdl = self.total_len / n or 1.0
+        k1, b = self.k1, self.b
+        doc_len = np.frombuffer(self.doc_len, dtype=np.uint32)
+        alive = np.frombuffer(self.alive, dtype=np.bool_)
+
+        terms = []
+        for term, qtf in query_tf.items():
+            term_id = self.vocab[term]
+            df = self.doc_freq[term_id]
+            if not df:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            weight = qtf * idf * (k1 + 1)
+            # tf / (tf + K) is increasing in tf and K >= k1 * (1 - b), which bounds the term's contribution
+            max_tf = self.max_tf[term_id]
+            terms.append((weight * max_tf / (max_tf + k1 * (1 - b)), weight, term_id))
+        terms.sort(reverse=True)
+        # remaining[i] is the best score any row can still gain from terms[i:]
+        remaining = np.cumsum([ub for ub, _, _ in terms][::-1])[::-1].tolist() + [0.0]
+
+        cand_rows = np.array([], dtype=np.uint32)
+        cand_scores = np.array([], dtype=np.float64)
+        threshold = -math.inf
+        for i, (_, weight, term_id) in enumerate(terms):
+            rows, tfs = self._postings(term_id)
+            if remaining[i] >= threshold:
+                # Essential term: any row in its postings may still reach the top k
+                keep = alive[rows]
+                rows, tfs = rows[keep], tfs[keep]
+                scores = self._term_scores(weight, tfs, doc_len[rows], avgdl)
+                cand_rows, inverse = np.unique(np.concatenate([cand_rows, rows]), return_inverse=True)
+                cand_scores = np.bincount(
+                    inverse, weights=np.concatenate([cand_scores, scores]), minlength=len(cand_rows)
+                )
+            else:
+                # Non-essential term: only rows already in contention can use it
+                pos = np.searchsorted(rows, cand_rows)
+                pos[pos == len(rows)] = 0
+                hit = rows[pos] == cand_rows
+                if hit.any():
+                    hit_tfs = tfs[pos[hit]]
+                    cand_scores[hit] += self._term_scores(weight, hit_tfs, doc_len[cand_rows[hit]], avgdl)
+
+            if len(cand_scores) >= k:
+                threshold = np.partition(cand_scores, -k)[-k]
+                # Drop rows that cannot reach the current k-th best score any more
+                viable = cand_scores + remaining[i + 1] >= threshold
+                cand_rows, cand_scores = cand_rows[viable], cand_scores[viable]
+
+        return cand_rows, cand_scores
+
+    def search_batch(self, queries: List[str], k: int) -> List[List[Tuple[int, float]]]:
+        """search() for many queries.
+
+        MaxScore pruning already touches only the postings a query needs, which a
+        dense query-by-corpus product would not, so queries are scored one by one.
+        """
+        return [self._search(query, k, "batch") for query in queries]
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return a term's (rows, tfs) postings in row order: base slice then delta."""
+        base_ptr, base_rows, base_tfs, delta_rows, delta_tfs = self.postings
+        if term_id + 1 < len(base_ptr):
+            lo, hi = base_ptr[term_id], base_ptr[term_id + 1]
+            rows, tfs = base_rows[lo:hi], base_tfs[lo:hi]
+        else:
+            rows, tfs = base_rows[:0], base_tfs[:0]
+        if term_id in delta_rows:
+            rows = np.concatenate([rows, np.frombuffer(delta_rows[term_id], dtype=np.uint32)])
+            tfs = np.concatenate([tfs, np.frombuffer(delta_tfs[term_id], dtype=np.uint32)])
+        return rows, tfs
+
+    def _term_scores(self, weight: float, tfs: np.ndarray, lengths: np.ndarray, avgdl: float) -> np.ndarray:
+        tfs = tfs.astype(np.float64)
+        return weight * tfs / (tfs + self.k1 * (1 - self.b + self.b * lengths / avgdl))
@@ -0,0 +1,65 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkCache:
+    """LRU cache of extracted, cleaned chunks, keyed by content hash and chunker settings.
+
+    Size is bounded by the total characters held (about a byte each for typical
+    text); least recently used entries are evicted first.
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._entries: "OrderedDict[Hashable, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(content_hash: str, file_type: str, chunk_size: int, chunk_overlap: int, chunk_unit: str) -> tuple:
+        return (content_hash, file_type, chunk_size, chunk_overlap, chunk_unit)
+
+    def get(self, key: Hashable) -> Optional[List[str]]:
+        with self._lock:
+            chunks = self._entries.get(key)
+            if chunks is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return chunks
+
+    def put(self, key: Hashable, chunks: List[str]):
+        size = sum(len(chunk) for chunk in chunks)
+        if size > self.max_chars:
+            logger.info(f"Not caching {size} characters of chunks, over the {self.max_chars} limit")
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size_chars -= sum(len(chunk) for chunk in self._entries.pop(key))
+            self._entries[key] = chunks
+            self.size_chars += size
+            while self.size_chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_chars -= sum(len(chunk) for chunk in evicted)
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_chars": self.size_chars,
+                "max_chars": self.max_chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,243 @@
+import logging
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from .document_processor import DocumentProcessor
+from .index_store import CURRENT_FILE, MemoryUsage, current_generation, delete_generations, writer_lock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLLECTION = "default"
+_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+
+T = TypeVar("T")
+
+
+class CollectionNotFoundError(KeyError):
+    """Raised for a collection that is neither resident nor saved on disk."""
+
+
+class CollectionManager:
+    """Named document collections, each with its own persisted index.
+
+    The most recently used collections stay resident; once their indexes' combined
+    heap bytes exceed ``memory_budget_bytes`` the least recently used ones are
+    dropped and reloaded from disk on next access. Memory-mapped generation files
+    are reported but not budgeted: the kernel already evicts those pages. Every change goes through
+    ``update``, which saves it before returning, so evicting never loses data. A
+    collection evicted while a request still holds it is picked up again instead of
+    being reloaded.
+
+    Several worker processes can share the same index directory: ``update`` holds a
+    file lock and first loads whatever other workers have published, and ``get``
+    hot-reloads a resident collection when a newer generation appears on disk, or
+    drops it when another worker has deleted the collection.
+    """
+
+    def __init__(self, root: Path, factory: Callable[[], DocumentProcessor], memory_budget_bytes: int,
+                 default_path: Optional[Path] = None):
+        self.root = root
+        self.factory = factory
+        self.memory_budget_bytes = memory_budget_bytes
+        # The default collection keeps the index directory used before collections existed
+        self.default_path = default_path or root / DEFAULT_COLLECTION
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._resident: "OrderedDict[str, DocumentProcessor]" = OrderedDict()
+        self._evicted: "weakref.WeakValueDictionary[str, DocumentProcessor]" = weakref.WeakValueDictionary()
+        # Last (version, generation) seen per collection, so versions keep increasing across reloads
+        self._last_seen: Dict[str, Tuple[int, Optional[Path]]] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.loads = 0
+        self.hot_reloads = 0
+        self.evictions = 0
+        self.load_s_total = 0.0
+        self.load_s_max = 0.0
+        self.last_load_s = 0.0
+
+    @staticmethod
+    def validate_name(name: str) -> str:
+        if not _NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid collection name {name!r}: use up to 64 letters, digits, '-' or '_'")
+        return name
+
+    def path(self, name: str) -> Path:
+        return self.default_path if name == DEFAULT_COLLECTION else self.root / name
+
+    def exists(self, name: str) -> bool:
+        """Whether the collection has a saved index; a resident copy may be one another worker deleted."""
+        return (self.path(name) / CURRENT_FILE).exists()
+
+    def names(self) -> List[str]:
+        """Every collection saved on disk, resident or not."""
+        on_disk = {path.name for path in self.root.iterdir() if (path / CURRENT_FILE).exists()}
+        return sorted(on_disk | {DEFAULT_COLLECTION})
+
+    def get(self, name: str, create: bool = False) -> DocumentProcessor:
+        """Return the collection's processor, loading it from disk if it is not resident.
+
+        Unknown collections raise CollectionNotFoundError unless ``create`` is set
+        (the default collection always exists).
+        """
+        self.validate_name(name)
+        with self._lock:
+            processor = self._resident.get(name)
+            if processor is None:
+                processor = self._evicted.get(name)
+            if processor is not None and self._deleted(name, processor):
+                logger.info(f"Collection {name} was deleted by another process, dropping it")
+                self._forget(name)
+                processor = None
+            if name in self._resident:
+                self._resident.move_to_end(name)
+                self.hits += 1
+            else:
+                self._evicted.pop(name, None)
+                if processor is None:
+                    if not (create or name == DEFAULT_COLLECTION or self.exists(name)):
+                        raise CollectionNotFoundError(name)
+                    processor = self._load(name)
+                self._resident[name] = processor
+                self._evict_over_budget()
+        # Another worker may have changed it; readers keep the old snapshot meanwhile
+        if processor.refresh(self.path(name)):
+            with self._lock:
+                self.hot_reloads += 1
+                self._evict_over_budget()
+        return processor
+
+    def update(self, name: str, change: Callable[[DocumentProcessor], T]) -> Tuple[T, int]:
+        """Apply ``change(processor)`` to a collection and save it, creating the collection if needed.
+
+        Writers are serialized across processes, and each starts from the latest
+        generation on disk so no worker overwrites another's changes. If the
+        collection is deleted meanwhile, the change applies to a new, empty one.
+        Returns the change's result and the version it was saved as, read before
+        any other writer can change it.
+        """
+        path = self.path(name)
+        while True:
+            processor = self.get(name, create=True)
+            with processor.write_lock, writer_lock(path):
+                if self._deleted(name, processor):
+                    # Deleted since get(): saving this processor would bring the deleted documents back
+                    with self._lock:
+                        self._forget(name)
+                    continue
+                processor.refresh(path)
+                try:
+                    result = change(processor)
+                except Exception:
+                    if current_generation(path) is None:
+                        # Nothing was ever saved: don't leave an empty collection behind
+                        with self._lock:
+                            self._forget(name)
+                    raise
+                processor.save_index(path)
+                version = processor.version
+            break
+        with self._lock:
+            self._last_seen[name] = (version, processor.snapshot().source)
+            # The index may have grown past the budget
+            self._evict_over_budget()
+        return result, version
+
+    def delete(self, name: str, on_delete: Optional[Callable[[], None]] = None) -> bool:
+        """Drop a collection and its saved index. Returns False if it did not exist.
+
+        Holds the collection's writer lock, so no update in any worker interleaves
+        with it; ``on_delete()`` runs under that lock too, before any waiting
+        writer can recreate the collection.
+        """
+        if name == DEFAULT_COLLECTION:
+            raise ValueError("The default collection cannot be deleted")
+        self.validate_name(name)
+        if not self.exists(name):
+            return False
+        with writer_lock(self.path(name)):
+            # CURRENT goes first: from then on every worker sees the collection as gone
+            delete_generations(self.path(name))
+            with self._lock:
+                self._forget(name)
+            if on_delete is not None:
+                on_delete()
+        logger.info(f"Deleted collection {name}")
+        return True
+
+    def set_memory_budget(self, memory_budget_bytes: int):
+        """Change the budget, evicting right away if the resident collections exceed it."""
+        with self._lock:
+            self.memory_budget_bytes = memory_budget_bytes
+            self._evict_over_budget()
+
+    def memory_usage(self) -> Dict[str, MemoryUsage]:
+        with self._lock:
+            return {name: processor.index.memory_usage() for name, processor in self._resident.items()}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            resident = self.memory_usage()
+            return {
+                "collections": len(self.names()),
+                "resident": len(resident),
+                "resident_bytes": {name: usage.heap for name, usage in resident.items()},
+                "memory_bytes": sum(usage.heap for usage in resident.values()),
+                "mapped_bytes": sum(usage.mapped for usage in resident.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "hot_reloads": self.hot_reloads,
+                "evictions": self.evictions,
+                "load_ms_last": self.last_load_s * 1000,
+                "load_ms_mean": self.load_s_total / self.loads * 1000 if self.loads else 0.0,
+                "load_ms_max": self.load_s_max * 1000,
+            }
+
+    def _load(self, name: str) -> DocumentProcessor:
+        start = time.perf_counter()
+        processor = self.factory()
+        path = self.path(name)
+        min_version = 0
+        if name in self._last_seen:
+            # Reloading the generation seen last keeps its version; anything else gets a newer one
+            version, generation = self._last_seen[name]
+            min_version = version if generation is not None and generation == current_generation(path) else version + 1
+        processor.version = min_version
+        if path.exists():
+            processor.load_index(path, min_version=min_version)
+        elapsed = time.perf_counter() - start
+        self.loads += 1
+        self.load_s_total += elapsed
+        self.load_s_max = max(self.load_s_max, elapsed)
+        self.last_load_s = elapsed
+        logger.info(f"Loaded collection {name} ({len(processor.index)} chunks) in {elapsed * 1000:.1f} ms")
+        return processor
+
+    def _deleted(self, name: str, processor: DocumentProcessor) -> bool:
+        """Whether the generation ``processor`` holds was unpublished, i.e. the collection was deleted."""
+        return processor.snapshot().source is not None and current_generation(self.path(name)) is None
+
+    def _forget(self, name: str):
+        """Drop a deleted collection; its version still only increases if it is created again."""
+        for processors in (self._resident, self._evicted):
+            processor = processors.pop(name, None)
+            if processor is not None:
+                self._last_seen[name] = (processor.version, None)
+
+    def _evict_over_budget(self):
+        """Drop least recently used collections until the rest fit; the newest always stays."""
+        used = sum(usage.heap for usage in self.memory_usage().values())
+        while used > self.memory_budget_bytes and len(self._resident) > 1:
+            name, processor = self._resident.popitem(last=False)
+            size = processor.index.memory_usage().heap
+            used -= size
+            self._last_seen[name] = (processor.version, processor.snapshot().source)
+            self._evicted[name] = processor
+            self.evictions += 1
+            logger.info(f"Evicted collection {name} ({size} heap bytes), {used} heap bytes still resident")
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+
+class OverloadedError(Exception):
+    """Raised when a limiter's wait queue is full; maps to an HTTP 429/503 response."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int = 1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """Bounds concurrent work and the number of callers allowed to wait for a slot.
+
+    Callers beyond ``max_concurrency`` queue up to ``max_waiting`` deep; past that they
+    are rejected immediately with OverloadedError instead of piling up latency.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_waiting: int, status_code: int = 503):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.status_code = status_code
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+
+    async def acquire(self):
+        """Wait for a slot, or raise OverloadedError if the wait queue is full."""
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            logger.warning(f"{self.name} limiter full ({self.active} active, {self.waiting} waiting)")
+            raise OverloadedError(f"Server busy: too many concurrent {self.name} requests", self.status_code)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_waiting": self.max_waiting,
+        }
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,117 @@
+import functools
+import itertools
+import logging
+import re
+from typing import Dict, FrozenSet, List, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rough LLM token boundaries: words and individual punctuation marks. Runs of word characters
+# are counted in pieces of up to 10 so text without spaces (CJK, URLs, base64) is not one token
+_TOKEN_PATTERN = re.compile(r'\w{1,10}|[^\w\s]')
+_WORD_PATTERN = re.compile(r'\w+')
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\n+')
+
+
+def count_tokens(text: str) -> int:
+    """Approximate the LLM token count of text without a model-specific tokenizer."""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+@functools.lru_cache(maxsize=None)
+def _stop_words() -> FrozenSet[str]:
+    # scikit-learn is slow to import; only load it once a context is actually built
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+    return ENGLISH_STOP_WORDS
+
+
+def _terms(text: str) -> Set[str]:
+    stop_words = _stop_words()
+    return {word for word in _WORD_PATTERN.findall(text.lower()) if word not in stop_words}
+
+
+class ContextBuilder:
+    """Assembles prompt context from ranked search hits under a token budget.
+
+    Chunks are taken best score first. Sentences already used from an earlier
+    chunk are skipped, so overlapping chunker windows are not sent twice, and a
+    chunk that mostly repeats earlier ones is dropped. Sentences that share terms
+    with the question, and their immediate neighbours, are ranked by the share of
+    question terms they contain plus their chunk's relative score, and added until
+    the budget is spent. If not even one sentence fits, the best one is cut to the
+    budget, so a small budget never leaves the prompt without context.
+    """
+
+    def __init__(self, token_budget: int, duplicate_threshold: float = 0.8):
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+
+    def build(self, question: str, hits: Sequence[Tuple[float, str]]) -> Tuple[List[str], Dict]:
+        """Return context passages, best chunk first, and stats about what was kept.
+
+        ``hits`` are (score, chunk text) pairs in any order.
+        """
+        hits = sorted(hits, key=lambda hit: -hit[0])
+        question_terms = _terms(question)
+        top_score = hits[0][0] if hits and hits[0][0] > 0 else 1.0
+        seen = set()
+        candidates = []  # (near a match, priority, chunk rank, position, sentence, tokens)
+        duplicates = 0
+        tokens_in = 0
+        for rank, (score, text) in enumerate(hits):
+            tokens_in += count_tokens(text)
+            sentences = [sentence for sentence in _SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+            keys = [' '.join(sentence.lower().split()) for sentence in sentences]
+            fresh = [(position, sentence) for position, (sentence, key) in enumerate(zip(sentences, keys)) if key not in seen]
+            if len(fresh) <= (1 - self.duplicate_threshold) * len(sentences):
+                duplicates += 1
+                continue
+            seen.update(keys)
+            matches = {
+                position: len(question_terms & _terms(sentence)) / len(question_terms) if question_terms else 0.0
+                for position, sentence in fresh
+            }
+            for position, sentence in fresh:
+                # Neighbours of a matching sentence come along, ranked after the matches themselves
+                near = matches[position] or matches.get(position - 1) or matches.get(position + 1)
+                priority = matches[position] + max(score, 0.0) / top_score
+                candidates.append((near, priority, rank, position, sentence, count_tokens(sentence)))
+
+        # Sentences with no question terms nearby are only used when nothing matches
+        if any(candidate[0] for candidate in candidates):
+            candidates = [candidate for candidate in candidates if candidate[0]]
+        candidates.sort(key=lambda candidate: (-candidate[1], candidate[2], candidate[3]))
+        chosen: Dict[int, List[Tuple[int, str]]] = {}
+        used = 0
+        for _, _, rank, position, sentence, tokens in candidates:
+            if used + tokens > self.token_budget:
+                continue  # a shorter sentence further down may still fit
+            chosen.setdefault(rank, []).append((position, sentence))
+            used += tokens
+        truncated = not chosen and bool(candidates) and self.token_budget > 0
+        if truncated:
+            _, _, rank, position, sentence, _ = candidates[0]
+            last = next(itertools.islice(_TOKEN_PATTERN.finditer(sentence), self.token_budget - 1, None))
+            chosen[rank] = [(position, sentence[:last.end()])]
+            used = self.token_budget
+
+        passages = []
+        for rank in sorted(chosen):
+            sentences = sorted(chosen[rank])
+            parts = [sentences[0][1]]
+            for (previous, _), (position, sentence) in zip(sentences, sentences[1:]):
+                # Mark sentences skipped between the ones kept
+                parts.append((' ' if position == previous + 1 else ' ... ') + sentence)
+            passages.append(''.join(parts))
+
+        stats = {
+            "chunks_in": len(hits),
+            "chunks_used": len(passages),
+            "duplicate_chunks": duplicates,
+            "sentences_used": sum(len(sentences) for sentences in chosen.values()),
+            "truncated": truncated,
+            "tokens_in": tokens_in,
+            "tokens_out": used,
+        }
+        logger.debug("Built context: %s", stats)
+        return passages, stats
@@ -1,93 +1,193 @@
 from pathlib import Path
-import PyPDF2
-from typing import List, Dict
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Tuple
+import importlib
 import json
 import logging
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
 import re
+import threading
+import time
+import uuid
+from .context_builder import count_tokens
+from .index_store import current_generation, generation_number, open_current, write_generation
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Backend name -> (module, class). Modules are imported on first use, since they pull in
+# numpy, scipy and scikit-learn, which would otherwise dominate the server's start-up time
+INDEX_BACKENDS = {
+    "tfidf": ("tfidf_index", "TfidfIndex"),
+    "incremental": ("incremental_index", "IncrementalIndex"),
+    "bm25": ("bm25_index", "BM25Index"),
+}
+
+
+def index_backend_class(name: str):
+    """The index class for a backend name, importing its module if needed."""
+    module, cls = INDEX_BACKENDS[name]
+    return getattr(importlib.import_module(f".{module}", __package__), cls)
+
+# Lengths the chunker can measure chunks in
+CHUNK_UNITS = ("chars", "tokens")
+
+# Paragraphs are separated by blank lines; sentences end in . ! or ? followed by a space,
+# or in the full-width 。！？ of CJK text, which need no space after them. A boundary match
+# starts with the sentence's closing mark (or the first newline), which lets the regex
+# engine scan ahead for that character instead of trying every position
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_CHUNK_BOUNDARY = re.compile(r'[.!?。！？\n](?:(?<=[.!?]) +|(?<=[。！？]) *|(?<=\n)\n+)')
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """One published state of the index. Never changed after it is published."""
+    index: Any
+    # Increases with every change; equals the on-disk generation number once saved or loaded
+    version: int
+    # The generation directory this state was saved to or loaded from, if any
+    generation: Optional[Path] = None
+    # The generation this state was read from, even if it was then rebuilt for another
+    # backend (and so is not the same as any generation on disk); refresh() compares to it
+    source: Optional[Path] = None
+
+
 class DocumentProcessor:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(
-            max_features=10000,
-            stop_words='english',
-            ngram_range=(1, 2)  # Include both single words and pairs of words
-        )
-        self.documents = []
-        self.chunk_size = 2000  # Increased chunk size for better context
-        self.chunk_overlap = 300  # Increased overlap to prevent context loss
-        logger.info("DocumentProcessor initialized")
+    def __init__(self, index_backend: str = "tfidf", chunk_unit: str = "chars"):
+        if index_backend not in INDEX_BACKENDS:
+            raise ValueError(f"Unknown index backend {index_backend!r}, expected one of {sorted(INDEX_BACKENDS)}")
+        if chunk_unit not in CHUNK_UNITS:
+            raise ValueError(f"Unknown chunk unit {chunk_unit!r}, expected one of {list(CHUNK_UNITS)}")
+        self.index_backend = index_backend
+        # Writers change a clone of the current index and publish it by replacing this
+        # reference, so a reader that takes the snapshot once never locks and never
+        # sees a half-applied change
+        self._snapshot = IndexSnapshot(index_backend_class(index_backend)(), 0)
+        # Serializes writers (add, delete, save, load) with each other only
+        self.write_lock = threading.RLock()
+        self.chunk_unit = chunk_unit
+        if chunk_unit == "tokens":
+            # About the same amount of text as the character defaults
+            self.chunk_size = 400
+            self.chunk_overlap = 60
+        else:
+            self.chunk_size = 2000  # Increased chunk size for better context
+            self.chunk_overlap = 300  # Increased overlap to prevent context loss
+        logger.info(f"DocumentProcessor initialized with {index_backend} index")
         
-    def process_pdf(self, file_path: Path) -> List[str]:
-        """Extract text from PDF and split into chunks."""
+    def process_pdf(self, file_path: Path, stats: Optional[Dict] = None, start: int = 0,
+                    stop: Optional[int] = None) -> List[str]:
+        """Extract text from PDF pages [start, stop) and split into chunks.
+
+        If ``stats`` is given it is filled with the page count and per-stage timings.
+        """
         try:
             logger.info(f"Processing PDF file: {file_path}")
-            chunks = []
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                
-                # Clean and normalize text
-                text = self._clean_text(text)
-                logger.info(f"Extracted {len(text)} characters from PDF")
-                
-                # Split text into chunks
-                chunks = self._split_text(text)
-                logger.info(f"Created {len(chunks)} chunks from PDF")
-                
-                # Log first chunk for debugging
-                if chunks:
-                    logger.info(f"First chunk preview: {chunks[0][:100]}...")
-                
+            stats = {} if stats is None else stats
+            began = time.perf_counter()
+            stats["extract_s"] = stats["clean_s"] = 0.0
+            # Pages are cleaned and chunked as they are extracted, never joined into one string
+            pages = (page + ' ' for page in self.iter_clean_pdf_pages(file_path, start, stop, stats=stats))
+            chunks = list(self.iter_chunks(pages))
+            stats["chunk_s"] = time.perf_counter() - began - stats["extract_s"] - stats["clean_s"]
+            logger.info(f"Created {len(chunks)} chunks from PDF")
+            
+            # Log first chunk for debugging
+            if chunks:
+                logger.debug("First chunk preview: %.100s...", chunks[0])
+            
             return chunks
         except Exception as e:
             logger.error(f"Error processing PDF {file_path}: {str(e)}")
             raise
     
-    def process_text(self, file_path: Path) -> List[str]:
-        """Process text file and split into chunks."""
+    def count_pdf_pages(self, file_path: Path) -> int:
+        """Number of pages in a PDF."""
+        import PyPDF2
+        with open(file_path, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+    
+    def iter_pdf_pages(self, file_path: Path, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+        """Yield the raw text of pages [start, stop) one page at a time."""
+        import PyPDF2
+        with open(file_path, 'rb') as file:
+            pages = PyPDF2.PdfReader(file).pages
+            for number in range(start, len(pages) if stop is None else min(stop, len(pages))):
+                yield pages[number].extract_text()
+    
+    def iter_clean_pdf_pages(self, file_path: Path, start: int = 0, stop: Optional[int] = None,
+                             stats: Optional[Dict] = None) -> Iterator[str]:
+        """Yield the cleaned, non-empty text of pages [start, stop) one page at a time.
+
+        If ``stats`` is given its ``pages`` count and ``extract_s`` and ``clean_s``
+        times are incremented as pages are read.
+        """
+        began = time.perf_counter()
+        for page in self.iter_pdf_pages(file_path, start, stop):
+            extracted = time.perf_counter()
+            page = self._clean_text(page)
+            if stats is not None:
+                stats["pages"] = stats.get("pages", 0) + 1
+                stats["extract_s"] = stats.get("extract_s", 0.0) + extracted - began
+                stats["clean_s"] = stats.get("clean_s", 0.0) + time.perf_counter() - extracted
+            if page:
+                yield page
+            began = time.perf_counter()
+    
+    def extract_pdf_text(self, file_path: Path, start: int = 0, stop: Optional[int] = None) -> str:
+        """Cleaned text of pages [start, stop), joined once."""
+        return ' '.join(self.iter_clean_pdf_pages(file_path, start, stop))
+    
+    def process_text(self, file_path: Path, stats: Optional[Dict] = None) -> List[str]:
+        """Process text file and split into chunks.
+
+        If ``stats`` is given it is filled with per-stage timings.
+        """
         try:
             logger.info(f"Processing text file: {file_path}")
+            stats = {} if stats is None else stats
             with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
-                # Clean and normalize text
-                text = self._clean_text(text)
-                logger.info(f"Read {len(text)} characters from text file")
-                chunks = self._split_text(text)
+                start = time.perf_counter()
+                stats["clean_s"] = 0.0
+                # Read and clean a paragraph at a time, chunking as we go; chunk_s covers reading
+                chunks = list(self.iter_chunks(self._iter_clean_paragraphs(file, stats)))
+                stats["chunk_s"] = time.perf_counter() - start - stats["clean_s"]
                 logger.info(f"Created {len(chunks)} chunks from text file")
                 
                 # Log first chunk for debugging
                 if chunks:
-                    logger.info(f"First chunk preview: {chunks[0][:100]}...")
+                    logger.debug("First chunk preview: %.100s...", chunks[0])
                 
                 return chunks
         except Exception as e:
             logger.error(f"Error processing text file {file_path}: {str(e)}")
             raise
     
-    def process_pasted_text(self, text: str) -> List[str]:
-        """Process pasted text and split into chunks."""
+    def process_pasted_text(self, text: str, stats: Optional[Dict] = None) -> List[str]:
+        """Process pasted text and split into chunks.
+
+        If ``stats`` is given it is filled with per-stage timings.
+        """
         try:
-            logger.info("Processing pasted text")
+            logger.debug("Processing pasted text")
+            stats = {} if stats is None else stats
             # Clean and normalize text
+            start = time.perf_counter()
             text = self._clean_text(text)
-            logger.info(f"Processed {len(text)} characters from pasted text")
+            stats["clean_s"] = time.perf_counter() - start
+            logger.debug("Processed %d characters from pasted text", len(text))
             
             # Split text into chunks
-            chunks = self._split_text(text)
-            logger.info(f"Created {len(chunks)} chunks from pasted text")
+            start = time.perf_counter()
+            chunks = list(self.iter_chunks([text]))
+            stats["chunk_s"] = time.perf_counter() - start
+            logger.debug("Created %d chunks from pasted text", len(chunks))
             
             # Log first chunk for debugging
             if chunks:
-                logger.info(f"First chunk preview: {chunks[0][:100]}...")
+                logger.debug("First chunk preview: %.100s...", chunks[0])
             
             return chunks
         except Exception as e:
@@ -95,54 +195,193 @@ class DocumentProcessor:
             raise
     
     def _clean_text(self, text: str) -> str:
-        """Clean and normalize text."""
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
+        """Clean and normalize text, keeping blank-line paragraph breaks as '\\n\\n'."""
         # Remove special characters but keep punctuation
-        text = re.sub(r'[^\w\s.,!?-]', '', text)
-        # Normalize whitespace
-        text = ' '.join(text.split())
+        text = re.sub(r'[^\w\s.,!?。！？-]', '', text)
+        # Normalize whitespace within each paragraph
+        paragraphs = (' '.join(paragraph.split()) for paragraph in _PARAGRAPH_BREAK.split(text))
+        return '\n\n'.join(paragraph for paragraph in paragraphs if paragraph)
+    
+    def _iter_clean_paragraphs(self, lines: Iterable[str], stats: Optional[Dict] = None) -> Iterator[str]:
+        """Group lines into blank-line separated paragraphs and yield each cleaned, ending in '\\n\\n'.
+
+        If ``stats`` is given its ``clean_s`` time is incremented.
+        """
+        paragraph = []
+        for line in lines:
+            if line.strip():
+                paragraph.append(line)
+            elif paragraph:
+                yield self._timed_clean(''.join(paragraph), stats) + '\n\n'
+                paragraph = []
+        if paragraph:
+            yield self._timed_clean(''.join(paragraph), stats) + '\n\n'
+    
+    def _timed_clean(self, text: str, stats: Optional[Dict]) -> str:
+        if stats is None:
+            return self._clean_text(text)
+        start = time.perf_counter()
+        text = self._clean_text(text)
+        stats["clean_s"] = stats.get("clean_s", 0.0) + time.perf_counter() - start
         return text
     
+    def _measure(self, text: str) -> int:
+        """Length of text in the chunker's unit."""
+        if self.chunk_unit == "tokens":
+            return count_tokens(text)
+        return len(text)
+    
     def _split_text(self, text: str) -> List[str]:
         """Split text into overlapping chunks."""
+        return list(self.iter_chunks([text]))
+    
+    def iter_chunks(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Split cleaned text, given as consecutive pieces, into overlapping chunks.
+        
+        Chunks end on sentence or paragraph boundaries, are at most ``chunk_size``
+        long and start with up to ``chunk_overlap`` of the previous chunk's
+        trailing sentences; lengths are in ``chunk_unit``. Runs in a single pass
+        holding one chunk plus the unfinished sentence, so pieces can come from a
+        generator.
+        """
         try:
-            logger.info("Starting text chunking process")
-            chunks = []
-            
-            # Split by paragraphs first
-            paragraphs = text.split('\n\n')
-            current_chunk = ""
-            
-            for paragraph in paragraphs:
-                # If adding this paragraph would exceed chunk size, save current chunk
-                if len(current_chunk) + len(paragraph) > self.chunk_size:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = paragraph
-                else:
-                    current_chunk += "\n\n" + paragraph if current_chunk else paragraph
-            
-            # Add the last chunk if it exists
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            
-            # Ensure chunks aren't too small
-            chunks = [chunk for chunk in chunks if len(chunk) > 100]
-            
-            logger.info(f"Split text into {len(chunks)} chunks")
-            return chunks
+            for chunk in self._iter_windows(self._iter_sentences(pieces)):
+                # Ensure chunks aren't too small
+                if len(chunk) > 100:
+                    yield chunk
         except Exception as e:
             logger.error(f"Error splitting text: {str(e)}")
             raise
     
-    def create_index(self, chunks: List[str]):
-        """Create TF-IDF vectors from text chunks."""
+    def _iter_sentences(self, pieces: Iterable[str]) -> Iterator[Tuple[str, str]]:
+        """Yield (separator, sentence) pairs; the separator is '\\n\\n' before a new paragraph."""
+        separator = ''
+        carry = ''
+        for piece in pieces:
+            carry += piece
+            start = 0
+            for match in _CHUNK_BOUNDARY.finditer(carry):
+                boundary = match.group()
+                paragraph = boundary[0] == '\n'
+                end = match.start() if paragraph else match.start() + 1
+                if end > start:
+                    yield separator, carry[start:end]
+                    # CJK sentences follow each other without a space
+                    separator = ' ' if len(boundary) > 1 else ''
+                if paragraph:
+                    separator = '\n\n'
+                start = match.end()
+            # Text with no sentence boundary is cut between words so the carry stays bounded;
+            # a trailing run of more than chunk_size characters without a space (CJK, URLs,
+            # base64) is cut every chunk_size characters
+            while len(carry) - start > self.chunk_size:
+                tail = max(carry.rfind(' ', start) + 1, start)
+                if len(carry) - tail > self.chunk_size:
+                    if tail > start + 1:
+                        yield separator, carry[start:tail - 1]
+                        separator = ' '
+                    start = tail
+                    while len(carry) - start > self.chunk_size:
+                        yield separator, carry[start:start + self.chunk_size]
+                        separator, start = '', start + self.chunk_size
+                elif tail > start + 1 and self._measure(carry[start:]) > self.chunk_size:
+                    yield separator, carry[start:tail - 1]
+                    separator, start = ' ', tail
+                else:
+                    break
+            carry = carry[start:]
+        if carry.strip():
+            yield separator, carry.strip()
+    
+    def _iter_windows(self, sentences: Iterable[Tuple[str, str]]) -> Iterator[str]:
+        """Pack sentences into windows of at most chunk_size that overlap by up to chunk_overlap."""
+        window = deque()  # (separator, sentence, length)
+        length = 0  # of the window, inner separators included
+        fresh = False  # the window holds sentences not emitted yet
+        chars = self.chunk_unit == "chars"
+        for separator, sentence in sentences:
+            size = self._measure(sentence)
+            parts = [(separator, sentence, size)] if size <= self.chunk_size else self._split_words(separator, sentence)
+            for separator, part, size in parts:
+                gap = len(separator) if chars and window else 0
+                if window and length + gap + size > self.chunk_size:
+                    if fresh:
+                        yield self._join_window(window)
+                        fresh = False
+                    # Keep trailing sentences as overlap, as long as the next part still fits
+                    while window and (length > self.chunk_overlap or length + gap + size > self.chunk_size):
+                        _, _, dropped = window.popleft()
+                        length -= dropped
+                        if window and chars:
+                            length -= len(window[0][0])
+                    gap = len(separator) if chars and window else 0
+                window.append((separator, part, size))
+                length += gap + size
+                fresh = True
+        if fresh:
+            yield self._join_window(window)
+    
+    @staticmethod
+    def _join_window(window: deque) -> str:
+        parts = [window[0][1]]
+        parts.extend(separator + sentence for separator, sentence, _ in list(window)[1:])
+        return ''.join(parts)
+    
+    def _split_words(self, separator: str, text: str) -> Iterator[Tuple[str, str, int]]:
+        """Split an overlong sentence between words into (separator, part, length) triples of at most chunk_size.
+
+        Words longer than chunk_size are cut every chunk_size characters, with no separator between the pieces.
+        """
+        space = 1 if self.chunk_unit == "chars" else 0
+        part, size = [], 0
+        for word in text.split(' '):
+            word_size = self._measure(word)
+            if part and size + space + word_size > self.chunk_size:
+                yield separator, ' '.join(part), size
+                separator, part, size = ' ', [], 0
+            if word_size > self.chunk_size:
+                for start in range(0, len(word), self.chunk_size):
+                    piece = word[start:start + self.chunk_size]
+                    yield separator, piece, self._measure(piece)
+                    separator = ''
+                separator = ' '
+                continue
+            size += word_size + (space if part else 0)
+            part.append(word)
+        if part:
+            yield separator, ' '.join(part), size
+    
+    @property
+    def index(self):
+        return self._snapshot.index
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    @version.setter
+    def version(self, version: int):
+        with self.write_lock:
+            self._snapshot = replace(self._snapshot, version=version)
+
+    def snapshot(self) -> IndexSnapshot:
+        """The current index state; use one snapshot for everything a request reads."""
+        return self._snapshot
+
+    def _publish(self, index, version: Optional[int] = None, generation: Optional[Path] = None,
+                 source: Optional[Path] = None):
+        version = self._snapshot.version + 1 if version is None else version
+        self._snapshot = IndexSnapshot(index, version, generation, source or generation)
+
+    def create_index(self, chunks: List[str], doc_id: Optional[str] = None) -> str:
+        """Replace the whole index with the given chunks. Returns their doc ID."""
         try:
             logger.info(f"Creating index from {len(chunks)} chunks")
-            self.documents = chunks
-            logger.info("Fitting TF-IDF vectorizer")
-            self.vectorizer.fit(chunks)
+            doc_id = doc_id or uuid.uuid4().hex
+            with self.write_lock:
+                index = index_backend_class(self.index_backend)()
+                index.add(chunks, doc_id)
+                self._publish(index)
             logger.info("Index created successfully")
             
             # Log some statistics
@@ -150,53 +389,112 @@ class DocumentProcessor:
                 avg_length = sum(len(c) for c in chunks) / len(chunks)
                 logger.info(f"Average chunk length: {avg_length:.2f} characters")
                 logger.info(f"Total chunks: {len(chunks)}")
-                logger.info(f"First chunk preview: {chunks[0][:100]}...")
+                logger.debug("First chunk preview: %.100s...", chunks[0])
+            return doc_id
         except Exception as e:
             logger.error(f"Error creating index: {str(e)}")
             raise
     
+    def add_documents(self, chunks: List[str], doc_id: Optional[str] = None, prepared: Any = None) -> str:
+        """Append a document's chunks to the index under their own doc ID.
+
+        ``prepared`` is the output of the backend's ``prepare(chunks)``, when the
+        chunks were already vectorized elsewhere (e.g. in the ingestion pool).
+        """
+        try:
+            doc_id = doc_id or uuid.uuid4().hex
+            logger.info(f"Adding {len(chunks)} chunks for document {doc_id}")
+            with self.write_lock:
+                index = self._snapshot.index.clone()
+                index.add(chunks, doc_id, prepared)
+                self._publish(index)
+            logger.info(f"Index now holds {len(index)} chunks")
+            return doc_id
+        except Exception as e:
+            logger.error(f"Error adding documents: {str(e)}")
+            raise
+    
+    def delete_document(self, doc_id: str) -> int:
+        """Remove a document's chunks from the index. Returns the number removed."""
+        try:
+            with self.write_lock:
+                index = self._snapshot.index.clone()
+                removed = index.delete(doc_id)
+                if removed:
+                    self._publish(index)
+            logger.info(f"Deleted {removed} chunks for document {doc_id}")
+            return removed
+        except Exception as e:
+            logger.error(f"Error deleting document {doc_id}: {str(e)}")
+            raise
+    
+    def list_documents(self) -> Dict[str, int]:
+        """Map each indexed doc ID to its chunk count."""
+        return self._snapshot.index.documents()
+    
     def search(self, query: str, k: int = 5) -> List[str]:
-        """Search for similar chunks using TF-IDF and cosine similarity."""
+        """Search for the chunks most similar to the query."""
+        hits, _ = self.search_hits(query, k)
+        # Sort chunks by their position in the document to maintain context flow
+        hits.sort()
+        return [self._truncate_chunk(text) for _, _, text in hits]
+    
+    def search_hits(self, query: str, k: int = 5) -> Tuple[List[Tuple[int, float, str]], int]:
+        """Best-first (row, score, full text) hits for the query, and the index version searched."""
         try:
-            if not self.documents:
+            snapshot = self._snapshot
+            if not len(snapshot.index):
                 raise ValueError("No documents indexed. Please process documents first.")
             
-            logger.info(f"Searching for query: {query}")
+            logger.debug("Searching for query: %s", query)
             
             # Preprocess query to improve matching
             query = self._clean_text(query)
             
-            # Transform query and documents
-            query_vec = self.vectorizer.transform([query])
-            doc_vecs = self.vectorizer.transform(self.documents)
-            
-            # Calculate similarities
-            similarities = cosine_similarity(query_vec, doc_vecs).flatten()
-            
             # Get top k similar documents with a lower minimum similarity threshold
             min_similarity = 0.05  # Lowered threshold to catch more relevant chunks
-            top_k_idx = np.argsort(similarities)[-k:][::-1]
-            top_k_idx = [i for i in top_k_idx if similarities[i] > min_similarity]
+            hits = snapshot.index.search(query, k)
+            texts = {row: snapshot.index.get_text(row) for row, _ in hits}
+            relevant = [(row, score) for row, score in hits if score > min_similarity]
             
-            if not top_k_idx:
-                logger.warning("No chunks found above similarity threshold, using top k chunks")
+            if not relevant:
+                logger.debug("No chunks found above similarity threshold, using top k chunks")
                 # Fallback to top k chunks regardless of threshold
-                top_k_idx = np.argsort(similarities)[-k:][::-1]
-            
-            # Sort chunks by their position in the document to maintain context flow
-            sorted_indices = sorted(top_k_idx)
-            results = [self._truncate_chunk(self.documents[i]) for i in sorted_indices]
+                relevant = hits
             
             # Log similarity scores for debugging
-            for i, idx in enumerate(sorted_indices):
-                logger.info(f"Chunk {i+1} similarity score: {similarities[idx]:.3f}")
-            
-            logger.info(f"Found {len(results)} relevant chunks")
-            return results
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Found %d relevant chunks, similarity scores: %s",
+                             len(relevant), ", ".join(f"{score:.3f}" for _, score in relevant))
+            return [(row, score, texts[row]) for row, score in relevant], snapshot.version
         except Exception as e:
             logger.error(f"Error searching documents: {str(e)}")
             raise
-    
+
+    def search_hits_batch(self, queries: List[str], k: int = 5) -> Tuple[List[List[Tuple[int, float, str]]], int]:
+        """search_hits() for many queries in one index pass, all against the same index version."""
+        try:
+            snapshot = self._snapshot
+            if not len(snapshot.index):
+                raise ValueError("No documents indexed. Please process documents first.")
+
+            logger.debug("Searching for %d queries", len(queries))
+            cleaned = [self._clean_text(query) for query in queries]
+            min_similarity = 0.05
+            batch = snapshot.index.search_batch(cleaned, k)
+            texts = {row: snapshot.index.get_text(row) for hits in batch for row, _ in hits}
+
+            results = []
+            for hits in batch:
+                # Same threshold and top-k fallback as search_hits()
+                relevant = [(row, score) for row, score in hits if score > min_similarity] or hits
+                results.append([(row, score, texts[row]) for row, score in relevant])
+            logger.debug("Found %d relevant chunks for %d queries", sum(map(len, results)), len(queries))
+            return results, snapshot.version
+        except Exception as e:
+            logger.error(f"Error searching documents: {str(e)}")
+            raise
+
     def _truncate_chunk(self, chunk: str, max_length: int = 1000) -> str:
         """Truncate a chunk to a maximum length while preserving sentence boundaries."""
         if len(chunk) <= max_length:
@@ -209,24 +507,85 @@ class DocumentProcessor:
         return chunk[:max_length] + "..."
     
     def save_index(self, path: Path):
-        """Save documents to disk."""
+        """Atomically write the index as a new on-disk generation.
+
+        Nothing is written if the current state is already the live generation.
+        """
         try:
-            logger.info(f"Saving index to {path}")
-            with open(path / "documents.json", 'w') as f:
-                json.dump(self.documents, f)
+            with self.write_lock:
+                snapshot = self._snapshot
+                if snapshot.generation is not None and snapshot.generation == current_generation(path):
+                    logger.info(f"Index unchanged since {snapshot.generation.name}, not saving")
+                    return
+                logger.info(f"Saving index to {path}")
+                generation = write_generation(path, lambda directory: {"backend": self.index_backend, **snapshot.index.save(directory)})
+                # Stamp the generation number as the version, so every worker that loads it reports the same one
+                self._publish(snapshot.index, max(snapshot.version, generation_number(generation)), generation)
             logger.info("Index saved successfully")
         except Exception as e:
             logger.error(f"Error saving index: {str(e)}")
             raise
     
-    def load_index(self, path: Path):
-        """Load documents from disk."""
+    def load_index(self, path: Path, min_version: Optional[int] = None) -> bool:
+        """Open the current on-disk index. Returns False if there is nothing to load.
+
+        The loaded index is built off to the side and published in one swap. Its
+        version is the generation number, raised to ``min_version`` (default: one
+        past the current version) so versions never go backwards.
+        """
         try:
             logger.info(f"Loading index from {path}")
-            with open(path / "documents.json", 'r') as f:
-                self.documents = json.load(f)
-                self.vectorizer.fit(self.documents)
-            logger.info("Index loaded successfully")
+            generation = source = None
+            current = open_current(path)
+            if current is not None:
+                generation, manifest = current
+                source = generation
+                index = index_backend_class(manifest["backend"]).load(generation, manifest)
+                if manifest["backend"] != self.index_backend:
+                    logger.warning(f"Rebuilding {manifest['backend']} index as {self.index_backend}")
+                    index = index_backend_class(self.index_backend).build(index.iter_chunks())
+                    generation = None
+            elif (path / "documents.json").exists():
+                # Indexes saved before the binary format: a list of chunk texts
+                logger.info("Converting legacy documents.json index")
+                with open(path / "documents.json", 'r') as f:
+                    texts = json.load(f)
+                doc_ids_path = path / "doc_ids.json"
+                if doc_ids_path.exists():
+                    with open(doc_ids_path, 'r') as f:
+                        doc_ids = json.load(f)
+                else:
+                    doc_ids = ["legacy"] * len(texts)
+                index = index_backend_class(self.index_backend).build(zip(doc_ids, texts))
+            else:
+                logger.info("No saved index found")
+                return False
+            with self.write_lock:
+                if min_version is None:
+                    min_version = self._snapshot.version + 1
+                version = max(generation_number(source), min_version) if source is not None else min_version
+                self._publish(index, version, generation, source)
+            logger.info(f"Index loaded successfully with {len(index)} chunks")
+            return True
         except Exception as e:
             logger.error(f"Error loading index: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+    def refresh(self, path: Path) -> bool:
+        """Load the on-disk index if another process published a newer generation.
+
+        Returns without waiting while this process is writing: its writers refresh
+        before they change anything.
+        """
+        live = current_generation(path)
+        if live is None or live == self._snapshot.source:
+            return False
+        if not self.write_lock.acquire(blocking=False):
+            return False
+        try:
+            if current_generation(path) == self._snapshot.source:
+                return False
+            logger.info(f"Reloading index: {live.name} was published by another process")
+            return self.load_index(path)
+        finally:
+            self.write_lock.release()
@@ -0,0 +1,306 @@
+import bisect
+import copy
+import functools
+import itertools
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from .index_store import (
+    MemoryUsage, TextStore, array_usage, load_array, load_documents, new_part_name, reuse_files, save_array,
+    save_documents
+)
+from .metrics import span
+from .scoring import QUERY_BLOCK, top_k, top_k_pairs
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_ARRAYS = ("data", "indices", "indptr")
+# A segment is rebuilt without its deleted rows' entries once they hold this share of them
+COMPACT_DEAD_FRACTION = 0.3
+
+
+def _segment_array(name: str, array: str) -> str:
+    """File name of one CSR array of a saved segment (the unnamed segment is the pre-segments layout)."""
+    return f"{name}-{array}" if name else array
+
+
+@functools.lru_cache(maxsize=None)
+def _hashing_vectorizer(n_features: int) -> HashingVectorizer:
+    # Stateless, so one instance per feature-space size is shared by every index
+    return HashingVectorizer(
+        n_features=n_features,
+        stop_words='english',
+        ngram_range=(1, 2),
+        alternate_sign=False,
+        norm=None,
+        dtype=np.float32,
+    )
+
+
+class IncrementalIndex:
+    """Append-only TF-IDF index over a hashed vocabulary with online IDF statistics.
+
+    Chunks are hashed into a fixed feature space, so adding a document never refits
+    anything: its rows are appended as a new segment and the document frequencies
+    are updated in place. Rows hold L2-normalized term frequencies and IDF is
+    applied on the query side (squared, as in Lucene's classic similarity), so rows
+    already indexed stay valid as the IDF drifts. Ingest cost is proportional to
+    the new document; deletes only touch the deleted document's rows, and compact
+    its segment once deleted rows make up COMPACT_DEAD_FRACTION of it. Segments are
+    saved one file set each, so a save links the segments already on disk and only
+    writes new, merged or compacted ones.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18):
+        self.vectorizer = _hashing_vectorizer(n_features)
+        self.n_features = n_features
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        # (first row, matrix) pairs; every row of a document lives in one segment
+        self.segments: List[Tuple[int, sp.csr_matrix]] = []
+        self.texts = TextStore()
+        self.doc_rows: Dict[str, Tuple[int, int]] = {}
+        self._alive = np.zeros(1024, dtype=bool)
+        self.num_rows = 0
+        self.num_live = 0
+        # (first row, stop row) -> name of the segment's files in the generation last saved or loaded
+        self._saved_segments: Dict[Tuple[int, int], str] = {}
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[str, str]]) -> "IncrementalIndex":
+        """Build an index from (doc_id, text) pairs."""
+        index = cls()
+        for doc_id, group in itertools.groupby(chunks, key=lambda chunk: chunk[0]):
+            index.add([text for _, text in group], doc_id)
+        return index
+
+    @classmethod
+    def load(cls, directory: Path, manifest: Dict) -> "IncrementalIndex":
+        """Open a saved index; the document-term matrix and texts stay memory-mapped."""
+        index = cls(n_features=manifest["n_features"])
+        index.texts = TextStore.load(directory, manifest)
+        index.doc_rows = load_documents(manifest)
+        index.doc_freq = np.array(load_array(directory, "doc_freq"))
+        index._ensure_capacity(manifest["num_rows"])
+        index.num_rows = manifest["num_rows"]
+        index.num_live = manifest["num_live"]
+        index._alive[:index.num_rows] = load_array(directory, "alive")
+        # Generations written before segments were saved separately hold one unnamed segment
+        layout = manifest.get("segments", [[0, index.num_rows, ""]] if index.num_rows else [])
+        for start, stop, name in layout:
+            matrix = sp.csr_matrix(
+                tuple(load_array(directory, _segment_array(name, array)) for array in SEGMENT_ARRAYS),
+                shape=(stop - start, index.n_features),
+            )
+            matrix.has_sorted_indices = True
+            index.segments.append((start, matrix))
+            index._saved_segments[(start, stop)] = name
+        return index
+
+    def save(self, directory: Path) -> Dict:
+        """Write the index into directory and return its manifest fields."""
+        fields = self.texts.save(directory)
+        saved = {}
+        for start, matrix in self.segments:
+            key = (start, start + matrix.shape[0])
+            name = self._saved_segments.get(key)
+            if name is None or not reuse_files(directory, [f"{_segment_array(name, a)}.npy" for a in SEGMENT_ARRAYS]):
+                name = new_part_name()
+                # A sorted copy: the segment may be read by searches meanwhile
+                matrix = matrix if matrix.has_sorted_indices else matrix.sorted_indices()
+                for array in SEGMENT_ARRAYS:
+                    save_array(directory, _segment_array(name, array), getattr(matrix, array))
+            saved[key] = name
+        save_array(directory, "doc_freq", self.doc_freq)
+        save_array(directory, "alive", self._alive[:self.num_rows])
+        self._saved_segments = saved
+        return {
+            "n_features": self.n_features,
+            "num_rows": self.num_rows,
+            "num_live": self.num_live,
+            "documents": save_documents(self.doc_rows),
+            "segments": [[start, stop, name] for (start, stop), name in saved.items()],
+            **fields,
+        }
+
+    def __len__(self) -> int:
+        return self.num_live
+
+    @staticmethod
+    def prepare(chunks: List[str], n_features: int = 2 ** 18) -> sp.csr_matrix:
+        """Hash chunks into L2-normalized term-frequency rows.
+
+        Needs no index state, so it can run in another process ahead of add().
+        """
+        counts = _hashing_vectorizer(n_features).transform(chunks).tocsr()
+        counts.sum_duplicates()
+        return normalize(counts, norm='l2', copy=False)
+
+    @staticmethod
+    def concat_prepared(parts: List[sp.csr_matrix]) -> sp.csr_matrix:
+        """prepare() of several chunk lists, as if they had been prepared as one."""
+        return sp.vstack(parts, format='csr')
+
+    def add(self, chunks: List[str], doc_id: str, prepared: Optional[sp.csr_matrix] = None):
+        """Append chunks for a new document without touching existing rows."""
+        if doc_id in self.doc_rows:
+            raise ValueError(f"Document {doc_id} is already indexed")
+        if not chunks:
+            return
+        if prepared is None or prepared.shape != (len(chunks), self.n_features):
+            prepared = self.prepare(chunks, self.n_features)
+        self.doc_freq += np.bincount(prepared.indices, minlength=self.n_features)
+
+        start = self.num_rows
+        stop = start + len(chunks)
+        self.segments.append((start, prepared))
+        self.texts.extend(chunks)
+        self.doc_rows[doc_id] = (start, stop)
+        self._ensure_capacity(stop)
+        self._alive[start:stop] = True
+        self.num_rows = stop
+        self.num_live += len(chunks)
+
+        self._merge_segments()
+
+    def clone(self) -> "IncrementalIndex":
+        """A copy to change off to the side; segment matrices are shared, never mutated."""
+        index = copy.copy(self)
+        index.doc_freq = self.doc_freq.copy()
+        index.segments = list(self.segments)
+        index.texts = self.texts.clone()
+        index.doc_rows = dict(self.doc_rows)
+        index._alive = self._alive.copy()
+        index._saved_segments = dict(self._saved_segments)
+        return index
+
+    def delete(self, doc_id: str) -> int:
+        """Tombstone every chunk of a document. Returns the number removed."""
+        if doc_id not in self.doc_rows:
+            return 0
+        start, stop = self.doc_rows.pop(doc_id)
+        segment = self._segment_for(start)
+        seg_start, matrix = self.segments[segment]
+        rows = matrix[start - seg_start:stop - seg_start]
+        self.doc_freq -= np.bincount(rows.indices, minlength=self.n_features)
+
+        self.texts.delete(start, stop)
+        self._alive[start:stop] = False
+        self.num_live -= stop - start
+        self._compact_segment(segment)
+        return stop - start
+
+    def documents(self) -> Dict[str, int]:
+        """Map each indexed doc ID to its chunk count."""
+        return {doc_id: stop - start for doc_id, (start, stop) in self.doc_rows.items()}
+
+    def iter_chunks(self) -> Iterator[Tuple[str, str]]:
+        """Yield (doc_id, text) for every live chunk, in row order."""
+        for doc_id, (start, stop) in self.doc_rows.items():
+            for row in range(start, stop):
+                yield doc_id, self.texts[row]
+
+    def get_text(self, row: int) -> Optional[str]:
+        return self.texts[row]
+
+    def memory_usage(self) -> MemoryUsage:
+        """Approximate size of the segment matrices, term statistics and texts."""
+        matrices = (array for _, m in self.segments for array in (m.data, m.indices, m.indptr))
+        return array_usage(*matrices, self.doc_freq, self._alive) + self.texts.memory_usage()
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to k (row, score) pairs for live rows, best first."""
+        if not self.num_live:
+            return []
+        with span("chat", "vectorize"):
+            query_counts = self.vectorizer.transform([query]).tocsr()
+            query_counts.sum_duplicates()
+
+            query_vec = np.zeros(self.n_features, dtype=np.float32)
+            if query_counts.nnz:
+                idf = np.log((1 + self.num_live) / (1 + self.doc_freq[query_counts.indices])) + 1.0
+                weights = query_counts.data * idf
+                query_vec[query_counts.indices] = weights * idf / np.linalg.norm(weights)
+
+        with span("chat", "score"):
+            scores = np.concatenate([matrix @ query_vec for _, matrix in self.segments])
+            scores[~self._alive[:self.num_rows]] = -np.inf
+        with span("chat", "top_k"):
+            return [
+                (int(i), float(scores[i]))
+                for i in top_k(scores, k)
+                if np.isfinite(scores[i])
+            ]
+
+    def search_batch(self, queries: List[str], k: int) -> List[List[Tuple[int, float]]]:
+        """search() for many queries: one transform and one sparse product per segment and block."""
+        if not self.num_live:
+            return [[] for _ in queries]
+        with span("batch", "vectorize"):
+            query_matrix = self.vectorizer.transform(queries).tocsr()
+            query_matrix.sum_duplicates()
+            # Same weighting as search(), applied to every query row at once
+            idf = np.log((1 + self.num_live) / (1 + self.doc_freq[query_matrix.indices])) + 1.0
+            weights = query_matrix.data * idf
+            row_of = np.repeat(np.arange(len(queries)), np.diff(query_matrix.indptr))
+            norms = np.sqrt(np.bincount(row_of, weights=weights ** 2, minlength=len(queries)))
+            query_matrix.data = (weights * idf / norms[row_of]).astype(np.float32)
+
+        dead = ~self._alive[:self.num_rows]
+        results = []
+        for start in range(0, len(queries), QUERY_BLOCK):
+            block = query_matrix[start:start + QUERY_BLOCK]
+            with span("batch", "score"):
+                scores = np.hstack([(block @ matrix.T).toarray() for _, matrix in self.segments])
+                scores[:, dead] = -np.inf
+            with span("batch", "top_k"):
+                results.extend(top_k_pairs(scores, k))
+        return results
+
+    def _segment_for(self, row: int) -> int:
+        starts = [start for start, _ in self.segments]
+        return bisect.bisect_right(starts, row) - 1
+
+    def _ensure_capacity(self, size: int):
+        if size > len(self._alive):
+            grown = np.zeros(max(size, 2 * len(self._alive)), dtype=bool)
+            grown[:self.num_rows] = self._alive[:self.num_rows]
+            self._alive = grown
+
+    def _compact_segment(self, segment: int):
+        """Drop the entries of a segment's deleted rows if they make up COMPACT_DEAD_FRACTION of it.
+
+        Rows keep their numbers, as empty rows, so nothing that refers to a row changes.
+        """
+        start, matrix = self.segments[segment]
+        stop = start + matrix.shape[0]
+        entries = np.diff(matrix.indptr)
+        alive = self._alive[start:stop]
+        dead_entries = int(entries[~alive].sum())
+        if not dead_entries or dead_entries < COMPACT_DEAD_FRACTION * matrix.nnz:
+            return
+        keep = np.repeat(alive, entries)
+        indptr = np.zeros(len(entries) + 1, dtype=matrix.indptr.dtype)
+        np.cumsum(np.where(alive, entries, 0), out=indptr[1:])
+        compacted = sp.csr_matrix((matrix.data[keep], matrix.indices[keep], indptr), shape=matrix.shape)
+        compacted.has_sorted_indices = matrix.has_sorted_indices
+        # A new list entry: the segment matrix itself may be shared with the published index
+        self.segments[segment] = (start, compacted)
+        self._saved_segments.pop((start, stop), None)
+        logger.debug("Compacted rows %d-%d: dropped %d of %d entries", start, stop, dead_entries, matrix.nnz)
+
+    def _merge_segments(self):
+        """Merge the newest segments while they are at least as large as their predecessor.
+
+        Like a binary counter, this keeps O(log n) segments and copies each row
+        O(log n) times overall, so per-query overhead stays bounded without ever
+        rewriting the whole corpus on a single add.
+        """
+        while len(self.segments) > 1 and self.segments[-1][1].shape[0] >= self.segments[-2][1].shape[0]:
+            (start, older), (_, newer) = self.segments[-2:]
+            self.segments[-2:] = [(start, sp.vstack([older, newer], format='csr'))]
@@ -0,0 +1,433 @@
+"""Versioned, memory-mapped on-disk index format.
+
+An index root holds immutable generation directories plus a ``CURRENT`` file naming
+the live one::
+
+    index/
+        CURRENT                 -> "gen-00000003"
+        LOCK                    flock()ed by whichever process is writing
+        gen-00000003/
+            manifest.json       format version, backend, document ranges, shapes, parts
+            texts-<part>.bin    the UTF-8 texts of a range of rows, back to back
+            text_offsets-<part>.npy
+                                int64 byte offsets into texts-<part>.bin (rows + 1 entries)
+            *.npy               backend arrays (CSR buffers, IDF, postings, ...)
+
+A generation is written into a temporary directory, fsynced and renamed into place,
+and only then is ``CURRENT`` swapped with an atomic ``os.replace``. A crash at any
+point leaves the previous generation live. Rows are append-only, so texts (and the
+incremental backend's matrix segments) are stored as immutable parts with unique
+names: a new generation hard-links the parts it shares with the live one and only
+writes the new rows, so saving after an upload costs what the upload added, not the
+whole corpus. Each generation directory still holds every file it needs. Arrays are opened with ``np.load(...,
+mmap_mode='r')`` and the text blob with ``mmap``, so loading costs no parsing and
+the pages are shared by every worker process that maps the same generation.
+"""
+import bisect
+import json
+import logging
+import mmap
+import os
+import shutil
+import sys
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# numpy is imported by the functions that use it: the generation helpers below are
+# needed at start-up, the arrays only once an index is loaded
+if TYPE_CHECKING:
+    import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "LOCK"
+MANIFEST_FILE = "manifest.json"
+GENERATION_PREFIX = "gen-"
+# Rough heap cost of one vocabulary entry: a short str object plus its dict slot
+_TERM_BYTES = 80
+# A saved text part is rewritten without its deleted rows' texts once they are this share of its rows
+COMPACT_DEAD_FRACTION = 0.3
+
+
+@dataclass(frozen=True)
+class MemoryUsage:
+    """Bytes an index holds on the heap and in memory-mapped generation files.
+
+    Mapped bytes are page cache: shared by every worker that maps the same
+    generation, and dropped by the kernel under memory pressure rather than swapped.
+    """
+    heap: int = 0
+    mapped: int = 0
+
+    def __add__(self, other: "MemoryUsage") -> "MemoryUsage":
+        return MemoryUsage(self.heap + other.heap, self.mapped + other.mapped)
+
+
+def array_usage(*arrays: "np.ndarray") -> MemoryUsage:
+    """Split the arrays' bytes by whether they are views of a load_array mapping."""
+    import numpy as np
+    heap = mapped = 0
+    for array in arrays:
+        base = array
+        while base is not None and not isinstance(base, (np.memmap, mmap.mmap)):
+            base = getattr(base, "base", None)
+        if base is None:
+            heap += array.nbytes
+        else:
+            mapped += array.nbytes
+    return MemoryUsage(heap, mapped)
+
+
+def vocabulary_usage(vocabulary: Dict[str, int]) -> MemoryUsage:
+    return MemoryUsage(heap=sys.getsizeof(vocabulary) + len(vocabulary) * _TERM_BYTES)
+
+
+class TextStore:
+    """Chunk texts addressed by row: memory-mapped parts plus in-memory appends.
+
+    Deleted rows read back as ``None``. ``save`` writes the rows appended since the
+    last save or load as a new part and links the parts already on disk; trailing
+    parts are merged while the newest is at least as large as the one before it, so
+    a store keeps O(log n) parts, and a part is rewritten with its deleted rows left
+    empty once they make up COMPACT_DEAD_FRACTION of it. Once saved, the parts are
+    mapped in place of the appended rows, so appends only stay in memory until the
+    next save.
+    """
+
+    def __init__(self):
+        # (first row of each part, (first row, blob, offsets) per part, rows held by parts, appended rows),
+        # replaced as a whole so readers never see half of a save's swap
+        self._state: Tuple[List[int], List[Tuple[int, Any, "np.ndarray"]], int, List[Optional[str]]] = ([], [], 0, [])
+        self._deleted = set()
+        # (first row, stop row) -> name of the part holding those rows in the generation last saved or loaded
+        self._saved: Dict[Tuple[int, int], str] = {}
+
+    @classmethod
+    def load(cls, directory: Path, manifest: Dict) -> "TextStore":
+        store = cls()
+        # Generations written before parts existed hold a single unnamed part
+        store._map_parts(directory, manifest.get("text_parts", [[0, None, ""]]))
+        store._deleted = set(load_array(directory, "texts_deleted").tolist())
+        return store
+
+    def save(self, directory: Path) -> Dict:
+        """Write the texts into directory and return their manifest fields."""
+        import numpy as np
+        ranges = sorted(self._saved)
+        if len(self) > (ranges[-1][1] if ranges else 0):
+            ranges.append((ranges[-1][1] if ranges else 0, len(self)))
+        while len(ranges) > 1 and ranges[-1][1] - ranges[-1][0] >= ranges[-2][1] - ranges[-2][0]:
+            ranges[-2:] = [(ranges[-2][0], ranges[-1][1])]
+        deleted = sorted(self._deleted)
+        layout = []
+        for first, stop in ranges:
+            name = self._saved.get((first, stop))
+            dead = deleted[bisect.bisect_left(deleted, first):bisect.bisect_left(deleted, stop)]
+            if len(dead) >= COMPACT_DEAD_FRACTION * (stop - first) and self._saved_bytes(dead):
+                # Deleted texts are written as empty strings, so a compacted part is reused from then on
+                name = None
+            if name is None or not reuse_files(directory, _text_part_files(name, ".npy")):
+                name = new_part_name()
+                _write_text_part(directory, name, (self[row] for row in range(first, stop)))
+            layout.append((first, stop, name))
+        save_array(directory, "texts_deleted", np.array(deleted, dtype=np.int64))
+        # The mappings outlive the rename of directory and the pruning of its generation
+        self._map_parts(directory, layout)
+        return {"text_parts": [list(part) for part in layout]}
+
+    def _map_parts(self, directory: Path, layout: List[Tuple[int, Optional[int], str]]):
+        starts, parts, base = [], [], 0
+        for first, _, name in layout:
+            blob_file, offsets_name = _text_part_files(name)
+            offsets = load_array(directory, offsets_name)
+            blob = b""
+            if offsets[-1] > 0:
+                with open(directory / blob_file, 'rb') as f:
+                    blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            starts.append(first)
+            parts.append((first, blob, offsets))
+            base = first + len(offsets) - 1
+        _, _, old_base, appended = self._state
+        self._state = (starts, parts, base, appended[base - old_base:])
+        self._saved = {(first, stop if stop is not None else base): name for first, stop, name in layout}
+
+    def _saved_bytes(self, rows: List[int]) -> int:
+        """Bytes the given rows take up in the mapped parts."""
+        starts, parts, base, _ = self._state
+        total = 0
+        for row in rows:
+            if row < base:
+                first, _, offsets = parts[bisect.bisect_right(starts, row) - 1]
+                total += int(offsets[row - first + 1] - offsets[row - first])
+        return total
+
+    def __len__(self) -> int:
+        _, _, base, appended = self._state
+        return base + len(appended)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        if row in self._deleted:
+            return None
+        starts, parts, base, appended = self._state
+        if row >= base:
+            return appended[row - base]
+        first, blob, offsets = parts[bisect.bisect_right(starts, row) - 1]
+        start, stop = offsets[row - first], offsets[row - first + 1]
+        return blob[start:stop].decode('utf-8')
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def extend(self, texts: Iterable[str]):
+        self._state[3].extend(texts)
+
+    def memory_usage(self) -> MemoryUsage:
+        """Appended rows and the deleted-row set are on the heap; saved parts are mapped."""
+        _, parts, _, appended = self._state
+        usage = MemoryUsage(
+            heap=sum(sys.getsizeof(text) for text in appended if text is not None) + sys.getsizeof(self._deleted),
+            mapped=sum(len(blob) for _, blob, _ in parts),
+        )
+        return usage + array_usage(*(offsets for _, _, offsets in parts))
+
+    def clone(self) -> "TextStore":
+        """A copy that can be appended to and deleted from without affecting this one."""
+        store = TextStore()
+        starts, parts, base, appended = self._state
+        store._state = (starts, parts, base, list(appended))
+        store._deleted = set(self._deleted)
+        store._saved = dict(self._saved)
+        return store
+
+    def delete(self, start: int, stop: int):
+        self._deleted.update(range(start, stop))
+        # Release memory held by appended rows; mapped rows cost nothing
+        _, _, base, appended = self._state
+        for row in range(max(start, base), stop):
+            appended[row - base] = None
+
+
+def _text_part_files(name: str, offsets_suffix: str = "") -> Tuple[str, str]:
+    """The blob file and offsets array names of a text part (the unnamed part is the pre-parts layout)."""
+    suffix = f"-{name}" if name else ""
+    return f"texts{suffix}.bin", f"text_offsets{suffix}{offsets_suffix}"
+
+
+def save_texts(directory: Path, texts: Iterable[Optional[str]], deleted: Iterable[int] = ()):
+    """Write texts as a single unnamed part."""
+    import numpy as np
+    _write_text_part(directory, "", texts)
+    save_array(directory, "texts_deleted", np.array(sorted(deleted), dtype=np.int64))
+
+
+def _write_text_part(directory: Path, name: str, texts: Iterable[Optional[str]]):
+    """Write texts as one contiguous UTF-8 blob plus an offsets array."""
+    import numpy as np
+    blob_file, offsets_name = _text_part_files(name)
+    offsets = [0]
+    with open(directory / blob_file, 'wb') as f:
+        for text in texts:
+            data = (text or "").encode('utf-8')
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+        f.flush()
+        os.fsync(f.fileno())
+    save_array(directory, offsets_name, np.array(offsets, dtype=np.int64))
+
+
+def new_part_name() -> str:
+    """A name for a new immutable part; unique, so equal names in two generations mean equal files."""
+    return uuid.uuid4().hex[:16]
+
+
+def reuse_files(directory: Path, names: Iterable[str]) -> bool:
+    """Hard-link files ``names`` of the live generation into ``directory``, a generation being written.
+
+    Returns False, leaving none of them linked, if the live generation lacks one of
+    them or it cannot be linked (e.g. on a filesystem without hard links); the
+    caller then writes them instead. A linked file shares its inode with the live
+    generation, so it must never be reopened for writing.
+    """
+    live = current_generation(directory.parent)
+    if live is None:
+        return False
+    linked = []
+    try:
+        for name in names:
+            os.link(live / name, directory / name)
+            linked.append(name)
+    except OSError:
+        for name in linked:
+            os.unlink(directory / name)
+        return False
+    return True
+
+
+def save_array(directory: Path, name: str, array: "np.ndarray"):
+    import numpy as np
+    with open(directory / f"{name}.npy", 'wb') as f:
+        np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def load_array(directory: Path, name: str) -> "np.ndarray":
+    """Memory-map an array written by save_array (read-only)."""
+    import numpy as np
+    path = directory / f"{name}.npy"
+    try:
+        return np.load(path, mmap_mode='r', allow_pickle=False)
+    except ValueError:
+        # Zero-length arrays cannot be memory-mapped
+        return np.load(path, allow_pickle=False)
+
+
+def save_documents(doc_rows: Dict[str, Tuple[int, int]]) -> List:
+    """Serialize doc ID -> (start, stop) row ranges for the manifest."""
+    return [[doc_id, start, stop] for doc_id, (start, stop) in doc_rows.items()]
+
+
+def load_documents(manifest: Dict) -> Dict[str, Tuple[int, int]]:
+    return {doc_id: (start, stop) for doc_id, start, stop in manifest["documents"]}
+
+
+def write_generation(root: Path, write: Callable[[Path], Dict], keep: int = 2) -> Path:
+    """Write a new generation with ``write(tmp_dir) -> manifest`` and make it current."""
+    root.mkdir(parents=True, exist_ok=True)
+    tmp_dir = root / f".tmp-{uuid.uuid4().hex}"
+    tmp_dir.mkdir()
+    try:
+        manifest = write(tmp_dir)
+        manifest["format_version"] = FORMAT_VERSION
+        with open(tmp_dir / MANIFEST_FILE, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        generation = _latest_generation_number(root) + 1
+        final_dir = root / f"{GENERATION_PREFIX}{generation:08d}"
+        os.rename(tmp_dir, final_dir)
+        _fsync_dir(root)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    tmp_current = root / f".{CURRENT_FILE}.{uuid.uuid4().hex}"
+    with open(tmp_current, 'w') as f:
+        f.write(final_dir.name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_current, root / CURRENT_FILE)
+    _fsync_dir(root)
+    logger.info(f"Published index generation {final_dir.name}")
+
+    _prune_generations(root, keep)
+    return final_dir
+
+
+def delete_generations(root: Path):
+    """Unpublish the index at ``root``: remove ``CURRENT`` first, then the generations.
+
+    Call it holding ``writer_lock(root)``; the lock file is kept, so writers waiting
+    on it stay serialized. The newest generation's directory is kept too, emptied, so
+    generation numbers carry on from it and a generation path never names two
+    different indexes.
+    """
+    if not root.exists():
+        return
+    try:
+        os.unlink(root / CURRENT_FILE)
+        _fsync_dir(root)
+    except FileNotFoundError:
+        pass
+    newest = f"{GENERATION_PREFIX}{_latest_generation_number(root):08d}"
+    for path in root.iterdir():
+        if path.name == LOCK_FILE:
+            continue
+        if path.name == newest:
+            for child in path.iterdir():
+                child.unlink()
+        elif path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink()
+
+
+def current_generation(root: Path) -> Optional[Path]:
+    """The live generation directory, or None if there is none; reads only ``CURRENT``."""
+    try:
+        return root / (root / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+def generation_number(directory: Path) -> int:
+    return int(directory.name[len(GENERATION_PREFIX):])
+
+
+@contextmanager
+def writer_lock(root: Path) -> Iterator[None]:
+    """Hold an exclusive lock on an index root, across processes, while writing to it."""
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / LOCK_FILE, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def open_current(root: Path) -> Optional[Tuple[Path, Dict]]:
+    """Return the live generation directory and its manifest, or None if there is none."""
+    directory = current_generation(root)
+    if directory is None:
+        return None
+    with open(directory / MANIFEST_FILE, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported index format version {manifest.get('format_version')} in {directory}, "
+            f"expected {FORMAT_VERSION}"
+        )
+    return directory, manifest
+
+
+def _latest_generation_number(root: Path) -> int:
+    numbers = [
+        int(p.name[len(GENERATION_PREFIX):])
+        for p in root.glob(f"{GENERATION_PREFIX}*")
+        if p.name[len(GENERATION_PREFIX):].isdigit()
+    ]
+    return max(numbers, default=0)
+
+
+def _prune_generations(root: Path, keep: int):
+    """Remove all but the newest ``keep`` generations.
+
+    Workers that still map an older generation keep reading it safely: on POSIX the
+    pages stay valid until they are unmapped.
+    """
+    generations = sorted(p for p in root.glob(f"{GENERATION_PREFIX}*") if p.is_dir())
+    for old in generations[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def _fsync_dir(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,124 @@
+"""CPU-bound ingestion work that runs in a bounded process pool, off the event loop.
+
+Functions here are submitted to the pool by reference, so they must stay importable
+module-level functions with picklable arguments and results.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from .document_processor import DocumentProcessor, index_backend_class
+
+logger = logging.getLogger(__name__)
+
+
+def create_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Create the ingestion pool. Workers are spawned, not forked, so they never
+    inherit the server's threads or locks."""
+    logger.info(f"Starting ingestion process pool with {max_workers} workers")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _processor(chunk_size: int, chunk_overlap: int, chunk_unit: str) -> DocumentProcessor:
+    processor = DocumentProcessor(chunk_unit=chunk_unit)
+    processor.chunk_size = chunk_size
+    processor.chunk_overlap = chunk_overlap
+    return processor
+
+
+def process_file(file_path: str, index_backend: str, chunk_size: int, chunk_overlap: int, chunk_unit: str) -> Tuple[List[str], Any, Dict]:
+    """Extract, clean and chunk a file, then vectorize the chunks for index_backend.
+
+    Returns the chunks, the backend's prepared vectors and a stats dict with the
+    page count (PDFs) and per-stage timings in seconds.
+    """
+    processor = _processor(chunk_size, chunk_overlap, chunk_unit)
+    path = Path(file_path)
+    stats = {}
+    if path.suffix == '.pdf':
+        chunks = processor.process_pdf(path, stats)
+    else:
+        chunks = processor.process_text(path, stats)
+    start = time.perf_counter()
+    prepared = index_backend_class(index_backend).prepare(chunks)
+    stats["vectorize_s"] = time.perf_counter() - start
+    return chunks, prepared, stats
+
+
+def prepare_chunks(chunks: List[str], index_backend: str) -> Tuple[Any, Dict]:
+    """Vectorize already-chunked text for index_backend, e.g. chunks from the cache."""
+    start = time.perf_counter()
+    prepared = index_backend_class(index_backend).prepare(chunks)
+    return prepared, {"vectorize_s": time.perf_counter() - start}
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """Number of pages in a PDF, used to decide how to shard its extraction."""
+    return DocumentProcessor().count_pdf_pages(Path(file_path))
+
+
+def plan_pdf_shards(n_pages: int, min_shard_pages: int, max_shards: int) -> List[Tuple[int, int]]:
+    """Split pages [0, n_pages) into at most max_shards contiguous [start, stop) ranges.
+
+    Every shard re-opens and re-parses the PDF, so shards hold at least
+    min_shard_pages pages and there are no more of them than workers to run them.
+    """
+    n_shards = max(1, min(max_shards, n_pages // max(1, min_shard_pages)))
+    bounds = [n_pages * i // n_shards for i in range(n_shards + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def process_pdf_range(file_path: str, start: int, stop: int, index_backend: str, chunk_size: int, chunk_overlap: int,
+                      chunk_unit: str) -> Tuple[List[str], Any, Dict]:
+    """process_file for pages [start, stop) of a PDF: one shard of a large PDF.
+
+    Only chunks and vectors come back, so the text of a shard never leaves its
+    worker. Chunks do not span shards: the first chunk of a shard does not
+    overlap the last one of the shard before.
+    """
+    processor = _processor(chunk_size, chunk_overlap, chunk_unit)
+    stats = {}
+    chunks = processor.process_pdf(Path(file_path), stats, start, stop)
+    began = time.perf_counter()
+    prepared = index_backend_class(index_backend).prepare(chunks)
+    stats["vectorize_s"] = time.perf_counter() - began
+    return chunks, prepared, stats
+
+
+def join_shards(results: List[Tuple[List[str], Any, Dict]], index_backend: str) -> Tuple[List[str], Any, Dict]:
+    """Concatenate process_pdf_range results, given in page order; stage timings are summed."""
+    chunks = [chunk for shard_chunks, _, _ in results for chunk in shard_chunks]
+    prepared = index_backend_class(index_backend).concat_prepared([shard_prepared for _, shard_prepared, _ in results])
+    stats = {}
+    for _, _, shard_stats in results:
+        for name, value in shard_stats.items():
+            stats[name] = stats.get(name, 0) + value
+    return chunks, prepared, stats
+
+
+def process_pasted_text(text: str, index_backend: str, chunk_size: int, chunk_overlap: int, chunk_unit: str) -> Tuple[List[str], Any, Dict]:
+    """Clean and chunk pasted text, then vectorize the chunks for index_backend.
+
+    Returns the same (chunks, prepared, stats) triple as process_file.
+    """
+    stats = {}
+    chunks = _processor(chunk_size, chunk_overlap, chunk_unit).process_pasted_text(text, stats)
+    start = time.perf_counter()
+    prepared = index_backend_class(index_backend).prepare(chunks)
+    stats["vectorize_s"] = time.perf_counter() - start
+    return chunks, prepared, stats
+
+
+def warm_up_worker(index_backend: str, chunk_unit: str) -> int:
+    """Import the extraction and vectorizing code in a worker and run a tiny text through it.
+
+    Returns the worker's process ID.
+    """
+    import PyPDF2  # noqa: F401  (imported for its start-up cost only)
+    # Long enough to make a chunk: shorter text is dropped before vectorizing
+    process_pasted_text("The ingestion worker is warming up. " * 100, index_backend, 2000, 300, chunk_unit)
+    return os.getpid()
@@ -0,0 +1,375 @@
+"""Background ingestion jobs: a SQLite-backed job table and an in-process worker queue.
+
+Uploads are recorded as jobs and return immediately; a fixed number of asyncio
+workers run them through the ingestion stages and record progress and timings as
+they go. Because the uploaded file and the job row both live on disk, a failed job
+can be retried without re-uploading, and jobs interrupted by a restart are
+picked up again.
+
+Several worker processes share the table. Each queued or running job is leased
+to the process that will run it, which renews the lease while it is alive; a job
+runs only once its owner has claimed it with an atomic update, and another
+process takes a job over only after its lease has expired.
+
+SQLite calls block, so the queue makes them from the thread pool; the store
+serializes them on its one connection.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_JSON_FIELDS = ("progress", "timings")
+
+
+def _locked(method):
+    """Run a JobStore method under the store's lock."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class JobStore:
+    """Persists job records in a small SQLite table.
+
+    Safe to use from several threads: they share one connection and take turns on it.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        # Held across every read-modify-write, so e.g. two updates never merge progress from the same stale row
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                content_hash TEXT,
+                collection TEXT,
+                doc_id TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                lease_expires_at REAL,
+                progress TEXT NOT NULL DEFAULT '{}',
+                timings TEXT NOT NULL DEFAULT '{}',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "content_hash" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN content_hash TEXT")
+        if "collection" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN collection TEXT")
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_content_hash ON jobs (content_hash)")
+
+    @_locked
+    def create(self, filename: str, file_path: Path, job_id: Optional[str] = None,
+               content_hash: Optional[str] = None, collection: Optional[str] = None) -> Dict:
+        now = time.time()
+        job_id = job_id or uuid.uuid4().hex
+        self._conn.execute(
+            "INSERT INTO jobs (id, status, stage, filename, file_path, content_hash, collection, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, QUEUED, filename, str(file_path), content_hash, collection, now, now),
+        )
+        return self.get(job_id)
+
+    @_locked
+    def completed_doc_ids(self, content_hash: str) -> List[str]:
+        """Doc IDs of completed jobs for the same content, newest first."""
+        rows = self._conn.execute(
+            "SELECT doc_id FROM jobs WHERE content_hash = ? AND status = ? AND doc_id IS NOT NULL "
+            "ORDER BY updated_at DESC",
+            (content_hash, COMPLETED),
+        )
+        return [row["doc_id"] for row in rows]
+
+    @_locked
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    @_locked
+    def list(self, limit: int = 50, statuses: Optional[List[str]] = None) -> List[Dict]:
+        if statuses:
+            marks = ",".join("?" * len(statuses))
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({marks}) ORDER BY created_at DESC LIMIT ?",
+                (*statuses, limit),
+            )
+        else:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [self._to_dict(row) for row in rows]
+
+    @_locked
+    def update(self, job_id: str, **fields) -> Dict:
+        """Update columns; ``progress`` and ``timings`` dicts are merged into the stored ones."""
+        job = self.get(job_id)
+        for name in _JSON_FIELDS:
+            if name in fields:
+                fields[name] = json.dumps({**job[name], **fields[name]})
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        return self.get(job_id)
+
+    @_locked
+    def lease(self, job_id: str, owner: str, lease_s: float, statuses: List[str]) -> Optional[Dict]:
+        """Queue the job for ``owner`` if its status is one of ``statuses``; None if it is not."""
+        now = time.time()
+        marks = ",".join("?" * len(statuses))
+        cursor = self._conn.execute(
+            f"UPDATE jobs SET status = ?, stage = ?, error = NULL, owner = ?, lease_expires_at = ?, updated_at = ? "
+            f"WHERE id = ? AND status IN ({marks})",
+            (QUEUED, QUEUED, owner, now + lease_s, now, job_id, *statuses),
+        )
+        return self.get(job_id) if cursor.rowcount else None
+
+    @_locked
+    def claim(self, job_id: str, owner: str, lease_s: float) -> Optional[Dict]:
+        """Mark a job queued for ``owner`` as running; None if it was taken over or is not queued."""
+        now = time.time()
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_expires_at = ?, updated_at = ? "
+            "WHERE id = ? AND owner = ? AND status = ?",
+            (RUNNING, now + lease_s, now, job_id, owner, QUEUED),
+        )
+        return self.get(job_id) if cursor.rowcount else None
+
+    @_locked
+    def adopt_expired(self, owner: str, lease_s: float) -> List[str]:
+        """Queue for ``owner`` every queued or running job whose owner's lease has expired.
+
+        Returns their IDs, oldest first.
+        """
+        now = time.time()
+        expired = self._conn.execute(
+            "SELECT id FROM jobs WHERE status IN (?, ?) AND (lease_expires_at IS NULL OR lease_expires_at < ?) "
+            "ORDER BY created_at",
+            (QUEUED, RUNNING, now),
+        ).fetchall()
+        adopted = []
+        for row in expired:
+            # Another process may adopt the same job meanwhile; only one update matches
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, owner = ?, lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND status IN (?, ?) AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (QUEUED, QUEUED, owner, now + lease_s, now, row["id"], QUEUED, RUNNING, now),
+            )
+            if cursor.rowcount:
+                adopted.append(row["id"])
+        return adopted
+
+    @_locked
+    def cancel_collection(self, collection: str, error: str) -> List[str]:
+        """Fail every queued or running job of a collection with ``error``. Returns their IDs."""
+        pending = self._conn.execute(
+            "SELECT id FROM jobs WHERE collection = ? AND status IN (?, ?)", (collection, QUEUED, RUNNING)
+        ).fetchall()
+        cancelled = []
+        for row in pending:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, owner = NULL, lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ? AND status IN (?, ?)",
+                (FAILED, error, time.time(), row["id"], QUEUED, RUNNING),
+            )
+            if cursor.rowcount:
+                cancelled.append(row["id"])
+        return cancelled
+
+    @_locked
+    def renew(self, owner: str, lease_s: float, expires_at: Optional[float] = None):
+        """Extend the leases of every queued or running job ``owner`` holds (or set them to ``expires_at``)."""
+        expires_at = time.time() + lease_s if expires_at is None else expires_at
+        self._conn.execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE owner = ? AND status IN (?, ?)",
+            (expires_at, owner, QUEUED, RUNNING),
+        )
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        for name in _JSON_FIELDS:
+            job[name] = json.loads(job[name])
+        job["job_id"] = job.pop("id")
+        return job
+
+
+# handler(job, report) runs one job; await report(**fields) records stage/progress/timings
+JobHandler = Callable[[Dict, Callable[..., Awaitable[None]]], Awaitable[Dict]]
+
+
+class JobQueue:
+    """Runs queued jobs on a fixed number of asyncio worker tasks.
+
+    Jobs are leased for ``lease_s`` seconds and the leases renewed every third of
+    that, when this process also takes over jobs whose owner's lease has expired.
+    """
+
+    def __init__(self, store: JobStore, handler: JobHandler, concurrency: int, max_queued: int,
+                 lease_s: float = 30.0):
+        self.store = store
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.lease_s = lease_s
+        # Identifies this process's leases; a restarted process gets a new one
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._done: Dict[str, asyncio.Event] = {}
+        self.adopted = 0
+        self.lost = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        # Jobs interrupted by a restart still have their file on disk: run them again
+        await self._adopt_expired()
+        self._workers.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Let another process pick up what this one had queued or running straight away
+        await run_in_threadpool(self.store.renew, self.owner, self.lease_s, expires_at=0.0)
+
+    def stats(self) -> Dict:
+        return {"depth": self.depth, "adopted": self.adopted, "lost": self.lost}
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self, job_id: str):
+        """Queue a job that is already recorded in the store."""
+        await run_in_threadpool(self.store.lease, job_id, self.owner, self.lease_s, [QUEUED])
+        self._enqueue(job_id)
+
+    def is_full(self) -> bool:
+        return self.depth >= self.max_queued
+
+    async def retry(self, job_id: str) -> Dict:
+        """Re-queue a failed job; its uploaded file is reused.
+
+        If the job is no longer failed (another process retried it first) its record is returned unchanged.
+        """
+        job = await run_in_threadpool(self.store.lease, job_id, self.owner, self.lease_s, [FAILED])
+        if job is None:
+            return await run_in_threadpool(self.store.get, job_id)
+        self._enqueue(job_id)
+        return job
+
+    async def wait(self, job_id: str) -> Dict:
+        """Wait until a job has completed or failed and return its record."""
+        event = self._done.get(job_id)
+        if event is not None:
+            await event.wait()
+        job = await run_in_threadpool(self.store.get, job_id)
+        # Taken over by another process: its record shows when that one finishes
+        while job["status"] in (QUEUED, RUNNING):
+            await asyncio.sleep(0.5)
+            job = await run_in_threadpool(self.store.get, job_id)
+        return job
+
+    async def _adopt_expired(self):
+        for job_id in await run_in_threadpool(self.store.adopt_expired, self.owner, self.lease_s):
+            logger.info(f"Resuming interrupted job {job_id}")
+            self.adopted += 1
+            self._enqueue(job_id)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.lease_s / 3)
+            try:
+                await run_in_threadpool(self.store.renew, self.owner, self.lease_s)
+                await self._adopt_expired()
+            except Exception as e:
+                logger.error(f"Error renewing job leases: {str(e)}")
+
+    def _enqueue(self, job_id: str):
+        self._done[job_id] = asyncio.Event()
+        self._queue.put_nowait(job_id)
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+                event = self._done.pop(job_id, None)
+                if event is not None:
+                    event.set()
+
+    async def _run(self, job_id: str):
+        queued_at = (await run_in_threadpool(self.store.get, job_id))["updated_at"]
+        job = await run_in_threadpool(self.store.claim, job_id, self.owner, self.lease_s)
+        if job is None and (await run_in_threadpool(self.store.get, job_id))["status"] == FAILED:
+            logger.info(f"Job {job_id} was cancelled, skipping it")
+            return
+        if job is None:
+            # This process's lease lapsed (e.g. the event loop stalled) and another one took the job
+            logger.warning(f"Job {job_id} was taken over by another process, skipping it")
+            self.lost += 1
+            return
+        job = await run_in_threadpool(self.store.update, job_id, timings={"queued_s": time.time() - queued_at})
+        logger.info(f"Running job {job_id} ({job['filename']}), attempt {job['attempts']}")
+        start = time.perf_counter()
+
+        async def report(**fields):
+            await run_in_threadpool(self.store.update, job_id, **fields)
+
+        try:
+            result = await self.handler(job, report)
+            await run_in_threadpool(
+                self.store.update,
+                job_id,
+                status=COMPLETED,
+                stage="done",
+                timings={"total_s": time.perf_counter() - start},
+                **result,
+            )
+            logger.info(f"Job {job_id} completed in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            logger.debug(traceback.format_exc())
+            await run_in_threadpool(
+                self.store.update,
+                job_id,
+                status=FAILED,
+                error=str(e),
+                timings={"total_s": time.perf_counter() - start},
+            )
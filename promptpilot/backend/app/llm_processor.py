@@ -1,17 +1,33 @@
 import os
+import hashlib
+import json
 import logging
-from groq import Groq
-from typing import List
-from dotenv import load_dotenv
+import math
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional
+from .concurrency import OverloadedError
+from .context_builder import count_tokens
+from .llm_scheduler import INTERACTIVE, LLMScheduler, retry_after_s
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# agenerate_answer returns errors as text starting with this
+GENERATION_ERROR_PREFIX = "Error generating answer"
+
+SYSTEM_PROMPT = (
+    "You answer questions using only the provided context. Be specific and clear, in a professional tone. "
+    "If the answer is only partly in the context, say what information is missing. If nothing relevant is "
+    "there, say \"I cannot find the answer in the provided context\". If the context is unrelated to the "
+    "question, or is only a table of contents or outline, say so and explain what would be needed."
+)
+
+MAX_COMPLETION_TOKENS = 1024
+# Reserved against the tokens-per-minute limit for an answer's length until the real usage is known
+EXPECTED_COMPLETION_TOKENS = 256
 
 class LLMProcessor:
-    def __init__(self):
+    def __init__(self, scheduler: Optional[LLMScheduler] = None):
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             error_msg = "GROQ_API_KEY environment variable is not set. Please set it in your .env file or environment variables."
@@ -19,7 +35,14 @@ class LLMProcessor:
             raise ValueError(error_msg)
         
         try:
-            self.client = Groq(api_key=api_key)
+            # Imported here so the server starts, and serves everything but chat, without it
+            from groq import AsyncGroq
+            # GROQ_BASE_URL lets benchmarks point the client at a local fake server
+            base_url = os.getenv("GROQ_BASE_URL") or None
+            # Async, so a slow generation doesn't tie up a worker. Its calls go through
+            # the scheduler, which does the retrying, so the SDK's own retries are off
+            self.async_client = AsyncGroq(api_key=api_key, base_url=base_url, max_retries=0)
+            self.scheduler = scheduler or LLMScheduler()
             self.model = "llama-3.3-70b-versatile"
             logger.info("Successfully initialized Groq client")
         except Exception as e:
@@ -27,107 +50,104 @@ class LLMProcessor:
             logger.error(error_msg)
             raise ValueError(error_msg)
         
-    def generate_answer(self, question: str, context: List[str]) -> str:
-        """Generate an answer based on the question and context."""
-        try:
-            # Combine context chunks into a single string with clear separation
-            context_text = "\n\n---\n\n".join([f"Context {i+1}:\n{chunk}" for i, chunk in enumerate(context)])
-            
-            # Create enhanced prompt template
-            prompt = f"""You are a helpful AI assistant specialized in answering questions based on provided context. Your task is to:
-
-1. Carefully analyze the provided context
-2. Answer the question using ONLY information from the context
-3. If the answer is not fully available in the context, explain what information is missing
-4. If you cannot find any relevant information, say "I cannot find the answer in the provided context"
-5. Be specific and detailed in your answers
-6. Maintain a professional and clear tone
-
-Context:
-{context_text}
-
-Question: {question}
-
-Remember to:
-- Base your answer ONLY on the provided context
-- Be specific and detailed
-- Acknowledge any limitations in the available information
-- Maintain a professional tone
-- If the context seems unrelated to the question, explicitly state this
-- If the context is a table of contents or outline, acknowledge this and explain what information would be needed for a complete answer
+    async def agenerate_answer(self, question: str, context: List[str], priority: int = INTERACTIVE) -> str:
+        """Generate an answer with the async client, without blocking the event loop.
 
-Answer:"""
+        The call is queued by the scheduler at ``priority``; an identical prompt
+        already in flight is shared rather than sent again. Raises OverloadedError
+        when the queue is full or the provider is still rate limiting after retries.
+        """
+        import groq
+        try:
+            messages = self._build_messages(question, context)
+            self._log_prompt(messages)
+            tokens = self._reserve_tokens(messages)
             
-            logger.info("Sending request to Groq API")
-            # Generate answer using Groq with adjusted parameters
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful AI assistant that provides detailed, accurate answers based on the provided context. You are thorough in your analysis and clear in your explanations. You always acknowledge when the context is insufficient or unrelated to the question. You are particularly good at identifying when the context is a table of contents or outline and explaining what additional information would be needed."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,  # Further reduced for more focused answers
-                max_tokens=1024,
-                top_p=0.9
-            )
+            async def create():
+                response = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=MAX_COMPLETION_TOKENS,
+                    top_p=0.9
+                )
+                usage = getattr(response, "usage", None)
+                if tokens and usage is not None:
+                    self.scheduler.settle(tokens, usage.total_tokens)
+                return response
             
+            response = await self.scheduler.call(create, priority, tokens, key=self._request_key(messages, priority))
             answer = response.choices[0].message.content.strip()
-            logger.info("Successfully received response from Groq API")
+            logger.debug("Successfully received response from Groq API")
+            self._log_usage(response)
             return answer
-            
+        except OverloadedError:
+            raise
+        except groq.RateLimitError as e:
+            logger.error(f"Groq rate limit still reached after retries: {str(e)}")
+            raise OverloadedError("Server busy: LLM provider rate limit reached", 429,
+                                  retry_after=math.ceil(retry_after_s(e) or 1))
         except Exception as e:
-            error_msg = f"Error generating answer: {str(e)}"
+            error_msg = f"{GENERATION_ERROR_PREFIX}: {str(e)}"
             logger.error(error_msg)
             return error_msg
     
-    def format_context(self, chunks: List[str]) -> str:
-        """Format context chunks for better readability."""
-        return "\n\n".join([f"Chunk {i+1}: {chunk}" for i, chunk in enumerate(chunks)])
-
-    def generate_answer_from_text(self, question: str, text: str) -> str:
-        """Generate an answer directly from pasted text."""
-        try:
-            # Create enhanced prompt template for direct text
-            prompt = f"""You are a helpful AI assistant specialized in answering questions based on provided text. Your task is to:
-
-1. Carefully analyze the provided text
-2. Answer the question using ONLY information from the text
-3. If the answer is not fully available in the text, explain what information is missing
-4. If you cannot find any relevant information, say "I cannot find the answer in the provided text"
-5. Be specific and detailed in your answers
-6. Maintain a professional and clear tone
-
-Text:
-{text}
-
-Question: {question}
-
-Remember to:
-- Base your answer ONLY on the provided text
-- Be specific and detailed
-- Acknowledge any limitations in the available information
-- Maintain a professional tone
-- If the text seems unrelated to the question, explicitly state this
-
-Answer:"""
-            
-            logger.info("Sending request to Groq API for pasted text")
-            # Generate answer using Groq with adjusted parameters
-            response = self.client.chat.completions.create(
+    def _reserve_tokens(self, messages: List[dict]) -> int:
+        """Tokens to reserve for a call against the tokens-per-minute limit, if there is one."""
+        if not self.scheduler.counts_tokens:
+            return 0
+        return sum(count_tokens(message["content"]) for message in messages) + EXPECTED_COMPLETION_TOKENS
+    
+    def _request_key(self, messages: List[dict], priority: int) -> str:
+        """Identical prompts at the same priority get the same key and share one call."""
+        payload = json.dumps([self.model, priority, messages], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _build_messages(self, question: str, context: List[str]) -> List[dict]:
+        """Build the chat messages for answering a question from context passages."""
+        # The instructions are sent once, in the system message; the user message
+        # carries only the context and the question
+        context_text = "\n\n".join(f"[{i+1}] {passage}" for i, passage in enumerate(context))
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"Context:\n{context_text}\n\nQuestion: {question}"}
+        ]
+    
+    def _log_prompt(self, messages: List[dict]) -> None:
+        # Counting tokens means tokenizing the whole prompt, so only do it when it is logged
+        if logger.isEnabledFor(logging.DEBUG):
+            prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+            logger.debug("Sending request to Groq API (~%d prompt tokens)", prompt_tokens)
+    
+    def _log_usage(self, response) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            logger.debug("Groq usage: %s prompt tokens, %s completion tokens", usage.prompt_tokens, usage.completion_tokens)
+    
+    async def stream_answer(self, question: str, context: List[str], priority: int = INTERACTIVE) -> AsyncIterator[str]:
+        """Stream answer tokens from Groq as they are generated, queued by the scheduler at ``priority``."""
+        messages = self._build_messages(question, context)
+        self._log_prompt(messages)
+        tokens = self._reserve_tokens(messages)
+        
+        def open_stream():
+            return self.async_client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful AI assistant that provides detailed, accurate answers based on the provided text. You are thorough in your analysis and clear in your explanations. You always acknowledge when the text is insufficient or unrelated to the question."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=messages,
                 temperature=0.3,
-                max_tokens=1024,
-                top_p=0.9
+                max_tokens=MAX_COMPLETION_TOKENS,
+                top_p=0.9,
+                stream=True
             )
-            
-            answer = response.choices[0].message.content.strip()
-            logger.info("Successfully received response from Groq API")
-            return answer
-        except Exception as e:
-            error_msg = f"Error generating answer from pasted text: {str(e)}"
-            logger.error(error_msg)
-            return error_msg 
\ No newline at end of file
+        
+        completion_tokens = 0
+        counting = bool(tokens) or logger.isEnabledFor(logging.DEBUG)
+        async with aclosing(self.scheduler.stream(open_stream, priority, tokens)) as chunks:
+            async for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if counting:
+                        completion_tokens += count_tokens(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        if tokens:
+            self.scheduler.settle(EXPECTED_COMPLETION_TOKENS, completion_tokens)
+        logger.debug("Finished streaming response from Groq API (~%d completion tokens)", completion_tokens)
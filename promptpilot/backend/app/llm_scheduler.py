@@ -0,0 +1,323 @@
+"""Schedules LLM calls under the provider's rate limits.
+
+Every upstream call waits in a priority queue (interactive chat ahead of batch
+work) until a concurrency slot is free and two token buckets, requests per
+minute and tokens per minute, can pay for it. Calls that fail with a rate limit
+or a transient error are retried with jittered exponential backoff; a 429's
+Retry-After pauses the whole queue, since every other call would hit the same
+limit. Concurrent calls with the same key share one upstream call.
+"""
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .concurrency import OverloadedError
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors() -> Tuple[type, ...]:
+    """Errors worth retrying: the same request may well succeed a moment later.
+
+    groq is imported here rather than at start-up; by the time an error is
+    matched against these, the client has loaded it anyway.
+    """
+    import groq
+    return (
+        groq.RateLimitError,
+        groq.APIConnectionError,
+        groq.APITimeoutError,
+        groq.InternalServerError,
+    )
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "promptpilot_llm_queue_wait_seconds",
+    "Time an LLM call waited for a concurrency slot and rate-limit budget",
+    ("priority",)
+)
+
+
+class TokenBucket:
+    """Refills continuously at ``per_minute / 60`` per second, up to one minute's worth.
+
+    A limit of 0 disables the bucket. The balance may go negative when a call
+    turns out to cost more than was reserved for it; later calls then wait longer.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.available = per_minute
+        self._updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` can be taken; 0 if it can be taken now."""
+        if not self.enabled:
+            return 0.0
+        self._refill(now)
+        # A single call larger than the whole bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) * 60 / self.per_minute
+
+    def take(self, amount: float, now: float):
+        if self.enabled:
+            self._refill(now)
+            self.available -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Charge (positive) or refund (negative) the difference to an earlier take."""
+        if self.enabled:
+            self.available = min(self.capacity, self.available - amount)
+
+
+@dataclass
+class _Shared:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class LLMScheduler:
+    """Priority queue, rate limits, retries and coalescing for upstream LLM calls.
+
+    Callers beyond ``max_concurrency`` queue up to ``max_waiting`` interactive and
+    ``max_batch_waiting`` batch calls deep; past that they are rejected with
+    OverloadedError, like AdmissionLimiter. Each priority has its own cap, so
+    however much batch work is queued, interactive calls are still admitted.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_waiting: int = 32, requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0, max_retries: int = 3, backoff_s: float = 0.5,
+                 max_backoff_s: float = 30.0, max_batch_waiting: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.max_batch_waiting = max_waiting if max_batch_waiting is None else max_batch_waiting
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.active = 0
+        # (priority, sequence, future, tokens); futures of cancelled waiters stay until popped
+        self._queue: List[Tuple[int, int, asyncio.Future, float]] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: Dict[Any, _Shared] = {}
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    @property
+    def counts_tokens(self) -> bool:
+        """Whether callers need to estimate tokens at all."""
+        return self.tokens.enabled
+
+    def waiting(self, priority: Optional[int] = None) -> int:
+        return sum(
+            1 for p, _, future, _ in self._queue
+            if not future.done() and (priority is None or p == priority)
+        )
+
+    def admit(self, priority: int = INTERACTIVE):
+        """Raise OverloadedError now if a new call would be rejected, e.g. before a response starts."""
+        max_waiting = self.max_batch_waiting if priority == BATCH else self.max_waiting
+        if self.active >= self.max_concurrency and self.waiting(priority) >= max_waiting:
+            name = PRIORITY_NAMES.get(priority, str(priority))
+            logger.warning(f"LLM {name} queue full ({self.active} active, {self.waiting(priority)} waiting)")
+            raise OverloadedError("Server busy: too many concurrent chat requests", 429)
+
+    async def acquire(self, priority: int = INTERACTIVE, tokens: float = 0):
+        """Wait for a slot and rate-limit budget for one upstream call of about ``tokens`` tokens."""
+        self.admit(priority)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future, tokens))
+        start = time.perf_counter()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted just as we were cancelled: hand the slot on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start, PRIORITY_NAMES.get(priority, str(priority)))
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE, tokens: float = 0) -> AsyncIterator[None]:
+        await self.acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def settle(self, reserved: float, used: float):
+        """Correct the token bucket once a call's real token usage is known."""
+        self.tokens.adjust(used - reserved)
+
+    def _dispatch(self):
+        """Grant queued calls in priority order while slots and rate-limit budget allow."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue and self.active < self.max_concurrency:
+            priority, _, future, tokens = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            now = time.monotonic()
+            wait = max(self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                # The head waits for budget; lower priorities wait behind it
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            self.requests.take(1, now)
+            self.tokens.take(tokens, now)
+            heapq.heappop(self._queue)
+            self.active += 1
+            future.set_result(None)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than the provider's Retry-After."""
+        delay = random.uniform(0, min(self.max_backoff_s, self.backoff_s * 2 ** attempt))
+        retry_after = retry_after_s(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _on_error(self, attempt: int, error: Exception) -> float:
+        """Record a failed attempt and return how long to wait before the next one.
+
+        Re-raises the error once ``max_retries`` retries have been used.
+        """
+        import groq
+        delay = self._backoff(attempt, error)
+        if isinstance(error, groq.RateLimitError):
+            self.rate_limited += 1
+            # Every queued call would hit the same limit: hold them all, not just this one
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        if attempt >= self.max_retries:
+            self.failures += 1
+            raise error
+        logger.warning(f"LLM call failed ({type(error).__name__}), attempt {attempt + 1}, retrying in {delay:.2f}s")
+        return delay
+
+    async def _call_with_retries(self, make_call: Callable[[], Awaitable[Any]], priority: int, tokens: float) -> Any:
+        for attempt in itertools.count():
+            async with self.slot(priority, tokens):
+                self.calls += 1
+                try:
+                    return await make_call()
+                except retryable_errors() as e:
+                    delay = self._on_error(attempt, e)
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def call(self, make_call: Callable[[], Awaitable[Any]], priority: int = INTERACTIVE,
+                   tokens: float = 0, key: Any = None) -> Any:
+        """Run ``await make_call()`` in a slot, retrying transient failures.
+
+        Calls with the same ``key`` that overlap share the first one's upstream
+        call and result. The shared call is cancelled only once every caller
+        waiting on it has gone away.
+        """
+        if key is None:
+            return await self._call_with_retries(make_call, priority, tokens)
+        shared = self._inflight.get(key)
+        if shared is None:
+            self.admit(priority)
+            shared = _Shared(asyncio.ensure_future(self._call_with_retries(make_call, priority, tokens)))
+            self._inflight[key] = shared
+            shared.task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        shared.waiters += 1
+        try:
+            return await asyncio.shield(shared.task)
+        finally:
+            shared.waiters -= 1
+            if not shared.waiters and not shared.task.done():
+                shared.task.cancel()
+
+    async def stream(self, open_stream: Callable[[], Awaitable[AsyncIterator]], priority: int = INTERACTIVE,
+                     tokens: float = 0) -> AsyncIterator[Any]:
+        """Yield the items of ``await open_stream()``, holding a slot until the stream ends.
+
+        Opening the stream is retried like call(); once items have been yielded a
+        failure is raised, since the caller has already used part of the output.
+        """
+        for attempt in itertools.count():
+            async with self.slot(priority, tokens):
+                self.calls += 1
+                try:
+                    stream = await open_stream()
+                except retryable_errors() as e:
+                    delay = self._on_error(attempt, e)
+                else:
+                    async for item in stream:
+                        yield item
+                    return
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "active": self.active,
+            "waiting": {name: self.waiting(priority) for priority, name in PRIORITY_NAMES.items()},
+            "max_concurrency": self.max_concurrency,
+            "max_waiting": self.max_waiting,
+            "max_batch_waiting": self.max_batch_waiting,
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "coalesced": self.coalesced,
+            "inflight_shared": len(self._inflight),
+            "paused_s": max(0.0, self._paused_until - now),
+            "requests_available": self.requests.available if self.requests.enabled else None,
+            "tokens_available": self.tokens.available if self.tokens.enabled else None,
+        }
+
+
+def retry_after_s(error: Exception) -> Optional[float]:
+    """The Retry-After of a provider error response in seconds, if it has one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
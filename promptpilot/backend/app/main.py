@@ -1,14 +1,51 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Body
+from fastapi import FastAPI, UploadFile, File, HTTPException, Body, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import aclosing
+from dotenv import load_dotenv
+from typing import AsyncIterator, List, Optional
+import asyncio
+import functools
+import hashlib
+import json
 import os
 import logging
+import threading
+import time
+import uuid
 from pathlib import Path
+from .answer_cache import AnswerCache, question_vector
+from .chunk_cache import ChunkCache
+from .collection_manager import DEFAULT_COLLECTION, CollectionManager, CollectionNotFoundError
+from .concurrency import AdmissionLimiter, OverloadedError
+from .context_builder import ContextBuilder
 from .document_processor import DocumentProcessor
-from .llm_processor import LLMProcessor
+from .ingest_pool import (
+    count_pdf_pages,
+    create_process_pool,
+    plan_pdf_shards,
+    prepare_chunks,
+    process_file,
+    process_pasted_text,
+    process_pdf_range,
+    join_shards,
+    warm_up_worker
+)
+from .jobs import FAILED, JobQueue, JobStore
+from .llm_processor import GENERATION_ERROR_PREFIX, LLMProcessor
+from .llm_scheduler import BATCH, INTERACTIVE, LLMScheduler
+from .metrics import REGISTRY, RequestMetricsMiddleware, record, span
+from .profiling import ProfileStore
+from .warmup import Warmup
+
+# Load environment variables before any configuration is read
+load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging; hot-path messages are at DEBUG, set PROMPTPILOT_LOG_LEVEL=DEBUG to see them.
+# force replaces the INFO default that importing document_processor configured
+logging.basicConfig(level=os.getenv("PROMPTPILOT_LOG_LEVEL", "INFO").upper(), force=True)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="PromptPilot")
@@ -23,88 +60,707 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Per-request latency and stage spans for /metrics. With PROMPTPILOT_PROFILING=1 a request
+# sent with "X-Profile: 1" (or ?profile=1) is also sampled; see /api/profiles
+PROFILING = os.getenv("PROMPTPILOT_PROFILING", "0") == "1"
+profile_store = ProfileStore(
+    max_profiles=int(os.getenv("PROMPTPILOT_PROFILE_KEEP", "20")),
+    interval_s=float(os.getenv("PROMPTPILOT_PROFILE_INTERVAL_MS", "5")) / 1000
+)
+app.add_middleware(RequestMetricsMiddleware, profiles=profile_store if PROFILING else None)
+
 # Create necessary directories
 UPLOAD_DIR = Path("uploads")
 INDEX_DIR = Path("index")
 UPLOAD_DIR.mkdir(exist_ok=True)
 INDEX_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
 
 # Initialize processors
 try:
-    document_processor = DocumentProcessor()
-    llm_processor = LLMProcessor()
+    # Each named collection has its own DocumentProcessor and index under index/collections/;
+    # the default collection keeps using index/ itself
+    collections = CollectionManager(
+        INDEX_DIR / "collections",
+        functools.partial(
+            DocumentProcessor,
+            index_backend=os.getenv("PROMPTPILOT_INDEX_BACKEND", "incremental"),
+            chunk_unit=os.getenv("PROMPTPILOT_CHUNK_UNIT", "chars")
+        ),
+        memory_budget_bytes=int(float(os.getenv("PROMPTPILOT_INDEX_MEMORY_MB", "1024")) * 1024 * 1024),
+        default_path=INDEX_DIR
+    )
+    # Upstream LLM calls: a concurrency cap and separate wait queues for chat and batch questions
+    # (past which they get a 429; every running batch keeps up to PROMPTPILOT_BATCH_CONCURRENCY
+    # queued), the provider's requests/tokens per minute (0 = no limit) and retries with backoff
+    llm_scheduler = LLMScheduler(
+        max_concurrency=int(os.getenv("PROMPTPILOT_LLM_CONCURRENCY", "8")),
+        max_waiting=int(os.getenv("PROMPTPILOT_LLM_QUEUE", "32")),
+        max_batch_waiting=int(os.getenv("PROMPTPILOT_LLM_BATCH_QUEUE", "256")),
+        requests_per_minute=float(os.getenv("PROMPTPILOT_LLM_RPM", "0")),
+        tokens_per_minute=float(os.getenv("PROMPTPILOT_LLM_TPM", "0")),
+        max_retries=int(os.getenv("PROMPTPILOT_LLM_RETRIES", "3")),
+        backoff_s=float(os.getenv("PROMPTPILOT_LLM_BACKOFF_S", "0.5")),
+        max_backoff_s=float(os.getenv("PROMPTPILOT_LLM_MAX_BACKOFF_S", "30"))
+    )
     logger.info("Successfully initialized processors")
 except Exception as e:
     logger.error(f"Failed to initialize processors: {str(e)}")
     raise
 
+# Created on first use, so the server starts, and serves uploads and documents, without
+# GROQ_API_KEY; only answering questions needs it
+_llm_processor: Optional[LLMProcessor] = None
+_llm_processor_lock = threading.Lock()
+
+def get_llm_processor() -> LLMProcessor:
+    """The shared LLM processor; raises a 503 if it cannot be created, e.g. without GROQ_API_KEY."""
+    global _llm_processor
+    if _llm_processor is None:
+        with _llm_processor_lock:
+            if _llm_processor is None:
+                try:
+                    _llm_processor = LLMProcessor(llm_scheduler)
+                except ValueError as e:
+                    raise HTTPException(status_code=503, detail=str(e))
+    return _llm_processor
+
+async def aget_llm_processor() -> LLMProcessor:
+    """get_llm_processor() for request handlers; creating it imports groq, so that runs off the event loop."""
+    if _llm_processor is not None:
+        return _llm_processor
+    return await run_in_threadpool(get_llm_processor)
+
+# CPU-bound ingestion (extraction, cleaning, chunking, vectorizing) runs in a bounded
+# process pool; LLM calls go through llm_scheduler. Both shed load once their wait queue
+# is full instead of queueing without bound.
+INGEST_WORKERS = int(os.getenv("PROMPTPILOT_INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+process_pool = create_process_pool(INGEST_WORKERS)
+# PDFs are only split into parallel page ranges of at least this many pages, and
+# into no more ranges than cores: on a shared core every shard re-parses the PDF and
+# sends its chunks back for nothing (benchmarks/bench_pdf.py)
+PDF_SHARD_PAGES = int(os.getenv("PROMPTPILOT_PDF_SHARD_PAGES", "50"))
+PDF_MAX_SHARDS = min(INGEST_WORKERS, os.cpu_count() or 1)
+ingest_limiter = AdmissionLimiter(
+    "ingest",
+    max_concurrency=INGEST_WORKERS,
+    max_waiting=int(os.getenv("PROMPTPILOT_INGEST_QUEUE", str(2 * INGEST_WORKERS))),
+    status_code=503
+)
+
+@app.on_event("shutdown")
+def shutdown_process_pool():
+    process_pool.shutdown(wait=True, cancel_futures=True)
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+async def _run_in_pool(func, *args):
+    """Run func(*args) in the ingestion pool, replacing the pool if a worker died."""
+    global process_pool
+    pool = process_pool
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, functools.partial(func, *args))
+    except BrokenProcessPool:
+        if process_pool is pool:
+            logger.error("Ingestion worker died, restarting the process pool")
+            process_pool = create_process_pool(INGEST_WORKERS)
+        raise
+
+async def run_in_process_pool(func, *args):
+    """Run func(*args) in the ingestion pool, waiting for a free slot first."""
+    async with ingest_limiter.slot():
+        return await _run_in_pool(func, *args)
+
+def _chunking_args(processor: DocumentProcessor):
+    return (
+        processor.index_backend,
+        processor.chunk_size,
+        processor.chunk_overlap,
+        processor.chunk_unit
+    )
+
+def collection_name(request: Request) -> str:
+    """The ``{collection}`` path segment; routes without one serve the default collection.
+
+    Read from the path only, so the legacy routes cannot be pointed at another
+    collection through a query parameter.
+    """
+    return request.path_params.get("collection", DEFAULT_COLLECTION)
+
+async def get_collection(name: str, create: bool = False) -> DocumentProcessor:
+    """The collection's processor; a 404 for unknown collections unless ``create`` is set."""
+    try:
+        return await run_in_threadpool(collections.get, name, create)
+    except CollectionNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Collection not found: {name}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def process_upload(file_path: str, processor: DocumentProcessor):
+    """Extract, chunk and vectorize an uploaded file in the ingestion pool.
+
+    Large PDFs are split into page ranges that several workers extract, chunk and
+    vectorize at once; only their chunks and vectors come back, in page order.
+    """
+    if Path(file_path).suffix == '.pdf':
+        n_pages = await _run_in_pool(count_pdf_pages, file_path)
+        shards = plan_pdf_shards(n_pages, PDF_SHARD_PAGES, PDF_MAX_SHARDS)
+        if len(shards) > 1:
+            start = time.perf_counter()
+            results = await asyncio.gather(*(
+                _run_in_pool(process_pdf_range, file_path, first, stop, *_chunking_args(processor))
+                for first, stop in shards
+            ))
+            logger.info(f"Processed {n_pages} pages in {len(shards)} shards in {time.perf_counter() - start:.2f}s")
+            return await run_in_threadpool(join_shards, results, processor.index_backend)
+    return await _run_in_pool(process_file, file_path, *_chunking_args(processor))
+
+def _record_ingest_stats(stats: dict):
+    """Record the ingestion pool's per-stage timings as upload spans."""
+    for stage in ("extract", "clean", "chunk", "vectorize"):
+        if f"{stage}_s" in stats:
+            record("upload", stage, stats[f"{stage}_s"])
+
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to Smart Q&A API"}
 
-@app.post("/api/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
+@app.get("/api/ready")
+async def ready():
+    """Readiness probe: 200 once background warm-up has finished, 503 until then.
+
+    "/" answers as soon as the server accepts connections and serves as the liveness probe.
+    """
+    return JSONResponse(
+        status_code=200 if warmup.ready else 503,
+        content={**warmup.stats(), "ready": warmup.ready, "llm_configured": bool(os.getenv("GROQ_API_KEY"))}
+    )
+
+# Error recorded on the jobs a collection still had pending when it was deleted
+COLLECTION_DELETED = "Collection deleted"
+
+async def ingest_job(job: dict, report) -> dict:
+    """Run one upload through extraction, chunking, indexing and persistence."""
+    # The job ID doubles as the doc ID, so a retry after a partial run never indexes twice
+    doc_id = job["job_id"]
+    content_hash = job["content_hash"]
+    collection = job["collection"] or DEFAULT_COLLECTION
+    processor = await run_in_threadpool(collections.get, collection, True)
+    
+    # Identical content that is still indexed in this collection is not indexed a second time
+    if content_hash:
+        indexed = await run_in_threadpool(processor.list_documents)
+        for existing in await run_in_threadpool(job_store.completed_doc_ids, content_hash):
+            if existing in indexed:
+                logger.info(f"{job['filename']} is a duplicate of document {existing}")
+                await report(progress={"duplicate_of": existing, "chunks_indexed": 0})
+                return {"doc_id": existing}
+    
+    await report(stage="extracting")
+    cache_key = ChunkCache.key(content_hash, Path(job["file_path"]).suffix, *_chunking_args(processor)[1:])
+    chunks = chunk_cache.get(cache_key) if content_hash else None
+    if chunks is not None:
+        # The job queue already bounds concurrency, so jobs bypass the request limiter
+        prepared, stats = await _run_in_pool(prepare_chunks, chunks, processor.index_backend)
+        await report(progress={"chunk_cache_hit": True})
+    else:
+        chunks, prepared, stats = await process_upload(job["file_path"], processor)
+        if content_hash:
+            chunk_cache.put(cache_key, chunks)
+    _record_ingest_stats(stats)
+    await report(
+        stage="indexing",
+        progress={"pages_extracted": stats.get("pages"), "chunks_produced": len(chunks)},
+        timings={name: stats[name] for name in ("extract_s", "clean_s", "chunk_s", "vectorize_s") if name in stats}
+    )
+    logger.info(f"Generated {len(chunks)} chunks from {job['filename']}")
+    
+    timings = {}
+    
+    def add(processor: DocumentProcessor):
+        # Runs under the collection's writer lock: a collection deleted since this job was
+        # queued has cancelled it, and indexing it anyway would bring the collection back
+        if job_store.get(doc_id)["status"] == FAILED:
+            raise RuntimeError(COLLECTION_DELETED)
+        start = time.perf_counter()
+        if doc_id not in processor.list_documents():
+            processor.add_documents(chunks, doc_id, prepared)
+        timings["index_s"] = time.perf_counter() - start
+    
+    # Indexed and saved as one step, serialized with writers in other workers
+    start = time.perf_counter()
+    _, version = await run_in_threadpool(collections.update, collection, add)
+    timings["persist_s"] = time.perf_counter() - start - timings["index_s"]
+    record("upload", "index", timings["index_s"])
+    record("upload", "persist", timings["persist_s"])
+    await report(
+        progress={"chunks_indexed": len(chunks), "index_version": version},
+        timings=timings
+    )
+    return {"doc_id": doc_id}
+
+# Chat retrieves this many chunks, then keeps only what fits the context token budget
+CONTEXT_CHUNKS = int(os.getenv("PROMPTPILOT_CONTEXT_CHUNKS", "8"))
+context_builder = ContextBuilder(token_budget=int(os.getenv("PROMPTPILOT_CONTEXT_TOKENS", "800")))
+# Repeated questions against an unchanged index skip the LLM call; a reworded question reuses
+# an answer only with the same content words and this similarity (above 1 = exact repeats only)
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("PROMPTPILOT_ANSWER_CACHE_SIZE", "1000")),
+    ttl_s=float(os.getenv("PROMPTPILOT_ANSWER_CACHE_TTL", "3600")),
+    similarity_threshold=float(os.getenv("PROMPTPILOT_ANSWER_CACHE_SIMILARITY", "0.95"))
+)
+# Bulk question batches: size cap, and how many of one batch's LLM calls run at once
+BATCH_MAX_QUESTIONS = int(os.getenv("PROMPTPILOT_BATCH_MAX", "500"))
+BATCH_CONCURRENCY = int(os.getenv("PROMPTPILOT_BATCH_CONCURRENCY", "8"))
+chunk_cache = ChunkCache(max_chars=int(os.getenv("PROMPTPILOT_CHUNK_CACHE_MB", "256")) * 1024 * 1024)
+job_store = JobStore(INDEX_DIR / "jobs.db")
+job_queue = JobQueue(
+    job_store,
+    ingest_job,
+    concurrency=INGEST_WORKERS,
+    max_queued=int(os.getenv("PROMPTPILOT_JOB_QUEUE", "100")),
+    # Workers sharing jobs.db lease the jobs they run; a crashed worker's are taken over after this
+    lease_s=float(os.getenv("PROMPTPILOT_JOB_LEASE_S", "30"))
+)
+
+REGISTRY.register_stats("chunk_cache", chunk_cache.stats)
+REGISTRY.register_stats("answer_cache", answer_cache.stats)
+REGISTRY.register_stats("collections", collections.stats)
+REGISTRY.register_stats("ingest_limiter", ingest_limiter.stats)
+REGISTRY.register_stats("llm_scheduler", llm_scheduler.stats)
+REGISTRY.register_stats("job_queue", job_queue.stats)
+
+def _warm_index():
+    """Load the persisted default index; arrays are memory-mapped, nothing is refit.
+
+    Other collections are loaded on first use.
+    """
+    collections.get(DEFAULT_COLLECTION)
+
+def _warm_query_path():
+    """Run one question through retrieval, context building and the answer cache's vectorizer."""
+    processor = collections.get(DEFAULT_COLLECTION)
+    hits = []
+    if len(processor.snapshot().index):
+        hits, _ = processor.search_hits("warm up", CONTEXT_CHUNKS)
+    context_builder.build("warm up", [(score, text) for _, score, text in hits] or [(1.0, "Warm up.")])
+    question_vector("warm up")
+
+def _warm_ingest_workers():
+    """Start the ingestion workers and load the extraction and vectorizing code in them."""
+    processor = collections.get(DEFAULT_COLLECTION)
+    futures = [
+        process_pool.submit(warm_up_worker, processor.index_backend, processor.chunk_unit)
+        for _ in range(INGEST_WORKERS)
+    ]
+    logger.info(f"Warmed up {len({future.result() for future in futures})} ingestion workers")
+
+def _warm_llm():
+    if os.getenv("GROQ_API_KEY"):
+        get_llm_processor()
+    else:
+        logger.warning("GROQ_API_KEY is not set: chat requests will fail with 503 until it is")
+
+# After startup, load the index and query path on a background thread; /api/ready reports
+# 503 until they are loaded. The LLM client and the ingestion workers are warmed after
+# that, so they don't hold readiness back. With PROMPTPILOT_WARMUP=0 nothing is preloaded
+# and the first request that needs something loads it
+warmup = Warmup(
+    [
+        ("index", _warm_index),
+        ("query_path", _warm_query_path),
+    ],
+    background_steps=[("llm", _warm_llm), ("ingest_workers", _warm_ingest_workers)],
+    enabled=os.getenv("PROMPTPILOT_WARMUP", "1") == "1"
+)
+REGISTRY.register_stats("warmup", warmup.stats)
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+
+@app.on_event("startup")
+def start_warmup():
+    warmup.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+
+@app.post("/api/upload", status_code=202)
+@app.post("/api/collections/{collection}/upload", status_code=202)
+async def upload_files(files: List[UploadFile] = File(...), wait: bool = False,
+                       collection: str = Depends(collection_name)):
+    """Save uploads to disk and queue them for ingestion into a collection.
+
+    Returns job IDs immediately; poll /api/jobs/{job_id} for progress. With
+    ``wait=true`` the request blocks until every job has finished. The collection
+    is created by its first upload.
+    """
     try:
-        logger.info(f"Received upload request for {len(files)} files")
-        uploaded_files = []
-        all_chunks = []
-        
+        logger.info(f"Received upload request for {len(files)} files into {collection}")
+        try:
+            collections.validate_name(collection)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         for file in files:
-            logger.info(f"Processing file: {file.filename}")
-            # Save file
-            file_path = UPLOAD_DIR / file.filename
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-            uploaded_files.append(file.filename)
-            logger.info(f"Saved file: {file_path}")
-            
-            # Process file based on extension
-            if file.filename.endswith('.pdf'):
-                logger.info(f"Processing PDF file: {file_path}")
-                chunks = document_processor.process_pdf(file_path)
-            elif file.filename.endswith('.txt'):
-                logger.info(f"Processing text file: {file_path}")
-                chunks = document_processor.process_text(file_path)
-            else:
+            if not file.filename.endswith(('.pdf', '.txt')):
                 raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.filename}")
-            
-            logger.info(f"Generated {len(chunks)} chunks from {file.filename}")
-            all_chunks.extend(chunks)
+        if job_queue.is_full():
+            raise OverloadedError("Server busy: ingestion queue is full", 503, retry_after=5)
         
-        # Create FAISS index from all chunks
-        logger.info(f"Creating index from {len(all_chunks)} total chunks")
-        document_processor.create_index(all_chunks)
-        
-        # Save index for future use
-        logger.info("Saving index")
-        document_processor.save_index(INDEX_DIR)
+        jobs = []
+        for file in files:
+            job_id = uuid.uuid4().hex
+            suffix = Path(file.filename).suffix
+            # Stream to disk instead of buffering the whole upload in memory, hashing as we go
+            digest = hashlib.sha256()
+            tmp_path = UPLOAD_DIR / f".upload-{job_id}{suffix}"
+            try:
+                with span("upload", "save"), open(tmp_path, "wb") as buffer:
+                    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                        digest.update(chunk)
+                        buffer.write(chunk)
+            except Exception:
+                tmp_path.unlink(missing_ok=True)
+                raise
+            content_hash = digest.hexdigest()
+            # Content-addressed: identical uploads share one file, different ones never collide
+            file_path = UPLOAD_DIR / f"{content_hash}{suffix}"
+            if file_path.exists():
+                tmp_path.unlink()
+            else:
+                os.replace(tmp_path, file_path)
+            logger.info(f"Saved file: {file_path}")
+            jobs.append(await run_in_threadpool(
+                job_store.create, file.filename, file_path, job_id, content_hash, collection
+            ))
+            await job_queue.submit(job_id)
         
-        logger.info("Upload and processing completed successfully")
+        if wait:
+            jobs = [await job_queue.wait(job["job_id"]) for job in jobs]
         return {
-            "message": "Files uploaded and processed successfully",
-            "files": uploaded_files,
-            "chunks": len(all_chunks)
+            "message": "Files uploaded and queued for processing",
+            "files": [file.filename for file in files],
+            "jobs": jobs
         }
+    except (HTTPException, OverloadedError):
+        raise
     except Exception as e:
         logger.error(f"Error in upload_files: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/jobs")
+async def list_jobs(limit: int = 50):
+    return {"jobs": await run_in_threadpool(job_store.list, limit=limit)}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@app.post("/api/jobs/{job_id}/retry", status_code=202)
+async def retry_job(job_id: str):
+    """Re-run a failed job from the file saved at upload time."""
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if job["status"] != FAILED:
+        raise HTTPException(status_code=409, detail=f"Only failed jobs can be retried, job is {job['status']}")
+    if not Path(job["file_path"]).exists():
+        raise HTTPException(status_code=410, detail="The uploaded file is no longer available")
+    return await job_queue.retry(job_id)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Stage and request latency histograms plus component stats, in Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/profiles")
+async def list_profiles():
+    """Recent request profiles (without their stacks), newest first."""
+    return {"enabled": PROFILING, "profiles": profile_store.list()}
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "json"):
+    """One request profile; ``format=collapsed`` returns the stacks for flamegraph tools."""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    if format == "collapsed":
+        return PlainTextResponse(profile["collapsed"])
+    return profile
+
+@app.get("/api/stats")
+async def get_stats():
+    """Cache and resident-index counters for monitoring."""
+    return {
+        "chunk_cache": chunk_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "collections": collections.stats()
+    }
+
+@app.get("/api/collections")
+async def list_collections():
+    resident = collections.memory_usage()
+    return {"collections": [
+        {
+            "name": name,
+            "resident": name in resident,
+            "memory_bytes": resident[name].heap if name in resident else None,
+            "mapped_bytes": resident[name].mapped if name in resident else None,
+        }
+        for name in collections.names()
+    ]}
+
+@app.delete("/api/collections/{collection}")
+async def delete_collection(collection: str):
+    try:
+        cancel_jobs = functools.partial(job_store.cancel_collection, collection, COLLECTION_DELETED)
+        if not await run_in_threadpool(collections.delete, collection, cancel_jobs):
+            raise HTTPException(status_code=404, detail=f"Collection not found: {collection}")
+        return {"message": "Collection deleted", "collection": collection}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _build_context(message: str, hits, pipeline: str = "chat") -> List[str]:
+    """Fit the best sentences of the retrieved chunks into the prompt's token budget."""
+    with span(pipeline, "prompt"):
+        context, _ = context_builder.build(message, [(score, text) for _, score, text in hits])
+    return context
+
 @app.post("/api/chat")
-async def chat(message: str = Body(..., embed=True), text: str = Body(None, embed=True)):
+@app.post("/api/collections/{collection}/chat")
+async def chat(message: str = Body(..., embed=True), text: str = Body(None, embed=True),
+               collection: str = Depends(collection_name)):
     try:
-        logger.info(f"Received chat request with message: {message}")
+        logger.debug("Received chat request for %s with message: %s", collection, message)
         
         if message == "process_text" and text:
             # Process pasted text
-            chunks = document_processor.process_pasted_text(text)
-            document_processor.create_index(chunks)
-            return {"response": "Text processed successfully"}
+            processor = await get_collection(collection, create=True)
+            chunks, prepared, stats = await run_in_process_pool(process_pasted_text, text, *_chunking_args(processor))
+            _record_ingest_stats(stats)
+            
+            timings = {}
+            
+            def add(processor: DocumentProcessor) -> str:
+                start = time.perf_counter()
+                doc_id = processor.add_documents(chunks, None, prepared)
+                timings["index_s"] = time.perf_counter() - start
+                return doc_id
+            
+            start = time.perf_counter()
+            doc_id, version = await run_in_threadpool(collections.update, collection, add)
+            record("upload", "index", timings["index_s"])
+            record("upload", "persist", time.perf_counter() - start - timings["index_s"])
+            return {"response": "Text processed successfully", "doc_id": doc_id, "index_version": version}
         
         # Regular chat processing
-        chunks = document_processor.search(message)
-        answer = llm_processor.generate_answer(message, chunks)
-        return {"response": answer}
+        processor = await get_collection(collection)
+        with span("chat", "retrieve"):
+            hits, version = await run_in_threadpool(processor.search_hits, message, CONTEXT_CHUNKS)
+        rows = [row for row, _, _ in hits]
+        with span("chat", "answer_cache"):
+            answer = answer_cache.get(message, rows, version, collection)
+        if answer is not None:
+            return {"response": answer, "cached": True, "index_version": version}
+        llm_processor = await aget_llm_processor()
+        context = _build_context(message, hits)
+        start = time.perf_counter()
+        answer = await llm_processor.agenerate_answer(message, context, INTERACTIVE)
+        record("chat", "llm_total", time.perf_counter() - start)
+        if not answer.startswith(GENERATION_ERROR_PREFIX):
+            answer_cache.put(message, rows, version, answer, time.perf_counter() - start, collection)
+        return {"response": answer, "cached": False, "index_version": version}
+    except (HTTPException, OverloadedError):
+        raise
     except Exception as e:
         logger.error(f"Error in chat: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+@app.post("/api/chat/stream")
+@app.post("/api/collections/{collection}/chat/stream")
+async def chat_stream(message: str = Body(..., embed=True), collection: str = Depends(collection_name)):
+    """Answer a question as Server-Sent Events, forwarding tokens as Groq produces them."""
+    processor = await get_collection(collection)
+    try:
+        logger.debug("Received streaming chat request for %s with message: %s", collection, message)
+        with span("chat", "retrieve"):
+            hits, version = await run_in_threadpool(processor.search_hits, message, CONTEXT_CHUNKS)
+        rows = [row for row, _, _ in hits]
+    except Exception as e:
+        logger.error(f"Error in chat_stream: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    with span("chat", "answer_cache"):
+        answer = answer_cache.get(message, rows, version, collection)
+    if answer is not None:
+        events = _cached_answer_events(answer, version)
+    else:
+        # Admission is decided before the response starts so overload can still be a 429
+        # (and a missing API key a 503)
+        await aget_llm_processor()
+        llm_scheduler.admit()
+        events = _stream_answer_events(message, _build_context(message, hits), version, lambda text, cost_s: answer_cache.put(message, rows, version, text, cost_s, collection))
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Index-Version": str(version)}
+    )
+
+@app.post("/api/chat/batch")
+@app.post("/api/collections/{collection}/chat/batch")
+async def chat_batch(questions: List[str] = Body(..., embed=True), collection: str = Depends(collection_name)):
+    """Answer many questions in one request, streamed back as NDJSON in completion order.
+
+    Retrieval for the whole batch is a single vectorized index pass; LLM calls then
+    fan out, at most PROMPTPILOT_BATCH_CONCURRENCY at a time. Each line is
+    {"index", "question", "response" or "error", "cached", "latency_ms"}; the last
+    line is {"done": true, ...} with totals for the batch.
+    """
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch, got {len(questions)}")
+    await aget_llm_processor()
+    processor = await get_collection(collection)
+    try:
+        logger.debug("Received batch chat request for %s with %d questions", collection, len(questions))
+        with span("batch", "retrieve"):
+            batch_hits, version = await run_in_threadpool(processor.search_hits_batch, questions, CONTEXT_CHUNKS)
+    except Exception as e:
+        logger.error(f"Error in chat_batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        _batch_answer_lines(questions, batch_hits, version, collection),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Index-Version": str(version)}
+    )
+
+async def _answer_batch_question(index: int, question: str, hits, version: int, collection: str,
+                                 semaphore: asyncio.Semaphore) -> dict:
+    """Answer one question of a batch; failures are reported in the result instead of raised."""
+    start = time.perf_counter()
+    result = {"index": index, "question": question, "cached": False, "index_version": version}
+    try:
+        rows = [row for row, _, _ in hits]
+        with span("batch", "answer_cache"):
+            answer = answer_cache.get(question, rows, version, collection)
+        if answer is not None:
+            result.update(response=answer, cached=True)
+        else:
+            context = _build_context(question, hits, "batch")
+            async with semaphore:
+                llm_start = time.perf_counter()
+                answer = await get_llm_processor().agenerate_answer(question, context, BATCH)
+                record("batch", "llm_total", time.perf_counter() - llm_start)
+            if answer.startswith(GENERATION_ERROR_PREFIX):
+                result["error"] = answer
+            else:
+                answer_cache.put(question, rows, version, answer, time.perf_counter() - llm_start, collection)
+                result["response"] = answer
+    except Exception as e:
+        logger.error(f"Error answering batch question {index}: {str(e)}")
+        result["error"] = str(e)
+    result["latency_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+async def _batch_answer_lines(questions: List[str], batch_hits, version: int, collection: str) -> AsyncIterator[str]:
+    """Emit one JSON line per answer as it completes, then a summary line."""
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(_answer_batch_question(index, question, hits, version, collection, semaphore))
+        for index, (question, hits) in enumerate(zip(questions, batch_hits))
+    ]
+    cached = errors = 0
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            cached += result["cached"]
+            errors += "error" in result
+            yield json.dumps(result) + "\n"
+    finally:
+        # Client went away mid-batch: stop the LLM calls nobody will read
+        for task in tasks:
+            task.cancel()
+    total_s = time.perf_counter() - start
+    logger.info(f"Answered {len(questions)} batch questions in {total_s:.2f} s ({cached} cached, {errors} failed)")
+    yield json.dumps({
+        "done": True,
+        "questions": len(questions),
+        "cached": cached,
+        "errors": errors,
+        "index_version": version,
+        "total_ms": total_s * 1000,
+        "questions_per_s": len(questions) / total_s
+    }) + "\n"
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _cached_answer_events(answer: str, index_version: int) -> AsyncIterator[str]:
+    """Emit a cached answer as a single `token` event followed by `done`."""
+    yield _sse_event("token", {"token": answer})
+    yield _sse_event("done", {"ttft_ms": 0.0, "total_ms": 0.0, "tokens": 1, "cached": True, "index_version": index_version})
+
+async def _stream_answer_events(message: str, chunks: List[str], index_version: int, on_complete=None) -> AsyncIterator[str]:
+    """Emit `token` events as they arrive, then a `done` event with timings (or `error`).
+
+    ``on_complete(answer, seconds)`` is called with the full answer once streaming succeeds.
+    """
+    start = time.perf_counter()
+    ttft_ms = None
+    tokens = []
+    try:
+        # Closed as soon as the client goes away, which frees the answer's scheduler slot
+        async with aclosing(get_llm_processor().stream_answer(message, chunks, INTERACTIVE)) as stream:
+            async for token in stream:
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                    record("chat", "llm_first_token", ttft_ms / 1000)
+                    logger.debug("Time to first token: %.1f ms", ttft_ms)
+                tokens.append(token)
+                yield _sse_event("token", {"token": token})
+        total_ms = (time.perf_counter() - start) * 1000
+        record("chat", "llm_total", total_ms / 1000)
+        logger.debug("Streamed %d tokens in %.1f ms", len(tokens), total_ms)
+        if on_complete is not None:
+            on_complete(''.join(tokens).strip(), total_ms / 1000)
+        yield _sse_event("done", {"ttft_ms": ttft_ms, "total_ms": total_ms, "tokens": len(tokens), "cached": False, "index_version": index_version})
+    except Exception as e:
+        logger.error(f"Error streaming answer: {str(e)}")
+        yield _sse_event("error", {"detail": str(e)})
+
+@app.get("/api/documents")
+@app.get("/api/collections/{collection}/documents")
+async def list_documents(collection: str = Depends(collection_name)):
+    processor = await get_collection(collection)
+    snapshot = processor.snapshot()
+    return {"documents": snapshot.index.documents(), "index_version": snapshot.version}
+
+@app.delete("/api/documents/{doc_id}")
+@app.delete("/api/collections/{collection}/documents/{doc_id}")
+async def delete_document(doc_id: str, collection: str = Depends(collection_name)):
+    try:
+        await get_collection(collection)
+        removed, version = await run_in_threadpool(
+            collections.update, collection, lambda processor: processor.delete_document(doc_id)
+        )
+        if not removed:
+            raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
+        return {"message": "Document deleted", "doc_id": doc_id, "chunks": removed, "index_version": version}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in delete_document: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
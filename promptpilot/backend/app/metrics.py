@@ -0,0 +1,230 @@
+"""Latency histograms and per-stage timing spans, exposed in Prometheus text format.
+
+``span(pipeline, stage)`` times one stage of the upload or chat pipeline into the
+``promptpilot_stage_seconds`` histogram. While a request is being served the
+spans are also collected for it, so the request middleware can return them in a
+``Server-Timing`` header and log them at DEBUG. Each worker process keeps its
+own registry, so a scrape of /metrics sees the worker that answered it.
+"""
+import bisect
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .profiling import ProfileStore
+
+logger = logging.getLogger(__name__)
+
+# Seconds; from sub-millisecond index stages up to LLM calls and large uploads
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, one series per combination of label values."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def count(self, *label_values: str) -> int:
+        with self._lock:
+            series = self._series.get(label_values)
+            return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((values, list(counts), total) for values, (counts, total) in self._series.items())
+        for values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Histograms plus stats() callbacks of other components, rendered for Prometheus."""
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._stats: Dict[str, Callable[[], Dict]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """The histogram registered under ``name``, created on first use."""
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, help, labels, buckets)
+            return self._histograms[name]
+
+    def register_stats(self, component: str, stats: Callable[[], Dict]):
+        """Expose every number in ``stats()`` as ``promptpilot_<component>_<key>``.
+
+        Nested dicts of numbers become one series per key, labelled ``name``.
+        """
+        with self._lock:
+            self._stats[component] = stats
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = list(self._histograms.values())
+            stats = list(self._stats.items())
+        lines = []
+        for histogram in histograms:
+            lines.extend(histogram.render())
+        for component, callback in stats:
+            try:
+                values = callback()
+            except Exception as e:
+                logger.error(f"Error collecting {component} stats: {str(e)}")
+                continue
+            for key, value in values.items():
+                name = f"promptpilot_{component}_{key}"
+                if isinstance(value, dict):
+                    samples = [(f'{{name="{_escape(label)}"}}', v) for label, v in sorted(value.items())]
+                else:
+                    samples = [("", value)]
+                samples = [(labels, v) for labels, v in samples if isinstance(v, (int, float)) and not isinstance(v, bool)]
+                if samples:
+                    lines.append(f"# TYPE {name} untyped")
+                    lines.extend(f"{name}{labels} {_format_value(v)}" for labels, v in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "promptpilot_stage_seconds",
+    "Time spent in one stage of the upload, chat or batch pipeline",
+    ("pipeline", "stage")
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "promptpilot_http_request_seconds",
+    "HTTP request latency until the response body is complete",
+    ("method", "route", "status")
+)
+
+# The spans recorded so far for the request being served, if any
+_request_spans: ContextVar[Optional[List[Dict]]] = ContextVar("request_spans", default=None)
+
+
+def record(pipeline: str, stage: str, seconds: float):
+    """Record a stage timing measured elsewhere, e.g. in the ingestion pool."""
+    STAGE_SECONDS.observe(seconds, pipeline, stage)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append({"pipeline": pipeline, "stage": stage, "ms": seconds * 1000})
+
+
+@contextmanager
+def span(pipeline: str, stage: str) -> Iterator[None]:
+    """Time the enclosed block as one stage of a pipeline."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(pipeline, stage, time.perf_counter() - start)
+
+
+def _server_timing(spans: List[Dict]) -> str:
+    return ", ".join(f"{s['pipeline']}-{s['stage']};dur={s['ms']:.2f}" for s in spans)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware: request latency histogram, per-request spans and optional profiling.
+
+    A request is profiled when ``profiles`` is set and it carries an
+    ``X-Profile: 1`` header or a ``profile=1`` query parameter; the response then
+    has an ``X-Profile-Id`` header naming the stored profile.
+    """
+
+    def __init__(self, app, profiles: Optional[ProfileStore] = None):
+        self.app = app
+        self.profiles = profiles
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        spans: List[Dict] = []
+        token = _request_spans.set(spans)
+        profiler = self.profiles.start() if self.profiles is not None and self._wants_profile(scope) else None
+        profile_id = None
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status, profile_id
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                # Streaming responses start before their later stages have run
+                if spans:
+                    headers.append((b"server-timing", _server_timing(spans).encode("latin-1")))
+                if profiler is not None:
+                    profile_id = profile_id or uuid.uuid4().hex
+                    headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_spans.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.observe(elapsed, scope["method"], route_path, str(status))
+            if spans and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s %s took %.1f ms: %s", scope["method"], scope["path"], elapsed * 1000,
+                             _server_timing(spans))
+            if profiler is not None:
+                self.profiles.finish(profiler, scope["method"], scope["path"], elapsed, spans, profile_id)
+
+    @staticmethod
+    def _wants_profile(scope) -> bool:
+        if (b"x-profile", b"1") in scope.get("headers", []):
+            return True
+        return b"profile=1" in scope.get("query_string", b"").split(b"&")
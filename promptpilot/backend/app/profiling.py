@@ -0,0 +1,132 @@
+"""A low-overhead sampling profiler for individual requests.
+
+While running, a background thread reads every thread's Python stack at a fixed
+interval and counts identical stacks. Profiles are kept as collapsed stacks
+("outer;inner;leaf count" per line), the input format of flamegraph.pl and
+speedscope. All threads are sampled because a request's work runs on the event
+loop and in threadpool workers; threads that are only waiting are left out.
+"""
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Leaf frames of threads that are parked rather than working
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("selectors.py", "poll"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename.rsplit("/", 1)[-1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (code.co_filename.rsplit("/", 1)[-1], code.co_name) in _IDLE_FRAMES
+
+
+class SamplingProfiler:
+    """Counts the stacks of all threads, sampled every ``interval_s`` until stopped."""
+
+    def __init__(self, interval_s: float = 0.005):
+        self.interval_s = interval_s
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval_s):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """Keeps the most recent request profiles, and runs at most one profiler at a time."""
+
+    def __init__(self, max_profiles: int = 20, interval_s: float = 0.005):
+        self.max_profiles = max_profiles
+        self.interval_s = interval_s
+        self._profiles: "OrderedDict[str, Dict]" = OrderedDict()
+        self._running = threading.Lock()
+        self._lock = threading.Lock()
+
+    def start(self) -> Optional[SamplingProfiler]:
+        """A started profiler, or None if another request is already being profiled."""
+        if not self._running.acquire(blocking=False):
+            return None
+        profiler = SamplingProfiler(self.interval_s)
+        profiler.start()
+        return profiler
+
+    def finish(self, profiler: SamplingProfiler, method: str, path: str, duration_s: float,
+               spans: List[Dict], profile_id: Optional[str] = None) -> str:
+        """Stop the profiler, store its profile and return its ID (a new one unless given)."""
+        try:
+            profiler.stop()
+        finally:
+            self._running.release()
+        profile_id = profile_id or uuid.uuid4().hex
+        with self._lock:
+            self._profiles[profile_id] = {
+                "profile_id": profile_id,
+                "method": method,
+                "path": path,
+                "created_at": time.time(),
+                "duration_ms": duration_s * 1000,
+                "samples": profiler.samples,
+                "interval_ms": profiler.interval_s * 1000,
+                "spans": spans,
+                "collapsed": profiler.collapsed(),
+            }
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        logger.info(f"Profiled {method} {path}: {profiler.samples} samples, profile {profile_id}")
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {name: value for name, value in profile.items() if name != "collapsed"}
+                for profile in reversed(self._profiles.values())
+            ]
@@ -0,0 +1,41 @@
+from typing import List, Tuple
+
+import numpy as np
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return indices of the k highest scores, best first, in O(n + k log k)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+    if k < len(scores):
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise top_k of a 2-D score matrix: an (n_rows, k) index array, best first per row."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.intp)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(scores, -k, axis=1)[:, -k:]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(np.take_along_axis(scores, candidates, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+# Queries scored per dense block in batch search, bounding the score matrix to
+# QUERY_BLOCK x corpus rows
+QUERY_BLOCK = 64
+
+
+def top_k_pairs(scores: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+    """(row, score) pairs of each query row's top k finite scores, best first."""
+    return [
+        [(int(i), float(row_scores[i])) for i in indices if np.isfinite(row_scores[i])]
+        for row_scores, indices in zip(scores, top_k_rows(scores, k))
+    ]
@@ -0,0 +1,199 @@
+import copy
+import itertools
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .index_store import (
+    MemoryUsage, TextStore, array_usage, load_array, load_documents, save_array, save_documents, save_texts,
+    vocabulary_usage
+)
+from .metrics import span
+from .scoring import QUERY_BLOCK, top_k, top_k_pairs
+
+logger = logging.getLogger(__name__)
+
+
+class TfidfIndex:
+    """Exact TF-IDF index that refits its vocabulary whenever the corpus changes.
+
+    The L2-normalized CSR document-term matrix is computed once per change, so a
+    search is a single sparse matrix-vector product. Adding or deleting a document
+    refits the whole corpus; use IncrementalIndex when ingest cost matters.
+    """
+
+    def __init__(self):
+        self.vectorizer = self._new_vectorizer()
+        self.texts = []
+        self.doc_rows: Dict[str, Tuple[int, int]] = {}
+        self.doc_matrix = None
+
+    @staticmethod
+    def _new_vectorizer(vocabulary: Optional[Dict[str, int]] = None) -> TfidfVectorizer:
+        return TfidfVectorizer(
+            max_features=10000,
+            stop_words='english',
+            ngram_range=(1, 2),  # Include both single words and pairs of words
+            vocabulary=vocabulary,
+        )
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[str, str]]) -> "TfidfIndex":
+        """Build an index from (doc_id, text) pairs, fitting the vectorizer once."""
+        index = cls()
+        for doc_id, group in itertools.groupby(chunks, key=lambda chunk: chunk[0]):
+            texts = [text for _, text in group]
+            index.doc_rows[doc_id] = (len(index.texts), len(index.texts) + len(texts))
+            index.texts.extend(texts)
+        index._fit()
+        return index
+
+    @classmethod
+    def load(cls, directory: Path, manifest: Dict) -> "TfidfIndex":
+        """Open a saved index without refitting; arrays and texts stay memory-mapped."""
+        index = cls()
+        index.texts = TextStore.load(directory, manifest)
+        index.doc_rows = load_documents(manifest)
+        if manifest["shape"][0]:
+            with open(directory / "vocab.json", 'r') as f:
+                terms = json.load(f)
+            index.vectorizer = cls._new_vectorizer({term: i for i, term in enumerate(terms)})
+            index.vectorizer.idf_ = np.asarray(load_array(directory, "idf"))
+            index.doc_matrix = sp.csr_matrix(
+                (load_array(directory, "data"), load_array(directory, "indices"), load_array(directory, "indptr")),
+                shape=tuple(manifest["shape"]),
+            )
+            index.doc_matrix.has_sorted_indices = True
+        return index
+
+    def save(self, directory: Path) -> Dict:
+        """Write the index into directory and return its manifest fields."""
+        # Rows are renumbered by deletes, which turn texts into a plain list
+        if isinstance(self.texts, TextStore):
+            fields = self.texts.save(directory)
+        else:
+            save_texts(directory, self.texts)
+            fields = {}
+        shape = [0, 0]
+        if self.doc_matrix is not None:
+            vocab = self.vectorizer.vocabulary_
+            terms = [None] * len(vocab)
+            for term, i in vocab.items():
+                terms[i] = term
+            with open(directory / "vocab.json", 'w') as f:
+                json.dump(terms, f)
+            save_array(directory, "idf", self.vectorizer.idf_)
+            save_array(directory, "data", self.doc_matrix.data)
+            save_array(directory, "indices", self.doc_matrix.indices)
+            save_array(directory, "indptr", self.doc_matrix.indptr)
+            shape = list(self.doc_matrix.shape)
+        return {"shape": shape, "documents": save_documents(self.doc_rows), **fields}
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @staticmethod
+    def prepare(chunks: List[str]) -> None:
+        """Nothing can be vectorized ahead of the refit."""
+        return None
+
+    @staticmethod
+    def concat_prepared(parts: List[None]) -> None:
+        return None
+
+    def add(self, chunks: List[str], doc_id: str, prepared: None = None):
+        """Append chunks for a document and refit the vectorizer."""
+        if doc_id in self.doc_rows:
+            raise ValueError(f"Document {doc_id} is already indexed")
+        self.doc_rows[doc_id] = (len(self.texts), len(self.texts) + len(chunks))
+        self.texts.extend(chunks)
+        self._fit()
+
+    def clone(self) -> "TfidfIndex":
+        """A copy to change off to the side; a refit replaces rather than mutates the matrix."""
+        index = copy.copy(self)
+        index.texts = self.texts.clone() if isinstance(self.texts, TextStore) else list(self.texts)
+        index.doc_rows = dict(self.doc_rows)
+        return index
+
+    def delete(self, doc_id: str) -> int:
+        """Remove every chunk of a document and refit. Returns the number removed."""
+        if doc_id not in self.doc_rows:
+            return 0
+        start, stop = self.doc_rows.pop(doc_id)
+        removed = stop - start
+        self.texts = [self.texts[i] for i in range(len(self.texts)) if not start <= i < stop]
+        self.doc_rows = {
+            d: (s - removed, e - removed) if s >= stop else (s, e)
+            for d, (s, e) in self.doc_rows.items()
+        }
+        self._fit()
+        return removed
+
+    def documents(self) -> Dict[str, int]:
+        """Map each indexed doc ID to its chunk count."""
+        return {doc_id: stop - start for doc_id, (start, stop) in self.doc_rows.items()}
+
+    def iter_chunks(self) -> Iterator[Tuple[str, str]]:
+        """Yield (doc_id, text) for every indexed chunk, in row order."""
+        for doc_id, (start, stop) in self.doc_rows.items():
+            for row in range(start, stop):
+                yield doc_id, self.texts[row]
+
+    def get_text(self, row: int) -> str:
+        return self.texts[row]
+
+    def memory_usage(self) -> MemoryUsage:
+        """Approximate size of the document-term matrix, vocabulary and texts."""
+        if isinstance(self.texts, TextStore):
+            usage = self.texts.memory_usage()
+        else:
+            usage = MemoryUsage(heap=sum(sys.getsizeof(text) for text in self.texts))
+        if self.doc_matrix is None:
+            return usage
+        m = self.doc_matrix
+        usage += array_usage(m.data, m.indices, m.indptr, self.vectorizer.idf_)
+        return usage + vocabulary_usage(self.vectorizer.vocabulary or self.vectorizer.vocabulary_)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to k (row, cosine similarity) pairs, best first."""
+        if self.doc_matrix is None:
+            return []
+        # Both sides are L2-normalized, so the dot product is the cosine similarity
+        with span("chat", "vectorize"):
+            query_vec = self.vectorizer.transform([query])
+        with span("chat", "score"):
+            similarities = (self.doc_matrix @ query_vec.T).toarray().ravel()
+        with span("chat", "top_k"):
+            return [(int(i), float(similarities[i])) for i in top_k(similarities, k)]
+
+    def search_batch(self, queries: List[str], k: int) -> List[List[Tuple[int, float]]]:
+        """search() for many queries: one transform and one sparse product per block of queries."""
+        if self.doc_matrix is None:
+            return [[] for _ in queries]
+        with span("batch", "vectorize"):
+            query_matrix = self.vectorizer.transform(queries).tocsr()
+        results = []
+        for start in range(0, len(queries), QUERY_BLOCK):
+            with span("batch", "score"):
+                similarities = (query_matrix[start:start + QUERY_BLOCK] @ self.doc_matrix.T).toarray()
+            with span("batch", "top_k"):
+                results.extend(top_k_pairs(similarities, k))
+        return results
+
+    def _fit(self):
+        """Fit the vectorizer and cache the L2-normalized document-term matrix."""
+        if not len(self.texts):
+            self.doc_matrix = None
+            return
+        logger.info(f"Fitting TF-IDF vectorizer on {len(self.texts)} chunks")
+        self.vectorizer = self._new_vectorizer()
+        # TfidfVectorizer applies L2 normalization by default (norm='l2')
+        self.doc_matrix = self.vectorizer.fit_transform(self.texts).tocsr()
+        self.doc_matrix.sort_indices()
@@ -0,0 +1,78 @@
+"""Background warm-up after start-up, and the readiness it gates.
+
+The server accepts connections as soon as it is imported; loading the persisted
+index, importing the numeric libraries and starting ingestion workers happen on a
+background thread instead. A readiness probe reports the server ready once that
+has finished, so traffic is only routed to it warm.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+Step = Tuple[str, Callable[[], object]]
+
+
+class Warmup:
+    """Runs named steps once, in order, on a background thread.
+
+    ``ready`` is False until every one of ``steps`` has run; ``background_steps``
+    run after that without holding readiness back. A step that fails is logged and
+    skipped: whatever it would have loaded is loaded by the first request that
+    needs it instead. When disabled, nothing runs and the server is ready at once.
+    """
+
+    def __init__(self, steps: List[Step], background_steps: List[Step] = (), enabled: bool = True):
+        self.steps = steps
+        self.background_steps = list(background_steps)
+        self.enabled = enabled
+        self.status = "pending" if enabled else "disabled"
+        self.step_s: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.ready_s: Optional[float] = None
+        self.total_s: Optional[float] = None
+        self._done = threading.Event()
+        if not enabled:
+            self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def start(self):
+        if self.enabled:
+            threading.Thread(target=self.run, name="warmup", daemon=True).start()
+
+    def run(self):
+        self.status = "running"
+        start = time.perf_counter()
+        self._run_steps(self.steps)
+        self.ready_s = time.perf_counter() - start
+        self._done.set()
+        logger.info(f"Ready after {self.ready_s:.2f}s of warm-up ({len(self.errors)} steps failed)")
+        self._run_steps(self.background_steps)
+        self.total_s = time.perf_counter() - start
+        self.status = "done"
+
+    def _run_steps(self, steps: List[Step]):
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logger.error(f"Warm-up step {name} failed: {str(e)}")
+                self.errors[name] = str(e)
+            self.step_s[name] = time.perf_counter() - start
+
+    def stats(self) -> Dict:
+        return {
+            "ready": int(self.ready),
+            "status": self.status,
+            "step_s": dict(self.step_s),
+            "ready_s": self.ready_s,
+            "total_s": self.total_s,
+            "errors": dict(self.errors),
+        }
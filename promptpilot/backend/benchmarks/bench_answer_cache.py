@@ -0,0 +1,107 @@
+"""Answer cache hit rate and latency on a repetitive question mix.
+
+    python -m benchmarks.bench_answer_cache [--requests 200] [--distinct 20] [--first-token-delay-ms 300]
+
+Draws questions from a small pool, where each pool question also appears
+lightly reworded, and replays them against /api/chat backed by the fake LLM.
+Halfway through, a document is added, which bumps the index version and must
+invalidate every cached answer.
+
+Before that it checks that questions which differ only by a negation or a number
+never reuse each other's answers, while the reworded pool questions do; the
+process exits non-zero if not.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, run_fake_llm, serve_in_thread
+from benchmarks.synthetic import make_chunks, make_queries
+
+
+def _reword(question: str) -> str:
+    """A paraphrase the semantic layer should catch: article swap and punctuation."""
+    return question.replace("the document", "this document").rstrip("?") + " ?"
+
+
+# Pairs that must not share an answer; the trigram similarity of each is about 0.9
+DIFFERENT_QUESTIONS = [
+    ("What is the purpose of the study?", "What is not the purpose of the study?"),
+    ("What was the total in 2021?", "What was the total in 2022?"),
+    ("Does the report mention two risks?", "Does the report mention three risks?"),
+]
+
+
+def check_reuse(similarity_threshold: float) -> list:
+    """Questions a cache with this threshold answers wrongly or fails to reuse."""
+    from app.answer_cache import AnswerCache
+
+    failures = []
+    for question, other in DIFFERENT_QUESTIONS + [(q, _reword(q)) for q in make_queries(5)]:
+        cache = AnswerCache(max_entries=10, ttl_s=60, similarity_threshold=similarity_threshold)
+        cache.put(question, [1, 2], 1, "answer", cost_s=1.0)
+        reused = cache.get(other, [1, 2], 1) is not None
+        if reused != ((question, other) not in DIFFERENT_QUESTIONS):
+            failures.append(f"{other!r} {'reused' if reused else 'did not reuse'} the answer to {question!r}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=20)
+    parser.add_argument("--first-token-delay-ms", type=float, default=300.0)
+    parser.add_argument("--token-delay-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    config = FakeLLMConfig(args.first_token_delay_ms, args.token_delay_ms, 64)
+    rng = random.Random(0)
+    pool = make_queries(args.distinct)
+    failures = check_reuse(float(os.getenv("PROMPTPILOT_ANSWER_CACHE_SIMILARITY", "0.95")))
+    with run_fake_llm(config) as base_url, tempfile.TemporaryDirectory() as workdir:
+        os.environ["GROQ_BASE_URL"] = base_url
+        os.environ.setdefault("GROQ_API_KEY", "fake")
+        os.chdir(workdir)
+        from app.collection_manager import DEFAULT_COLLECTION
+        from app.main import answer_cache, app, collections
+
+        document_processor = collections.get(DEFAULT_COLLECTION)
+        document_processor.add_documents(make_chunks(500, words_per_chunk=120))
+        latencies = {True: [], False: []}
+        with serve_in_thread(app) as app_url, httpx.Client(base_url=app_url, timeout=60) as client:
+            for n in range(args.requests):
+                if n == args.requests // 2:
+                    document_processor.add_documents(make_chunks(10, words_per_chunk=120, seed=9))
+                question = rng.choice(pool)
+                if rng.random() < 0.3:
+                    question = _reword(question)
+                start = time.perf_counter()
+                response = client.post("/api/chat", json={"message": question})
+                response.raise_for_status()
+                latencies[response.json()["cached"]].append((time.perf_counter() - start) * 1000)
+
+        print(json.dumps({
+            "requests": args.requests,
+            "distinct_questions": args.distinct,
+            "hit_latency_ms_median": round(statistics.median(latencies[True]), 2) if latencies[True] else None,
+            "miss_latency_ms_median": round(statistics.median(latencies[False]), 2) if latencies[False] else None,
+            **answer_cache.stats(),
+            "failures": failures,
+        }, indent=2))
+    if failures:
+        for failure in failures:
+            print(f"FAILED {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
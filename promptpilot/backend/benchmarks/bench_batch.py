@@ -0,0 +1,89 @@
+"""Questions/sec of /api/chat/batch versus sending the same questions one at a time.
+
+    python -m benchmarks.bench_batch [--questions 100] [--first-token-delay-ms 200] [--concurrency 8]
+
+Runs the app in-process against the local fake LLM, with the answer cache off so
+every question reaches the model. Also times retrieval alone: a search_hits loop
+against one search_hits_batch call.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, run_fake_llm, serve_in_thread
+from benchmarks.synthetic import make_chunks, make_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--first-token-delay-ms", type=float, default=200.0)
+    parser.add_argument("--token-delay-ms", type=float, default=1.0)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    config = FakeLLMConfig(args.first_token_delay_ms, args.token_delay_ms, args.tokens)
+    with run_fake_llm(config) as base_url, tempfile.TemporaryDirectory() as workdir:
+        os.environ["GROQ_BASE_URL"] = base_url
+        os.environ.setdefault("GROQ_API_KEY", "fake")
+        os.environ["PROMPTPILOT_ANSWER_CACHE_SIZE"] = "0"
+        os.environ["PROMPTPILOT_BATCH_CONCURRENCY"] = str(args.concurrency)
+        os.environ.setdefault("PROMPTPILOT_LLM_CONCURRENCY", str(args.concurrency))
+        os.chdir(workdir)
+        from app.collection_manager import DEFAULT_COLLECTION
+        from app.main import CONTEXT_CHUNKS, app, collections
+
+        document_processor = collections.get(DEFAULT_COLLECTION)
+        document_processor.add_documents(make_chunks(args.chunks, words_per_chunk=120))
+        queries = make_queries(args.questions)
+
+        start = time.perf_counter()
+        for query in queries:
+            document_processor.search_hits(query, CONTEXT_CHUNKS)
+        search_loop_s = time.perf_counter() - start
+        start = time.perf_counter()
+        document_processor.search_hits_batch(queries, CONTEXT_CHUNKS)
+        search_batch_s = time.perf_counter() - start
+
+        with serve_in_thread(app) as app_url, httpx.Client(base_url=app_url, timeout=600) as client:
+            start = time.perf_counter()
+            for query in queries:
+                client.post("/api/chat", json={"message": query}).raise_for_status()
+            sequential_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            first_ms, lines = None, []
+            with client.stream("POST", "/api/chat/batch", json={"questions": queries}) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if line:
+                        if first_ms is None:
+                            first_ms = (time.perf_counter() - start) * 1000
+                        lines.append(json.loads(line))
+            batch_s = time.perf_counter() - start
+
+    answers = [line for line in lines if "index" in line]
+    print(json.dumps({
+        "questions": args.questions,
+        "chunks": args.chunks,
+        "batch_concurrency": args.concurrency,
+        "search_loop_ms": round(search_loop_s * 1000, 1),
+        "search_batch_ms": round(search_batch_s * 1000, 1),
+        "sequential_questions_per_s": round(args.questions / sequential_s, 2),
+        "batch_questions_per_s": round(args.questions / batch_s, 2),
+        "batch_first_answer_ms": round(first_ms, 1),
+        "batch_errors": sum("error" in answer for answer in answers),
+        "speedup": round(sequential_s / batch_s, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Chunking throughput and chunk counts as documents grow.
+
+    python -m benchmarks.bench_chunker [--sizes-mb 1 4 16] [--units chars tokens] [--texts prose spaceless cjk]
+
+Times DocumentProcessor.iter_chunks on cleaned synthetic text, given both as one
+string and as a generator of 64 KiB pieces: English prose, text without spaces
+(like base64 or long URLs) and CJK text that has no spaces between sentences.
+Chunk count should grow linearly with document size and throughput should stay
+flat. The process exits non-zero if a chunk is longer than ``chunk_size``.
+"""
+import argparse
+import base64
+import json
+import logging
+import random
+import sys
+import time
+
+from app.document_processor import CHUNK_UNITS, DocumentProcessor
+from benchmarks.synthetic import make_document
+
+PIECE_CHARS = 64 * 1024
+TEXTS = ["prose", "spaceless", "cjk"]
+
+
+def make_text(kind: str, chars: int) -> str:
+    if kind == "spaceless":
+        return base64.b64encode(random.Random(0).randbytes(chars * 3 // 4)).decode()
+    if kind == "cjk":
+        sentences = ["这是一个关于检索的测试句子。", "文档被切分成较小的片段！", "问题的答案在哪里？"]
+        rng = random.Random(0)
+        return ''.join(rng.choice(sentences) for _ in range(chars // 12))
+    return make_document(chars)
+
+
+def bench(processor: DocumentProcessor, text: str, streamed: bool) -> dict:
+    start = time.perf_counter()
+    if streamed:
+        chunks = list(processor.iter_chunks(text[i:i + PIECE_CHARS] for i in range(0, len(text), PIECE_CHARS)))
+    else:
+        chunks = list(processor.iter_chunks([text]))
+    elapsed = time.perf_counter() - start
+    mb = len(text.encode()) / 1e6
+    return {
+        "unit": processor.chunk_unit,
+        "input": "generator" if streamed else "string",
+        "mb": round(mb, 2),
+        "mb_per_s": round(mb / elapsed, 2),
+        "chunks": len(chunks),
+        "avg_chunk_chars": round(sum(map(len, chunks)) / len(chunks)),
+        "max_chunk": max(processor._measure(chunk) for chunk in chunks),
+        "max_chunk_chars": max(map(len, chunks)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--units", nargs="+", default=list(CHUNK_UNITS), choices=CHUNK_UNITS)
+    parser.add_argument("--texts", nargs="+", default=TEXTS, choices=TEXTS)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results, failures = [], []
+    for kind in args.texts:
+        for size in args.sizes_mb:
+            processor = DocumentProcessor()
+            text = processor._clean_text(make_text(kind, int(size * 1e6)))
+            for unit in args.units:
+                processor = DocumentProcessor(chunk_unit=unit)
+                for streamed in (False, True):
+                    result = {"text": kind, **bench(processor, text, streamed)}
+                    results.append(result)
+                    if result["max_chunk"] > processor.chunk_size:
+                        failures.append(f"{kind} {unit}: a chunk measures {result['max_chunk']} > {processor.chunk_size}")
+    print(json.dumps(results, indent=2))
+    if failures:
+        for failure in failures:
+            print(f"FAILED {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Resident-index LRU: hit rate, lazy reload latency and memory under a budget.
+
+    python -m benchmarks.bench_collections [--collections 20] [--chars 1000000] [--budget-fraction 0.25]
+                                           [--budget-mb MB] [--requests 500]
+
+Uploads pasted text into many collections through the API, then asks questions
+against collections picked with a skewed (Zipf-like) popularity, so a few hot
+collections stay resident while cold ones are evicted and reloaded from disk.
+
+Unless ``--budget-mb`` is given, the budget is set after the uploads to a fraction
+of the heap bytes all collections hold once loaded, so the questions always run
+over budget whatever the backend and corpus size.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, run_fake_llm, serve_in_thread
+from benchmarks.synthetic import make_document, make_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--collections", type=int, default=20)
+    parser.add_argument("--chars", type=int, default=1_000_000, help="characters of text per collection")
+    parser.add_argument("--budget-fraction", type=float, default=0.25,
+                        help="memory budget as a fraction of all collections' heap bytes")
+    parser.add_argument("--budget-mb", type=float, help="fixed memory budget, instead of --budget-fraction")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with run_fake_llm(FakeLLMConfig(0.0, 0.0, 8)) as base_url, tempfile.TemporaryDirectory() as workdir:
+        os.environ["GROQ_BASE_URL"] = base_url
+        os.environ.setdefault("GROQ_API_KEY", "fake")
+        os.environ["PROMPTPILOT_ANSWER_CACHE_SIZE"] = "0"
+        # Everything stays resident while uploading, so the whole corpus can be measured
+        os.environ["PROMPTPILOT_INDEX_MEMORY_MB"] = str(args.budget_mb or 2 ** 20)
+        os.chdir(workdir)
+        from app.main import app, collections
+
+        names = [f"tenant-{i}" for i in range(args.collections)]
+        rng = random.Random(0)
+        weights = [1.0 / (rank + 1) for rank in range(len(names))]
+        queries = make_queries(50)
+        latencies = []
+        with serve_in_thread(app) as app_url, httpx.Client(base_url=app_url, timeout=120) as client:
+            for seed, name in enumerate(names):
+                client.post(
+                    f"/api/collections/{name}/chat",
+                    json={"message": "process_text", "text": make_document(args.chars, seed=seed)}
+                ).raise_for_status()
+            if args.budget_mb is None:
+                for name in names:
+                    # Measured as a reload sees it, texts and arrays mapped from disk
+                    collections.get(name).load_index(collections.path(name))
+                heap = sum(usage.heap for usage in collections.memory_usage().values())
+                collections.set_memory_budget(int(heap * args.budget_fraction))
+            loaded = collections.stats()
+            for _ in range(args.requests):
+                name = rng.choices(names, weights=weights)[0]
+                start = time.perf_counter()
+                client.post(f"/api/collections/{name}/chat", json={"message": rng.choice(queries)}).raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+            stats = client.get("/api/stats").json()["collections"]
+
+    latencies.sort()
+    print(json.dumps({
+        "collections": args.collections,
+        "memory_budget_mb": round(loaded["memory_budget_bytes"] / 2 ** 20, 2),
+        "requests": args.requests,
+        "resident": stats["resident"],
+        "memory_mb": round(stats["memory_bytes"] / 2 ** 20, 2),
+        "mapped_mb": round(stats["mapped_bytes"] / 2 ** 20, 2),
+        "hit_rate": round((stats["hits"] - loaded["hits"]) / args.requests, 3),
+        "reloads": stats["loads"] - loaded["loads"],
+        "evictions": stats["evictions"] - loaded["evictions"],
+        "load_ms_mean": round(stats["load_ms_mean"], 1),
+        "load_ms_max": round(stats["load_ms_max"], 1),
+        "chat_ms_median": round(statistics.median(latencies), 1),
+        "chat_ms_p99": round(latencies[int(0.99 * (len(latencies) - 1))], 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
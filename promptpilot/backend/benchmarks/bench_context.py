@@ -0,0 +1,138 @@
+"""Prompt size and time-to-first-token: legacy prompt assembly versus the context builder.
+
+    python -m benchmarks.bench_context [--questions 20] [--budget 800] [--prefill-ms-per-1k-tokens 300]
+
+Indexes a few synthetic documents, then for a fixed question set builds the prompt
+both ways and streams it to the local fake LLM, whose first-token delay grows with
+prompt length:
+
+- legacy: DocumentProcessor.search (five chunks cut to 1,000 characters, in
+  document order) inside the original instruction-heavy prompt
+- budgeted: search_hits (eight chunks, best first) through ContextBuilder and the
+  compact prompt LLMProcessor sends now
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+from typing import List
+
+from benchmarks.fake_llm import FakeLLMConfig, run_fake_llm
+from benchmarks.synthetic import make_document, make_queries
+
+LEGACY_SYSTEM = (
+    "You are a helpful AI assistant that provides detailed, accurate answers based on the provided context. "
+    "You are thorough in your analysis and clear in your explanations. You always acknowledge when the context "
+    "is insufficient or unrelated to the question. You are particularly good at identifying when the context is "
+    "a table of contents or outline and explaining what additional information would be needed."
+)
+
+LEGACY_TEMPLATE = """You are a helpful AI assistant specialized in answering questions based on provided context. Your task is to:
+
+1. Carefully analyze the provided context
+2. Answer the question using ONLY information from the context
+3. If the answer is not fully available in the context, explain what information is missing
+4. If you cannot find any relevant information, say "I cannot find the answer in the provided context"
+5. Be specific and detailed in your answers
+6. Maintain a professional and clear tone
+
+Context:
+{context}
+
+Question: {question}
+
+Remember to:
+- Base your answer ONLY on the provided context
+- Be specific and detailed
+- Acknowledge any limitations in the available information
+- Maintain a professional tone
+- If the context seems unrelated to the question, explicitly state this
+- If the context is a table of contents or outline, acknowledge this and explain what information would be needed for a complete answer
+
+Answer:"""
+
+
+def legacy_messages(question: str, chunks: List[str]) -> List[dict]:
+    context = "\n\n---\n\n".join(f"Context {i+1}:\n{chunk}" for i, chunk in enumerate(chunks))
+    return [
+        {"role": "system", "content": LEGACY_SYSTEM},
+        {"role": "user", "content": LEGACY_TEMPLATE.format(context=context, question=question)},
+    ]
+
+
+async def time_to_first_token(client, model: str, messages: List[dict]) -> float:
+    start = time.perf_counter()
+    stream = await client.chat.completions.create(model=model, messages=messages, stream=True)
+    ttft = None
+    async for chunk in stream:
+        if ttft is None and chunk.choices and chunk.choices[0].delta.content:
+            ttft = (time.perf_counter() - start) * 1000
+    return ttft
+
+
+def summarize(prompt_tokens: List[int], ttft: List[float]) -> dict:
+    return {
+        "prompt_tokens_median": statistics.median(prompt_tokens),
+        "ttft_ms_median": round(statistics.median(ttft), 1),
+    }
+
+
+async def run(args) -> dict:
+    from app.context_builder import ContextBuilder, count_tokens
+    from app.document_processor import DocumentProcessor
+    from app.llm_processor import LLMProcessor
+
+    processor = DocumentProcessor(index_backend="incremental")
+    for seed in range(args.documents):
+        processor.add_documents(processor.process_pasted_text(make_document(200_000, seed=seed)))
+    builder = ContextBuilder(token_budget=args.budget)
+    llm = LLMProcessor()
+
+    def prompt_tokens(messages):
+        return sum(count_tokens(message["content"]) for message in messages)
+
+    results = {"legacy": ([], []), "budgeted": ([], [])}
+    for question in make_queries(args.questions):
+        messages = {
+            "legacy": legacy_messages(question, processor.search(question)),
+        }
+        hits, _ = processor.search_hits(question, 8)
+        context, _ = builder.build(question, [(score, text) for _, score, text in hits])
+        messages["budgeted"] = llm._build_messages(question, context)
+        for name, built in messages.items():
+            results[name][0].append(prompt_tokens(built))
+            results[name][1].append(await time_to_first_token(llm.async_client, llm.model, built))
+
+    legacy, budgeted = summarize(*results["legacy"]), summarize(*results["budgeted"])
+    return {
+        "questions": args.questions,
+        "token_budget": args.budget,
+        "legacy": legacy,
+        "budgeted": budgeted,
+        "prompt_token_reduction": round(1 - budgeted["prompt_tokens_median"] / legacy["prompt_tokens_median"], 3),
+        "ttft_reduction": round(1 - budgeted["ttft_ms_median"] / legacy["ttft_ms_median"], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--documents", type=int, default=3)
+    parser.add_argument("--budget", type=int, default=800)
+    parser.add_argument("--first-token-delay-ms", type=float, default=100.0)
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=300.0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    config = FakeLLMConfig(args.first_token_delay_ms, 1.0, 8, args.prefill_ms_per_1k_tokens)
+    with run_fake_llm(config) as base_url:
+        os.environ["GROQ_BASE_URL"] = base_url
+        os.environ.setdefault("GROQ_API_KEY", "fake")
+        print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
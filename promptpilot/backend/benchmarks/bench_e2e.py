@@ -0,0 +1,272 @@
+"""End-to-end upload and chat load, checked against a stored baseline.
+
+    python -m benchmarks.bench_e2e [--text-sizes 100000 1000000] [--pdf-pages 20 200] [--copies 3]
+                                   [--upload-concurrency 2] [--chat-concurrency 8] [--chat-requests 300]
+                                   [--llm-first-token-ms 50] [--llm-tokens-per-s 200] [--backend incremental]
+                                   [--output result.json] [--baseline benchmarks/baselines/bench_e2e.json]
+                                   [--save-baseline PATH] [--tolerance 0.3] [--slack-ms 50]
+
+Writes a synthetic corpus of text files and PDFs at several sizes, starts the
+backend in a uvicorn subprocess against the local fake LLM, warms it up with
+one small upload and a few questions, then:
+
+1. uploads the whole corpus through /api/upload (``wait=true``, so a request's
+   latency covers extraction, chunking, indexing and persistence) at
+   ``--upload-concurrency``;
+2. sends ``--chat-requests`` questions to /api/chat at ``--chat-concurrency``,
+   with the answer cache off so every question reaches the model.
+
+It reports each phase's throughput, p50/p95/p99 latency and errors, and the peak
+RSS of the server and of its ingestion workers, as JSON. A chat answer that is
+the API's generation error text counts as a failed request.
+
+The run fails (exit status 1) when any request failed. With ``--baseline`` it
+also fails when a chat latency percentile, the median upload latency of a file
+size, a peak RSS figure or a throughput is worse than the baseline's by more
+than ``--tolerance`` (a fraction). Latencies must also be worse by more than
+``--slack-ms``, so short ones do not fail on scheduling noise. Baselines depend on
+the machine; record one with ``--save-baseline`` using the same options.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, run_fake_llm
+from benchmarks.load_test import chat_status, run_backend, summarize
+from benchmarks.synthetic import make_queries, write_corpus
+
+# (metric, True if higher is better) compared against the baseline. Upload
+# percentiles mix very different file sizes over a few samples, so uploads are
+# compared by throughput and by the median of each size class instead
+COMPARED = [
+    ("upload.mb_per_s", True),
+    ("chat.p50_ms", False),
+    ("chat.p95_ms", False),
+    ("chat.p99_ms", False),
+    ("chat.requests_per_s", True),
+    ("memory.server_peak_rss_mb", False),
+    ("memory.workers_peak_rss_mb", False),
+]
+
+
+def _status_kb(pid: int, field: str) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _children(pid: int) -> List[int]:
+    pids = []
+    for task in Path(f"/proc/{pid}/task").glob("*"):
+        try:
+            pids.extend(int(child) for child in (task / "children").read_text().split())
+        except OSError:
+            pass
+    return pids
+
+
+def peak_rss_mb(pid: int) -> Dict:
+    """Peak resident set of a process and the sum over its child processes (Linux only)."""
+    server = _status_kb(pid, "VmHWM")
+    workers = [_status_kb(child, "VmHWM") for child in _children(pid)]
+    workers = [kb for kb in workers if kb is not None]
+    return {
+        "server_peak_rss_mb": round(server / 1024, 1) if server is not None else None,
+        "workers_peak_rss_mb": round(sum(workers) / 1024, 1) if workers else None,
+        "workers": len(workers),
+    }
+
+
+async def _run_requests(concurrency: int, jobs: List, send) -> tuple:
+    """Run ``send(job)`` for every job at the given concurrency.
+
+    Returns latencies and statuses in job order, and the elapsed seconds.
+    """
+    latencies, statuses = [None] * len(jobs), [None] * len(jobs)
+    queue = list(reversed(range(len(jobs))))
+
+    async def worker():
+        while queue:
+            i = queue.pop()
+            start = time.perf_counter()
+            try:
+                statuses[i] = await send(jobs[i])
+            except httpx.HTTPError as e:
+                statuses[i] = type(e).__name__
+            latencies[i] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def upload_phase(client: httpx.AsyncClient, paths: List[Path], concurrency: int) -> Dict:
+    async def send(path: Path):
+        with open(path, 'rb') as f:
+            response = await client.post("/api/upload", params={"wait": True}, files=[("files", (path.name, f.read()))])
+        if response.status_code == 202 and response.json()["jobs"][0]["status"] != "completed":
+            return "job_failed"
+        return 200 if response.status_code == 202 else response.status_code
+
+    latencies, statuses, elapsed = await _run_requests(concurrency, paths, send)
+    total_mb = sum(path.stat().st_size for path in paths) / 2 ** 20
+    # Files are named <kind>-<size>-<copy>; the size class is <kind>-<size>
+    classes = {}
+    for path, latency, status in zip(paths, latencies, statuses):
+        classes.setdefault(path.stem.rsplit("-", 1)[0], []).append((latency, status))
+    return {
+        "concurrency": concurrency,
+        "files": len(paths),
+        "mb": round(total_mb, 2),
+        "seconds": round(elapsed, 2),
+        "files_per_s": round(len(paths) / elapsed, 2),
+        "mb_per_s": round(total_mb / elapsed, 2),
+        **summarize(latencies, statuses),
+        "p50_ms_by_size": {
+            name: summarize(*zip(*samples))["p50_ms"] for name, samples in classes.items()
+        },
+    }
+
+
+async def chat_phase(client: httpx.AsyncClient, n_requests: int, concurrency: int) -> Dict:
+    async def send(question: str):
+        response = await client.post("/api/chat", json={"message": question})
+        return chat_status(response)
+
+    latencies, statuses, elapsed = await _run_requests(concurrency, make_queries(n_requests), send)
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests_per_s": round(n_requests / elapsed, 2),
+        **summarize(latencies, statuses),
+    }
+
+
+async def warm_up(client: httpx.AsyncClient, workdir: Path):
+    """One small upload and a few questions, so worker start-up and imports are not measured."""
+    path = write_corpus(workdir / "warmup", [20_000], [], seed=10_000)[0]
+    with open(path, 'rb') as f:
+        response = await client.post("/api/upload", params={"wait": True}, files=[("files", (path.name, f.read()))])
+    response.raise_for_status()
+    for question in make_queries(5, seed=10_000):
+        (await client.post("/api/chat", json={"message": question})).raise_for_status()
+
+
+async def run(url: str, workdir: Path, paths: List[Path], args) -> Dict:
+    async with httpx.AsyncClient(base_url=url, timeout=600) as client:
+        await warm_up(client, workdir)
+        upload = await upload_phase(client, paths, args.upload_concurrency)
+        chat = await chat_phase(client, args.chat_requests, args.chat_concurrency)
+    return {"upload": upload, "chat": chat}
+
+
+def _lookup(result: Dict, path: str):
+    for key in path.split("."):
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float, slack_ms: float) -> List[str]:
+    """Regressions of result against baseline, as readable messages."""
+    regressions = []
+    compared = COMPARED + [(f"upload.p50_ms_by_size.{name}", False) for name in result["upload"]["p50_ms_by_size"]]
+    for metric, higher_is_better in compared:
+        old, new = _lookup(baseline, metric), _lookup(result, metric)
+        if old is None or new is None:
+            continue
+        if higher_is_better:
+            worse = new < old * (1 - tolerance)
+        else:
+            worse = new > old * (1 + tolerance)
+        if worse and "_ms" in metric and new - old <= slack_ms:
+            # A large relative change of a short latency is scheduling noise
+            worse = False
+        if worse:
+            regressions.append(f"{metric}: {new} vs baseline {old} (tolerance {tolerance:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--text-sizes", type=int, nargs="*", default=[100_000, 1_000_000], help="characters")
+    parser.add_argument("--pdf-pages", type=int, nargs="*", default=[20, 200])
+    parser.add_argument("--copies", type=int, default=3, help="files per size")
+    parser.add_argument("--upload-concurrency", type=int, default=2)
+    parser.add_argument("--chat-concurrency", type=int, default=8)
+    parser.add_argument("--chat-requests", type=int, default=300)
+    parser.add_argument("--llm-first-token-ms", type=float, default=50.0)
+    parser.add_argument("--llm-tokens-per-s", type=float, default=200.0)
+    parser.add_argument("--llm-tokens", type=int, default=32)
+    parser.add_argument("--backend", default="incremental", choices=["tfidf", "incremental", "bm25"])
+    parser.add_argument("--output", type=Path, help="also write the result JSON here")
+    parser.add_argument("--baseline", type=Path, help="fail on regressions against this result JSON")
+    parser.add_argument("--save-baseline", type=Path, help="write this run's result as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--slack-ms", type=float, default=50.0,
+                        help="latency regressions must also be at least this many milliseconds")
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        first_token_delay_ms=args.llm_first_token_ms,
+        token_delay_ms=1000 / args.llm_tokens_per_s,
+        tokens=args.llm_tokens
+    )
+    with tempfile.TemporaryDirectory() as tmp, run_fake_llm(config) as llm_url:
+        workdir = Path(tmp)
+        start = time.perf_counter()
+        paths = write_corpus(workdir / "corpus", args.text_sizes, args.pdf_pages, args.copies)
+        corpus_s = time.perf_counter() - start
+        env = {"PROMPTPILOT_INDEX_BACKEND": args.backend, "PROMPTPILOT_LLM_QUEUE": "1000"}
+        with run_backend(workdir, llm_url, env) as (url, proc):
+            phases = asyncio.run(run(url, workdir, paths, args))
+            memory = peak_rss_mb(proc.pid)
+
+    result = {
+        "config": {
+            "backend": args.backend,
+            "text_sizes": args.text_sizes,
+            "pdf_pages": args.pdf_pages,
+            "copies": args.copies,
+            "llm_first_token_ms": args.llm_first_token_ms,
+            "llm_tokens_per_s": args.llm_tokens_per_s,
+            "llm_tokens": args.llm_tokens,
+            "corpus_s": round(corpus_s, 2),
+        },
+        **phases,
+        "memory": memory,
+    }
+    result["regressions"] = [
+        f"{section}: failed requests {result[section]['errors']}" for section in ("upload", "chat") if result[section]["errors"]
+    ]
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("config", {}).get("backend") != args.backend:
+            print(f"Warning: baseline was recorded with backend {baseline.get('config', {}).get('backend')}", file=sys.stderr)
+        result["regressions"] += compare(result, baseline, args.tolerance, args.slack_ms)
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output is not None:
+        args.output.write_text(output + "\n")
+    if args.save_baseline is not None:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps({k: v for k, v in result.items() if k != "regressions"}, indent=2) + "\n")
+    if result.get("regressions"):
+        for regression in result["regressions"]:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
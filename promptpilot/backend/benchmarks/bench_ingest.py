@@ -0,0 +1,59 @@
+"""Cost of adding one more document to an index that already holds N chunks.
+
+    python -m benchmarks.bench_ingest [--sizes 1000 10000 50000] [--new-chunks 50]
+
+With the incremental backend the add time should stay flat as the corpus grows;
+the tfidf backend refits the whole corpus and grows linearly.
+"""
+import argparse
+import json
+import logging
+import time
+
+from app.document_processor import INDEX_BACKENDS, DocumentProcessor
+from benchmarks.synthetic import make_chunks
+
+
+def bench(backend: str, n_chunks: int, new_chunks: int, repeats: int) -> dict:
+    processor = DocumentProcessor(index_backend=backend)
+    base = make_chunks(n_chunks, words_per_chunk=120)
+    for start in range(0, n_chunks, 500):
+        processor.add_documents(base[start:start + 500])
+
+    extra = make_chunks(new_chunks * repeats, words_per_chunk=120, seed=7)
+    timings = []
+    for r in range(repeats):
+        start = time.perf_counter()
+        doc_id = processor.add_documents(extra[r * new_chunks:(r + 1) * new_chunks])
+        timings.append((time.perf_counter() - start) * 1000)
+    start = time.perf_counter()
+    processor.delete_document(doc_id)
+    delete_ms = (time.perf_counter() - start) * 1000
+    return {
+        "backend": backend,
+        "corpus_chunks": n_chunks,
+        "new_chunks": new_chunks,
+        "add_ms_median": round(sorted(timings)[len(timings) // 2], 3),
+        "delete_ms": round(delete_ms, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--new-chunks", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", default=["incremental", "tfidf"], choices=sorted(INDEX_BACKENDS))
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results = [
+        bench(backend, n, args.new_chunks, args.repeats)
+        for backend in args.backends
+        for n in args.sizes
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Warm-start cost: save an index of N chunks, then time load_index and the first query.
+
+    python -m benchmarks.bench_load [--sizes 10000 100000] [--backends tfidf incremental bm25]
+
+Also adds one more 50-chunk document to the loaded index and saves it again, like
+an upload does, and reports how long that took and how many bytes the new
+generation wrote rather than hard-linked from the previous one.
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from app.document_processor import INDEX_BACKENDS, DocumentProcessor
+from app.index_store import current_generation
+from benchmarks.synthetic import make_chunks, make_queries
+
+
+def bench(backend: str, n_chunks: int) -> dict:
+    chunks = make_chunks(n_chunks, words_per_chunk=120)
+    writer = DocumentProcessor(index_backend=backend)
+    for start in range(0, n_chunks, 1000):
+        writer.add_documents(chunks[start:start + 1000])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        start = time.perf_counter()
+        writer.save_index(root)
+        save_s = time.perf_counter() - start
+
+        reader = DocumentProcessor(index_backend=backend)
+        start = time.perf_counter()
+        reader.load_index(root)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        reader.search(make_queries(1)[0])
+        first_query_ms = (time.perf_counter() - start) * 1000
+
+        size = sum(p.stat().st_size for p in root.rglob("*") if p.is_file())
+
+        reader.add_documents(make_chunks(50, words_per_chunk=120, seed=1))
+        start = time.perf_counter()
+        reader.save_index(root)
+        resave_s = time.perf_counter() - start
+        generation = current_generation(root)
+        # Files shared with the previous generation have more than one link
+        written = sum(p.stat().st_size for p in generation.iterdir() if p.stat().st_nlink == 1)
+    return {
+        "backend": backend,
+        "chunks": n_chunks,
+        "save_s": round(save_s, 3),
+        "load_ms": round(load_ms, 3),
+        "first_query_ms": round(first_query_ms, 3),
+        "disk_bytes": size,
+        "resave_s": round(resave_s, 3),
+        "resave_written_bytes": written,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--backends", nargs="+", default=["tfidf", "incremental", "bm25"], choices=sorted(INDEX_BACKENDS))
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(json.dumps([bench(b, n) for n in args.sizes for b in args.backends], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""PDF extraction throughput and peak memory on a large generated PDF.
+
+    python -m benchmarks.bench_pdf [--pages 1000] [--workers 4] [--backend incremental]
+                                   [--modes legacy streaming sharded]
+
+Each mode runs in a fresh interpreter so its peak RSS is its own, and ends with
+the chunks and the index backend's prepared vectors:
+
+- legacy: the old loop, ``text += page.extract_text()`` over the whole book, then clean, chunk and vectorize
+- streaming: ``ingest_pool.process_file``, pages cleaned and chunked one at a time
+- sharded: page ranges extracted, chunked and vectorized across a process pool, as the upload job does
+
+Sharded chunks do not span shard boundaries, so their count and hash can differ
+slightly from the other modes. Peak RSS is reported for the driving process and,
+for sharded, for the largest worker.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import PyPDF2
+
+from app.document_processor import DocumentProcessor, index_backend_class
+from app.ingest_pool import join_shards, plan_pdf_shards, process_file, process_pdf_range, warm_up_worker
+from benchmarks.synthetic import make_pdf
+
+MODES = ["legacy", "streaming", "sharded"]
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def _legacy(processor: DocumentProcessor, path: Path):
+    with open(path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        text = ""
+        for page in reader.pages:
+            text += page.extract_text() + "\n"
+    chunks = processor._split_text(processor._clean_text(text))
+    return chunks, index_backend_class(processor.index_backend).prepare(chunks)
+
+
+def _sharded(processor: DocumentProcessor, path: Path, pool: ProcessPoolExecutor, workers: int, shard_pages: int):
+    shards = plan_pdf_shards(processor.count_pdf_pages(path), shard_pages, workers)
+    args = (processor.index_backend, processor.chunk_size, processor.chunk_overlap, processor.chunk_unit)
+    futures = [pool.submit(process_pdf_range, str(path), start, stop, *args) for start, stop in shards]
+    chunks, prepared, _ = join_shards([future.result() for future in futures], processor.index_backend)
+    return chunks, prepared
+
+
+def run_mode(mode: str, path: Path, workers: int, shard_pages: int, backend: str) -> dict:
+    processor = DocumentProcessor(index_backend=backend)
+    pool = None
+    if mode == "sharded":
+        # The server's pool is long-lived and warmed up at start-up, so spawning
+        # workers and importing the app in them is not part of the timing
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        list(pool.map(warm_up_worker, [backend] * workers, [processor.chunk_unit] * workers))
+    else:
+        warm_up_worker(backend, processor.chunk_unit)
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "legacy":
+        chunks, _ = _legacy(processor, path)
+    elif mode == "streaming":
+        chunks, _, _ = process_file(str(path), backend, processor.chunk_size, processor.chunk_overlap,
+                                    processor.chunk_unit)
+    else:
+        chunks, _ = _sharded(processor, path, pool, workers, shard_pages)
+    elapsed = time.perf_counter() - start
+    if pool is not None:
+        pool.shutdown()
+    n_pages = processor.count_pdf_pages(path)
+    result = {
+        "mode": mode,
+        "pages": n_pages,
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round(n_pages / elapsed, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_rss_over_baseline_mb": round(_peak_rss_mb() - baseline, 1),
+        "chunks": len(chunks),
+        "text_sha256": hashlib.sha256("\x00".join(chunks).encode()).hexdigest()[:16],
+    }
+    if mode == "sharded":
+        result["workers"] = workers
+        result["worker_peak_rss_mb"] = round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--shard-pages", type=int, default=50)
+    parser.add_argument("--backend", default="incremental", choices=["tfidf", "incremental", "bm25"])
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--pdf", help="benchmark this PDF instead of generating one")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    if args.child:
+        print(json.dumps(run_mode(args.child, Path(args.pdf), args.workers, args.shard_pages, args.backend)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.pdf
+        if path is None:
+            path = str(Path(tmp) / "book.pdf")
+            make_pdf(path, args.pages, words_per_page=args.words_per_page)
+        results = []
+        for mode in args.modes:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_pdf", "--child", mode, "--pdf", path,
+                 "--workers", str(args.workers), "--shard-pages", str(args.shard_pages), "--backend", args.backend],
+                check=True, capture_output=True, text=True
+            )
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""LLM scheduling against a rate-limited fake provider.
+
+    python -m benchmarks.bench_scheduler [--requests 100] [--concurrency 16] [--provider-rpm 600]
+                                         [--error-rate 0.05] [--duplicates 20] [--batch-questions 48]
+                                         [--flood-batches 5]
+
+Runs four scenarios, each with a fresh backend in a uvicorn subprocess against
+the local fake LLM (answer cache off):
+
+1. rate limits: ``--requests`` distinct questions at ``--concurrency`` against a
+   provider that allows ``--provider-rpm`` requests per minute and answers a
+   random ``--error-rate`` of requests with 429. Run once with retries off, to show
+   what clients would see, and once with the scheduler's retries on;
+2. coalescing: ``--duplicates`` copies of one question sent at once;
+3. priority: a ``/api/chat/batch`` of ``--batch-questions`` questions keeps every
+   LLM slot busy while interactive questions are asked one at a time;
+4. batch flood: ``--flood-batches`` batches at once queue more calls than the
+   interactive wait queue holds while interactive questions are asked.
+
+It checks that with retries every request succeeds, that the duplicates reach
+the provider once, that interactive questions do not queue behind the batch
+(their median latency stays under 2.5 times an uncontended question's), that
+a flood of batch work neither gets interactive questions rejected nor has its
+own questions rejected, and that the scheduler's metrics are exposed. The
+process exits non-zero if a check fails.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, run_fake_llm
+from benchmarks.load_test import chat_status, run_backend, summarize
+from benchmarks.synthetic import make_document, make_queries
+
+SCHEDULER_METRICS = ["promptpilot_llm_queue_wait_seconds_count", "promptpilot_llm_scheduler_retries"]
+
+
+async def _index_document(client: httpx.AsyncClient):
+    response = await client.post("/api/chat", json={"message": "process_text", "text": make_document(200_000)})
+    response.raise_for_status()
+
+
+async def _ask(client: httpx.AsyncClient, question: str) -> tuple:
+    start = time.perf_counter()
+    try:
+        status = chat_status(await client.post("/api/chat", json={"message": question}))
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return (time.perf_counter() - start) * 1000, status
+
+
+async def _ask_all(client: httpx.AsyncClient, questions: List[str], concurrency: int) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ask(question):
+        async with semaphore:
+            return await _ask(client, question)
+
+    start = time.perf_counter()
+    latencies, statuses = zip(*await asyncio.gather(*(ask(question) for question in questions)))
+    return {"seconds": round(time.perf_counter() - start, 2), **summarize(list(latencies), list(statuses))}
+
+
+def _scheduler_stats(metrics_text: str) -> Dict:
+    prefix = "promptpilot_llm_scheduler_"
+    stats = {}
+    for line in metrics_text.splitlines():
+        if line.startswith(prefix) and "{" not in line:
+            name, value = line.split()
+            stats[name[len(prefix):]] = float(value)
+    return stats
+
+
+async def rate_limit_scenario(url: str, llm_url: str, args) -> Dict:
+    questions = make_queries(args.requests, seed=100)
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client, httpx.AsyncClient(base_url=llm_url) as llm:
+        await _index_document(client)
+        result = await _ask_all(client, questions, args.concurrency)
+        metrics = (await client.get("/metrics")).text
+        result["provider"] = (await llm.get("/stats")).json()
+    result["scheduler"] = _scheduler_stats(metrics)
+    result["missing_metrics"] = [name for name in SCHEDULER_METRICS if name not in metrics]
+    return result
+
+
+async def coalescing_scenario(url: str, llm_url: str, args) -> Dict:
+    question = make_queries(1, seed=200)[0]
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client, httpx.AsyncClient(base_url=llm_url) as llm:
+        await _index_document(client)
+        result = await _ask_all(client, [question] * args.duplicates, args.duplicates)
+        result["provider"] = (await llm.get("/stats")).json()
+    return result
+
+
+async def priority_scenario(url: str, args) -> Dict:
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+        await _index_document(client)
+        # Latency of a question with nothing else running: about one model call
+        solo_ms = min([(await _ask(client, question))[0] for question in make_queries(3, seed=500)])
+        batch_questions = make_queries(args.batch_questions, seed=300)
+
+        async def run_batch():
+            response = await client.post("/api/chat/batch", json={"questions": batch_questions})
+            return json.loads(response.text.strip().splitlines()[-1])
+
+        batch = asyncio.create_task(run_batch())
+        # Let the batch fill every slot and the queue first
+        await asyncio.sleep(args.llm_first_token_ms / 1000)
+        latencies, statuses = [], []
+        for question in make_queries(args.interactive_questions, seed=400):
+            latency, status = await _ask(client, question)
+            latencies.append(latency)
+            statuses.append(status)
+        batch_summary = await batch
+    return {
+        "solo_ms": round(solo_ms, 1),
+        "interactive": summarize(latencies, statuses),
+        "batch_total_ms": round(batch_summary["total_ms"], 1),
+        "batch_errors": batch_summary["errors"],
+    }
+
+
+async def batch_flood_scenario(url: str, args) -> Dict:
+    async with httpx.AsyncClient(base_url=url, timeout=600) as client:
+        await _index_document(client)
+
+        async def run_batch(seed):
+            questions = make_queries(args.flood_questions, seed=seed)
+            response = await client.post("/api/chat/batch", json={"questions": questions})
+            return json.loads(response.text.strip().splitlines()[-1])
+
+        batches = [asyncio.create_task(run_batch(600 + n)) for n in range(args.flood_batches)]
+        await asyncio.sleep(args.llm_first_token_ms / 1000)
+        latencies, statuses = [], []
+        for question in make_queries(args.interactive_questions, seed=700):
+            latency, status = await _ask(client, question)
+            latencies.append(latency)
+            statuses.append(status)
+        summaries = await asyncio.gather(*batches)
+    return {
+        "interactive": summarize(latencies, statuses),
+        "batch_errors": sum(summary["errors"] for summary in summaries),
+    }
+
+
+def run_scenario(config: FakeLLMConfig, env: Dict, scenario, args) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp, run_fake_llm(config) as llm_url:
+        with run_backend(Path(tmp), llm_url, env) as (url, _):
+            if scenario in (priority_scenario, batch_flood_scenario):
+                return asyncio.run(scenario(url, args))
+            return asyncio.run(scenario(url, llm_url, args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--provider-rpm", type=float, default=600.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--duplicates", type=int, default=20)
+    parser.add_argument("--batch-questions", type=int, default=48)
+    parser.add_argument("--interactive-questions", type=int, default=8)
+    parser.add_argument("--flood-batches", type=int, default=5)
+    parser.add_argument("--flood-questions", type=int, default=16, help="questions per flood batch")
+    parser.add_argument("--llm-first-token-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    limited = FakeLLMConfig(first_token_delay_ms=50, rate_limit_rpm=args.provider_rpm, error_rate=args.error_rate)
+    slow = FakeLLMConfig(first_token_delay_ms=args.llm_first_token_ms)
+    retry_env = {"PROMPTPILOT_LLM_RETRIES": "8", "PROMPTPILOT_LLM_BACKOFF_S": "0.1", "PROMPTPILOT_LLM_QUEUE": "1000"}
+    result = {
+        "rate_limit_without_retries": run_scenario(
+            limited, {**retry_env, "PROMPTPILOT_LLM_RETRIES": "0"}, rate_limit_scenario, args
+        ),
+        "rate_limit_with_retries": run_scenario(limited, retry_env, rate_limit_scenario, args),
+        "coalescing": run_scenario(slow, {}, coalescing_scenario, args),
+        "priority": run_scenario(slow, {"PROMPTPILOT_LLM_CONCURRENCY": "2"}, priority_scenario, args),
+        "batch_flood": run_scenario(slow, {"PROMPTPILOT_LLM_CONCURRENCY": "2"}, batch_flood_scenario, args),
+    }
+
+    failures = []
+    retried = result["rate_limit_with_retries"]
+    if retried["errors"]:
+        failures.append(f"requests failed despite retries: {retried['errors']}")
+    if retried["missing_metrics"]:
+        failures.append(f"scheduler metrics missing from /metrics: {retried['missing_metrics']}")
+    coalescing = result["coalescing"]
+    if coalescing["errors"]:
+        failures.append(f"duplicate requests failed: {coalescing['errors']}")
+    if coalescing["provider"]["requests"] != 1:
+        failures.append(f"{args.duplicates} duplicates made {coalescing['provider']['requests']} provider calls")
+    priority = result["priority"]
+    if priority["interactive"]["errors"] or priority["batch_errors"]:
+        failures.append(f"priority scenario had errors: {priority}")
+    elif priority["interactive"]["p50_ms"] > 2.5 * priority["solo_ms"]:
+        failures.append(f"interactive p50 {priority['interactive']['p50_ms']} ms queued behind the batch")
+    flood = result["batch_flood"]
+    if flood["interactive"]["errors"] or flood["batch_errors"]:
+        failures.append(f"batch flood: {flood['interactive']['errors']} interactive and "
+                        f"{flood['batch_errors']} batch questions failed")
+    result["failures"] = failures
+
+    print(json.dumps(result, indent=2))
+    if failures:
+        for failure in failures:
+            print(f"FAILED {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
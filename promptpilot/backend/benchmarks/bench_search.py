@@ -0,0 +1,91 @@
+"""Query latency of DocumentProcessor.search at several corpus sizes.
+
+    python -m benchmarks.bench_search [--sizes 1000 10000 100000] [--queries 200]
+                                      [--backends tfidf incremental bm25] [--compare]
+
+Each backend reports index build time, index memory and query latency, so the
+TF-IDF matrix and the BM25 inverted index can be compared side by side.
+
+``--compare`` also times the previous implementation, which re-vectorized the
+whole corpus on every query (only practical for the smaller sizes, tfidf only).
+"""
+import argparse
+import json
+import logging
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app.document_processor import INDEX_BACKENDS, DocumentProcessor
+from benchmarks.synthetic import make_chunks, make_queries
+
+
+def percentiles(samples_ms):
+    return {
+        "p50_ms": round(float(np.percentile(samples_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(samples_ms, 99)), 3),
+    }
+
+
+def legacy_search(processor: DocumentProcessor, query: str, k: int):
+    """The pre-matrix search path: transform every document per query, then argsort."""
+    index = processor.index
+    query_vec = index.vectorizer.transform([processor._clean_text(query)])
+    doc_vecs = index.vectorizer.transform(index.texts)
+    similarities = cosine_similarity(query_vec, doc_vecs).flatten()
+    return np.argsort(similarities)[-k:][::-1]
+
+
+def bench_size(n_chunks: int, n_queries: int, backend: str, compare: bool) -> dict:
+    chunks = make_chunks(n_chunks, words_per_chunk=120)
+    queries = make_queries(n_queries)
+    processor = DocumentProcessor(index_backend=backend)
+
+    start = time.perf_counter()
+    processor.create_index(chunks)
+    build_s = time.perf_counter() - start
+
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        processor.search(query, k=5)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    result = {
+        "backend": backend,
+        "chunks": n_chunks,
+        "index_build_s": round(build_s, 3),
+        "index_bytes": processor.index.memory_usage().heap,
+        "search": percentiles(samples),
+    }
+    if compare and backend == "tfidf":
+        legacy = []
+        for query in queries[: max(1, n_queries // 10)]:
+            start = time.perf_counter()
+            legacy_search(processor, query, 5)
+            legacy.append((time.perf_counter() - start) * 1000)
+        result["legacy_search"] = percentiles(legacy)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=["tfidf", "bm25"], choices=sorted(INDEX_BACKENDS))
+    parser.add_argument("--compare", action="store_true")
+    args = parser.parse_args()
+
+    # Keep per-query logging out of the timings
+    logging.disable(logging.INFO)
+    results = [
+        bench_size(n, args.queries, backend, args.compare)
+        for n in args.sizes
+        for backend in args.backends
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Cold start: import time, time to first response and readiness, first requests.
+
+    python -m benchmarks.bench_startup [--index-chars 2000000] [--runs 3] [--import-runs 5]
+                                       [--output result.json] [--baseline benchmarks/baselines/bench_startup.json]
+                                       [--save-baseline PATH] [--tolerance 0.3] [--slack-ms 50]
+
+Measures, each as the median over several fresh processes:
+
+- ``import_ms``: importing ``app.main`` in a new interpreter, and which heavy
+  dependencies (numpy, scipy, scikit-learn, PyPDF2, groq) that import loaded;
+- for a uvicorn server started in a directory holding a persisted index of
+  ``--index-chars`` characters, with background warm-up on (the default) and off
+  (``PROMPTPILOT_WARMUP=0``): the time from process start to the first response
+  on ``/`` and to ``/api/ready`` returning 200, then the latency of the first
+  chat question and of the first pasted-text upload.
+
+It also starts a server without ``GROQ_API_KEY`` and checks that it indexes
+pasted text and answers chat with 503 rather than failing to start.
+
+The process exits non-zero if a heavy dependency is imported with ``app.main``,
+if the server does not start without an API key, or, with ``--baseline``, if a
+timing is worse than the baseline's by more than ``--tolerance`` (a fraction)
+and ``--slack-ms``. Baselines depend on the machine; record one with
+``--save-baseline``.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, _free_port, run_fake_llm
+from benchmarks.load_test import BACKEND_DIR, run_backend
+from benchmarks.synthetic import make_document, make_queries
+
+HEAVY_MODULES = ["numpy", "scipy", "sklearn", "PyPDF2", "groq"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+import_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({"import_ms": import_ms, "heavy_modules": sorted(m for m in %r if m in sys.modules)}))
+""" % HEAVY_MODULES
+
+MODES = {"warmup": {}, "lazy": {"PROMPTPILOT_WARMUP": "0"}}
+TIMINGS = ["first_response_ms", "ready_ms", "first_chat_ms", "first_upload_ms"]
+
+POLL_S = 0.005
+
+
+def _env(llm_url: str, extra_env: Dict) -> Dict:
+    env = dict(
+        os.environ, GROQ_API_KEY="fake", GROQ_BASE_URL=llm_url, PYTHONPATH=str(BACKEND_DIR),
+        PROMPTPILOT_ANSWER_CACHE_SIZE="0"
+    )
+    env.update(extra_env)
+    return env
+
+
+def measure_import(workdir: Path, llm_url: str) -> Dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=workdir, env=_env(llm_url, {}),
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@contextmanager
+def start_server(workdir: Path, llm_url: str, extra_env: Dict):
+    """Start uvicorn without waiting for it; yields the process, its URL and its start time."""
+    port = _free_port()
+    log = open(workdir / f"server-{port}.log", 'wb')
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=_env(llm_url, extra_env), stdout=log, stderr=subprocess.STDOUT,
+    )
+    try:
+        yield proc, f"http://127.0.0.1:{port}", start
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        log.close()
+
+
+def _wait_for(client: httpx.Client, proc: subprocess.Popen, path: str, timeout_s: float = 120) -> int:
+    """Poll ``path`` until it answers 200 (or 404, for servers without it); returns the status."""
+    deadline = time.perf_counter() + timeout_s
+    while True:
+        try:
+            status = client.get(path, timeout=1).status_code
+            if status in (200, 404):
+                return status
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None or time.perf_counter() > deadline:
+            raise RuntimeError(f"backend did not answer {path}")
+        time.sleep(POLL_S)
+
+
+def measure_server(workdir: Path, llm_url: str, extra_env: Dict, seed: int) -> Dict:
+    with start_server(workdir, llm_url, extra_env) as (proc, url, start), httpx.Client(base_url=url, timeout=300) as client:
+        _wait_for(client, proc, "/")
+        first_response_ms = (time.perf_counter() - start) * 1000
+        _wait_for(client, proc, "/api/ready")
+        ready_ms = (time.perf_counter() - start) * 1000
+
+        request_start = time.perf_counter()
+        client.post("/api/chat", json={"message": make_queries(1, seed=seed)[0]}).raise_for_status()
+        first_chat_ms = (time.perf_counter() - request_start) * 1000
+
+        request_start = time.perf_counter()
+        text = make_document(20_000, seed=seed)
+        client.post("/api/chat", json={"message": "process_text", "text": text}).raise_for_status()
+        first_upload_ms = (time.perf_counter() - request_start) * 1000
+    return {
+        "first_response_ms": first_response_ms,
+        "ready_ms": ready_ms,
+        "first_chat_ms": first_chat_ms,
+        "first_upload_ms": first_upload_ms,
+    }
+
+
+def check_without_api_key(workdir: Path, llm_url: str) -> Dict:
+    with start_server(workdir, llm_url, {"GROQ_API_KEY": ""}) as (proc, url, _), httpx.Client(base_url=url, timeout=60) as client:
+        try:
+            _wait_for(client, proc, "/", timeout_s=60)
+        except RuntimeError:
+            return {"starts": False}
+        text = make_document(20_000)
+        return {
+            "starts": True,
+            "upload_status": client.post("/api/chat", json={"message": "process_text", "text": text}).status_code,
+            "chat_status": client.post("/api/chat", json={"message": "hello"}).status_code,
+        }
+
+
+def _median(samples: List[Dict], key: str) -> float:
+    return round(statistics.median(sample[key] for sample in samples), 1)
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float, slack_ms: float) -> List[str]:
+    """Timings of result worse than baseline, as readable messages."""
+    regressions = []
+    compared = [("import_ms",)] + [(mode, timing) for mode in MODES for timing in TIMINGS]
+    for path in compared:
+        old, new = baseline, result
+        for key in path:
+            old = old.get(key) if isinstance(old, dict) else None
+            new = new.get(key) if isinstance(new, dict) else None
+        if old is None or new is None:
+            continue
+        if new > old * (1 + tolerance) and new - old > slack_ms:
+            regressions.append(f"{'.'.join(path)}: {new} vs baseline {old} (tolerance {tolerance:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-chars", type=int, default=2_000_000, help="size of the persisted index")
+    parser.add_argument("--runs", type=int, default=3, help="server starts per mode")
+    parser.add_argument("--import-runs", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="also write the result JSON here")
+    parser.add_argument("--baseline", type=Path, help="fail on regressions against this result JSON")
+    parser.add_argument("--save-baseline", type=Path, help="write this run's result as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--slack-ms", type=float, default=50.0,
+                        help="regressions must also be at least this many milliseconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, run_fake_llm(FakeLLMConfig(first_token_delay_ms=50, tokens=16)) as llm_url:
+        workdir = Path(tmp)
+        imports = [measure_import(workdir, llm_url) for _ in range(args.import_runs)]
+        # The persisted index every measured server starts from
+        with run_backend(workdir, llm_url) as (url, _):
+            text = make_document(args.index_chars, seed=1)
+            httpx.post(url + "/api/chat", json={"message": "process_text", "text": text}, timeout=600).raise_for_status()
+        index = workdir / "index"
+        modes = {}
+        for mode, env in MODES.items():
+            samples = []
+            for run in range(args.runs):
+                # Every run starts from the same index, without the previous run's upload
+                run_dir = workdir / f"{mode}-{run}"
+                run_dir.mkdir()
+                subprocess.run(["cp", "-r", str(index), str(run_dir / "index")], check=True)
+                samples.append(measure_server(run_dir, llm_url, env, seed=run))
+            modes[mode] = {timing: _median(samples, timing) for timing in TIMINGS}
+        without_key_dir = workdir / "without-key"
+        without_key_dir.mkdir()
+        without_key = check_without_api_key(without_key_dir, llm_url)
+
+    result = {
+        "config": {"index_chars": args.index_chars, "runs": args.runs, "import_runs": args.import_runs},
+        "import_ms": _median(imports, "import_ms"),
+        "heavy_modules": imports[-1]["heavy_modules"],
+        **modes,
+        "without_api_key": without_key,
+    }
+    failures = []
+    if result["heavy_modules"]:
+        failures.append(f"importing app.main loaded {result['heavy_modules']}")
+    if not without_key["starts"] or without_key["upload_status"] != 200 or without_key["chat_status"] != 503:
+        failures.append(f"server without GROQ_API_KEY: {without_key}")
+    if args.baseline is not None:
+        failures.extend(compare(result, json.loads(args.baseline.read_text()), args.tolerance, args.slack_ms))
+    result["failures"] = failures
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output is not None:
+        args.output.write_text(output + "\n")
+    if args.save_baseline is not None:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps({k: v for k, v in result.items() if k != "failures"}, indent=2) + "\n")
+    if failures:
+        for failure in failures:
+            print(f"FAILED {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Time-to-first-token of /api/chat/stream versus the blocking /api/chat answer.
+
+    python -m benchmarks.bench_stream [--requests 10] [--first-token-delay-ms 200] [--token-delay-ms 20]
+
+Runs the app in-process against the local fake LLM, so no API key is needed.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_llm import FakeLLMConfig, run_fake_llm, serve_in_thread
+from benchmarks.synthetic import make_chunks, make_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--first-token-delay-ms", type=float, default=200.0)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    config = FakeLLMConfig(args.first_token_delay_ms, args.token_delay_ms, args.tokens)
+    with run_fake_llm(config) as base_url, tempfile.TemporaryDirectory() as workdir:
+        os.environ["GROQ_BASE_URL"] = base_url
+        os.environ.setdefault("GROQ_API_KEY", "fake")
+        # Both endpoints ask the same questions; measure generation, not the answer cache
+        os.environ["PROMPTPILOT_ANSWER_CACHE_SIZE"] = "0"
+        os.chdir(workdir)
+        from app.collection_manager import DEFAULT_COLLECTION
+        from app.main import app, collections
+
+        document_processor = collections.get(DEFAULT_COLLECTION)
+        document_processor.add_documents(make_chunks(200, words_per_chunk=120))
+        queries = make_queries(args.requests)
+
+        blocking, ttft, streamed = [], [], []
+        with serve_in_thread(app) as app_url, httpx.Client(base_url=app_url, timeout=60) as client:
+            for query in queries:
+                start = time.perf_counter()
+                client.post("/api/chat", json={"message": query}).raise_for_status()
+                blocking.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                first = None
+                with client.stream("POST", "/api/chat/stream", json={"message": query}) as response:
+                    for line in response.iter_lines():
+                        if first is None and line.startswith("event: token"):
+                            first = (time.perf_counter() - start) * 1000
+                ttft.append(first)
+                streamed.append((time.perf_counter() - start) * 1000)
+
+    print(json.dumps({
+        "requests": args.requests,
+        "blocking_answer_ms_median": round(statistics.median(blocking), 1),
+        "stream_ttft_ms_median": round(statistics.median(ttft), 1),
+        "stream_total_ms_median": round(statistics.median(streamed), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
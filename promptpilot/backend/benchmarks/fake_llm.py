@@ -0,0 +1,205 @@
+"""A local stand-in for the Groq (OpenAI-compatible) chat completions API.
+
+    python -m benchmarks.fake_llm --port 8001 --token-delay-ms 20 --first-token-delay-ms 200
+
+Point the backend at it with ``GROQ_BASE_URL=http://127.0.0.1:8001`` and any
+``GROQ_API_KEY``. Latency is configurable per server, so benchmarks can measure the
+service's own overhead without a network or an API key.
+
+It can also behave like a rate-limited provider: past ``--rate-limit-rpm``
+requests per minute, and for a random ``--error-rate`` fraction of requests, it
+answers 429 with a Retry-After header. GET /stats counts what it received.
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_ANSWER_WORDS = (
+    "Based on the provided context the document describes how the system works "
+    "and what information would be needed for a complete answer ."
+).split()
+
+
+@dataclass
+class FakeLLMConfig:
+    first_token_delay_ms: float = 100.0
+    token_delay_ms: float = 10.0
+    tokens: int = 64
+    # Extra time before the first token per 1,000 prompt tokens, like a real model's prefill
+    prefill_ms_per_1k_tokens: float = 0.0
+    # Requests per minute before answering 429 (0 = unlimited); bursts of up to one second's worth pass
+    rate_limit_rpm: float = 0.0
+    # Fraction of requests answered 429 at random, regardless of the rate
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+class _RateLimiter:
+    """Server-side token bucket; returns the seconds until the next request would be allowed."""
+
+    def __init__(self, rpm: float):
+        self.rate = rpm / 60
+        self.capacity = max(1.0, self.rate)
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def check(self) -> float:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.available >= 1:
+            self.available -= 1
+            return 0.0
+        return (1 - self.available) / self.rate
+
+
+def create_app(config: FakeLLMConfig) -> FastAPI:
+    app = FastAPI(title="Fake LLM")
+    limiter = _RateLimiter(config.rate_limit_rpm) if config.rate_limit_rpm > 0 else None
+    rng = random.Random(config.seed)
+    stats = {"requests": 0, "rate_limited": 0, "completed": 0, "prompts": {}}
+
+    def rate_limited(retry_after: float):
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": f"{retry_after:.3f}"},
+            content={"error": {
+                "message": "Rate limit reached, please try again later",
+                "type": "requests",
+                "code": "rate_limit_exceeded",
+            }},
+        )
+
+    @app.get("/stats")
+    async def get_stats():
+        prompts = stats["prompts"]
+        return {**{k: v for k, v in stats.items() if k != "prompts"}, "distinct_prompts": len(prompts),
+                "max_calls_per_prompt": max(prompts.values(), default=0)}
+
+    def completion_tokens():
+        return [_ANSWER_WORDS[i % len(_ANSWER_WORDS)] + " " for i in range(config.tokens)]
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if limiter is not None:
+            wait = limiter.check()
+            if wait > 0:
+                return rate_limited(wait)
+        if config.error_rate and rng.random() < config.error_rate:
+            return rate_limited(0.0)
+        prompt = json.dumps(body.get("messages", []))
+        stats["prompts"][prompt] = stats["prompts"].get(prompt, 0) + 1
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+        prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": config.tokens,
+            "total_tokens": prompt_chars // 4 + config.tokens,
+        }
+        first_token_ms = config.first_token_delay_ms + config.prefill_ms_per_1k_tokens * usage["prompt_tokens"] / 1000
+
+        if not body.get("stream"):
+            await asyncio.sleep((first_token_ms + config.token_delay_ms * config.tokens) / 1000)
+            stats["completed"] += 1
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(completion_tokens()).strip()},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+        async def events():
+            def chunk(delta, finish_reason=None):
+                return "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }) + "\n\n"
+
+            await asyncio.sleep(first_token_ms / 1000)
+            yield chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(completion_tokens()):
+                if i:
+                    await asyncio.sleep(config.token_delay_ms / 1000)
+                yield chunk({"content": token})
+            yield chunk({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+            stats["completed"] += 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def serve_in_thread(app, port: int = 0) -> Iterator[str]:
+    """Serve an ASGI app with uvicorn on a background thread and yield its base URL."""
+    port = port or _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+def run_fake_llm(config: FakeLLMConfig, port: int = 0):
+    """Serve the fake LLM on a background thread; use as ``with run_fake_llm(cfg) as base_url``."""
+    return serve_in_thread(create_app(config), port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token-delay-ms", type=float, default=100.0)
+    parser.add_argument("--token-delay-ms", type=float, default=10.0)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rpm", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    config = FakeLLMConfig(
+        args.first_token_delay_ms, args.token_delay_ms, args.tokens, args.prefill_ms_per_1k_tokens,
+        args.rate_limit_rpm, args.error_rate
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Chat latency with and without a large upload in flight.
+
+    python -m benchmarks.load_test [--concurrency 8] [--duration 10] [--pages 300]
+
+Starts the backend in a uvicorn subprocess (so the load generator does not share
+its GIL) against the local fake LLM, measures /api/chat latency at a fixed
+concurrency while idle, then again while a large PDF is being uploaded and
+indexed. With ingestion off the event loop the two distributions should match.
+
+A chat request counts as an error when it fails or when its answer is the
+error text the API returns when the model call failed. The process exits
+non-zero if any request or the upload failed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from app.llm_processor import GENERATION_ERROR_PREFIX
+from benchmarks.fake_llm import FakeLLMConfig, _free_port, run_fake_llm
+from benchmarks.synthetic import make_chunks, make_pdf, make_queries
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+@contextmanager
+def run_backend(workdir: Path, llm_url: str, extra_env: dict = None):
+    """Run the API in a uvicorn subprocess and yield its base URL."""
+    port = _free_port()
+    # Questions repeat every 50 requests; keep the answer cache out of the latency numbers
+    env = dict(
+        os.environ, GROQ_API_KEY="fake", GROQ_BASE_URL=llm_url, PYTHONPATH=str(BACKEND_DIR),
+        PROMPTPILOT_ANSWER_CACHE_SIZE="0"
+    )
+    env.update(extra_env or {})
+    log = open(workdir / f"server-{port}.log", 'wb')
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                httpx.get(url + "/", timeout=1).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if proc.poll() is not None or time.time() > deadline:
+                    raise RuntimeError("backend failed to start")
+                time.sleep(0.1)
+        yield url, proc
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        log.close()
+
+
+def chat_status(response: httpx.Response):
+    """The status of a /api/chat response; a 200 whose answer is a generation error counts as "generation_error"."""
+    if response.status_code == 200 and response.json()["response"].startswith(GENERATION_ERROR_PREFIX):
+        return "generation_error"
+    return response.status_code
+
+
+def summarize(latencies_ms, statuses) -> dict:
+    ok = [l for l, s in zip(latencies_ms, statuses) if s == 200]
+    return {
+        "requests": len(latencies_ms),
+        "errors": {str(s): statuses.count(s) for s in set(statuses) if s != 200},
+        "p50_ms": round(float(np.percentile(ok, 50)), 1) if ok else None,
+        "p95_ms": round(float(np.percentile(ok, 95)), 1) if ok else None,
+        "p99_ms": round(float(np.percentile(ok, 99)), 1) if ok else None,
+    }
+
+
+async def chat_load(client: httpx.AsyncClient, concurrency: int, stop: asyncio.Event):
+    latencies, statuses = [], []
+    queries = make_queries(50)
+
+    async def worker(i):
+        n = i
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = await client.post("/api/chat", json={"message": queries[n % len(queries)]})
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses.append(chat_status(response))
+            n += concurrency
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return latencies, statuses
+
+
+async def run(url: str, pdf_path: Path, concurrency: int, duration: float) -> dict:
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+        seed = "\n\n".join(make_chunks(20, words_per_chunk=120)).encode()
+        (await client.post("/api/upload", params={"wait": True}, files=[("files", ("seed.txt", seed))])).raise_for_status()
+
+        stop = asyncio.Event()
+        load = asyncio.create_task(chat_load(client, concurrency, stop))
+        await asyncio.sleep(duration)
+        stop.set()
+        idle = summarize(*await load)
+
+        stop = asyncio.Event()
+        load = asyncio.create_task(chat_load(client, concurrency, stop))
+        start = time.perf_counter()
+        with open(pdf_path, 'rb') as f:
+            upload = await client.post("/api/upload", params={"wait": True}, files=[("files", (pdf_path.name, f.read()))])
+        upload_s = time.perf_counter() - start
+        stop.set()
+        during = summarize(*await load)
+
+    return {
+        "concurrency": concurrency,
+        "idle": idle,
+        "during_upload": during,
+        "upload": {"status": upload.status_code, "seconds": round(upload_s, 2)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--llm-delay-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(first_token_delay_ms=args.llm_delay_ms, token_delay_ms=0, tokens=32)
+    with tempfile.TemporaryDirectory() as tmp, run_fake_llm(config) as llm_url:
+        workdir = Path(tmp)
+        pdf_path = workdir / "large.pdf"
+        make_pdf(pdf_path, args.pages)
+        with run_backend(workdir, llm_url, {"PROMPTPILOT_LLM_QUEUE": "1000"}) as (url, _):
+            result = asyncio.run(run(url, pdf_path, args.concurrency, args.duration))
+
+    failures = [f"{phase}: failed requests {result[phase]['errors']}" for phase in ("idle", "during_upload")
+                if result[phase]["errors"]]
+    if result["upload"]["status"] != 202:
+        failures.append(f"upload returned {result['upload']['status']}")
+    result["failures"] = failures
+
+    print(json.dumps(result, indent=2))
+    if failures:
+        for failure in failures:
+            print(f"FAILED {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
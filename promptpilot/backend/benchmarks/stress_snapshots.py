@@ -0,0 +1,160 @@
+"""Concurrent uploads and queries across two worker processes sharing one index.
+
+    python -m benchmarks.stress_snapshots [--backend tfidf] [--uploads 20] [--readers 4] [--idle-s 3]
+
+Starts two uvicorn backends in the same working directory (like two workers of one
+deployment) against the local fake LLM. Readers query both workers in a loop while
+writers upload pasted text through either one. It checks that:
+
+- no query fails while indexes are being rebuilt and swapped,
+- the ``index_version`` each reader sees from a worker never goes backwards,
+- afterwards both workers report every uploaded document and the same version.
+
+Query latency is reported with and without uploads in flight; the process exits
+non-zero if a check fails.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from benchmarks.fake_llm import FakeLLMConfig, run_fake_llm
+from benchmarks.load_test import run_backend
+from benchmarks.synthetic import make_document, make_queries
+
+
+class ReaderStats:
+    def __init__(self):
+        self.latencies_ms: Dict[bool, List[float]] = {False: [], True: []}
+        self.errors: List[str] = []
+        self.regressions = 0
+
+
+async def reader(client: httpx.AsyncClient, queries: List[str], stats: ReaderStats, writing: asyncio.Event,
+                 stop: asyncio.Event):
+    last_version = 0
+    n = 0
+    while not stop.is_set():
+        under_load = writing.is_set()
+        start = time.perf_counter()
+        response = await client.post("/api/chat", json={"message": queries[n % len(queries)]})
+        elapsed = (time.perf_counter() - start) * 1000
+        n += 1
+        if response.status_code != 200:
+            stats.errors.append(f"{response.status_code}: {response.text[:200]}")
+            continue
+        version = response.json()["index_version"]
+        if version < last_version:
+            stats.regressions += 1
+        last_version = max(last_version, version)
+        stats.latencies_ms[under_load].append(elapsed)
+
+
+async def writer(clients: List[httpx.AsyncClient], seeds: List[int], chars: int, doc_ids: List[str], errors: List[str]):
+    for seed in seeds:
+        client = clients[seed % len(clients)]
+        response = await client.post(
+            "/api/chat", json={"message": "process_text", "text": make_document(chars, seed=seed)}
+        )
+        if response.status_code != 200:
+            errors.append(f"upload {seed}: {response.status_code}: {response.text[:200]}")
+        else:
+            doc_ids.append(response.json()["doc_id"])
+
+
+def percentile(values: List[float], q: float) -> float:
+    return round(float(np.percentile(values, q)), 1) if values else None
+
+
+async def run(args, urls: List[str]) -> dict:
+    clients = [httpx.AsyncClient(base_url=url, timeout=120) for url in urls]
+    try:
+        doc_ids, write_errors = [], []
+        # Something to search before the readers start
+        await writer(clients[:1], [10_000], args.chars, doc_ids, write_errors)
+        for client in clients:
+            await client.get("/api/documents")  # let the other worker pick it up
+
+        queries = make_queries(50)
+        stats = [ReaderStats() for _ in range(args.readers * len(clients))]
+        writing, stop = asyncio.Event(), asyncio.Event()
+        readers = [
+            asyncio.create_task(reader(clients[i % len(clients)], queries, stats[i], writing, stop))
+            for i in range(len(stats))
+        ]
+        await asyncio.sleep(args.idle_s)
+
+        writing.set()
+        start = time.perf_counter()
+        seeds = list(range(args.uploads))
+        await asyncio.gather(*(
+            writer(clients, seeds[i::args.writers], args.chars, doc_ids, write_errors) for i in range(args.writers)
+        ))
+        write_s = time.perf_counter() - start
+        writing.clear()
+        stop.set()
+        await asyncio.gather(*readers)
+
+        final = [(await client.get("/api/documents")).json() for client in clients]
+    finally:
+        for client in clients:
+            await client.aclose()
+
+    idle = [ms for s in stats for ms in s.latencies_ms[False]]
+    loaded = [ms for s in stats for ms in s.latencies_ms[True]]
+    read_errors = [error for s in stats for error in s.errors]
+    missing = [sorted(set(doc_ids) - set(state["documents"])) for state in final]
+    checks = {
+        "no_failed_queries": not read_errors,
+        "no_failed_uploads": not write_errors,
+        "versions_monotonic": not any(s.regressions for s in stats),
+        "no_lost_documents": not any(missing),
+        "workers_agree": len({state["index_version"] for state in final}) == 1,
+    }
+    return {
+        "backend": args.backend,
+        "workers": len(urls),
+        "uploads": len(doc_ids),
+        "upload_s": round(write_s, 2),
+        "queries_idle": len(idle),
+        "queries_during_uploads": len(loaded),
+        "query_ms_p50_idle": percentile(idle, 50),
+        "query_ms_p99_idle": percentile(idle, 99),
+        "query_ms_p50_during_uploads": percentile(loaded, 50),
+        "query_ms_p99_during_uploads": percentile(loaded, 99),
+        "final_index_versions": [state["index_version"] for state in final],
+        "final_documents": [len(state["documents"]) for state in final],
+        "errors": (read_errors + write_errors)[:5],
+        "checks": checks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", default="tfidf", choices=["tfidf", "incremental", "bm25"])
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4, help="per worker")
+    parser.add_argument("--chars", type=int, default=100_000, help="characters per upload")
+    parser.add_argument("--idle-s", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with run_fake_llm(FakeLLMConfig(5.0, 0.0, 8)) as llm_url, tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        env = {"PROMPTPILOT_INDEX_BACKEND": args.backend}
+        with run_backend(workdir, llm_url, env) as (first, _), run_backend(workdir, llm_url, env) as (second, _):
+            result = asyncio.run(run(args, [first, second]))
+    print(json.dumps(result, indent=2))
+    if not all(result["checks"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
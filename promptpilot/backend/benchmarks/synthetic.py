@@ -0,0 +1,129 @@
+import random
+from pathlib import Path
+from typing import List
+
+# A small fixed vocabulary with a skewed (Zipf-like) distribution gives realistic
+# posting-list lengths without needing a real corpus on disk.
+_WORDS = [
+    "learning", "education", "student", "teacher", "system", "data", "model", "network",
+    "research", "analysis", "future", "technology", "intelligence", "artificial", "digital",
+    "knowledge", "school", "university", "online", "course", "method", "result", "study",
+    "process", "design", "impact", "policy", "market", "energy", "health", "science",
+    "language", "computer", "information", "development", "management", "performance",
+    "quality", "society", "culture", "economy", "industry", "training", "skill", "value",
+    "problem", "solution", "approach", "framework", "evaluation", "experiment", "theory",
+]
+
+
+def make_vocabulary(size: int = 5000, seed: int = 0) -> List[str]:
+    """Build a vocabulary of real-looking words plus synthetic suffixed variants."""
+    rng = random.Random(seed)
+    vocab = list(_WORDS)
+    while len(vocab) < size:
+        base = rng.choice(_WORDS)
+        vocab.append(f"{base}{rng.choice('abcdefghijklmnopqrstuvwxyz')}{len(vocab)}")
+    return vocab
+
+
+def make_text(rng: random.Random, vocab: List[str], n_words: int) -> str:
+    """Generate sentence-shaped text drawn from a Zipf-like distribution over vocab."""
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    words = rng.choices(vocab, weights=weights, k=n_words)
+    sentences = []
+    for start in range(0, n_words, 15):
+        sentence = " ".join(words[start:start + 15])
+        sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+    return " ".join(sentences)
+
+
+def make_document(n_chars: int, seed: int = 0) -> str:
+    """Paragraphs of 3-12 sentences, separated by blank lines, totalling about n_chars."""
+    rng = random.Random(seed)
+    vocab = make_vocabulary(seed=seed)
+    paragraphs, total = [], 0
+    while total < n_chars:
+        paragraph = make_text(rng, vocab, 15 * rng.randint(3, 12))
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def make_chunks(n_chunks: int, words_per_chunk: int = 300, seed: int = 0) -> List[str]:
+    """Generate n_chunks synthetic document chunks."""
+    rng = random.Random(seed)
+    vocab = make_vocabulary(seed=seed)
+    return [make_text(rng, vocab, words_per_chunk) for _ in range(n_chunks)]
+
+
+def make_queries(n_queries: int, seed: int = 1) -> List[str]:
+    """Generate short synthetic questions over the same vocabulary."""
+    rng = random.Random(seed)
+    vocab = make_vocabulary()
+    return [
+        "What does the document say about " + " ".join(rng.sample(vocab[:500], 3)) + "?"
+        for _ in range(n_queries)
+    ]
+
+
+def make_pdf(path, n_pages: int, words_per_page: int = 400, seed: int = 0) -> None:
+    """Write a plain text PDF with n_pages pages of synthetic prose (PyPDF2-extractable)."""
+    rng = random.Random(seed)
+    vocab = make_vocabulary(seed=seed)
+    font_id, pages_id = 3, 2
+    objects = {
+        1: f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode(),
+        font_id: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    page_ids = []
+    for page in range(n_pages):
+        words = make_text(rng, vocab, words_per_page).split()
+        lines = []
+        for start in range(0, len(words), 12):
+            lines.append(" ".join(words[start:start + 12]))
+            if start and start % 120 == 0:
+                lines.append("")  # paragraph break
+        body = "".join(f"({line}) Tj T* " for line in lines)
+        stream = f"BT /F1 9 Tf 40 800 Td 11 TL {body}ET".encode()
+        page_id, content_id = 4 + 2 * page, 5 + 2 * page
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        objects[page_id] = (
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+        page_ids.append(page_id)
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[pages_id] = f"<< /Type /Pages /Kids [{kids}] /Count {n_pages} >>".encode()
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for obj_id in sorted(objects):
+            offsets[obj_id] = f.tell()
+            f.write(b"%d 0 obj\n" % obj_id + objects[obj_id] + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for obj_id in sorted(objects):
+            f.write(b"%010d 00000 n \n" % offsets[obj_id])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def write_corpus(directory, text_sizes: List[int], pdf_pages: List[int], copies: int = 1, seed: int = 0) -> List:
+    """Write ``copies`` text files of each size in characters and PDFs of each page count.
+
+    Every file gets its own seed, so no two have the same content (and none is
+    skipped as a duplicate upload). Returns the paths, text files first.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for n_chars in text_sizes:
+        for copy in range(copies):
+            path = directory / f"text-{n_chars}-{copy}.txt"
+            path.write_text(make_document(n_chars, seed=seed + len(paths)), encoding='utf-8')
+            paths.append(path)
+    for n_pages in pdf_pages:
+        for copy in range(copies):
+            path = directory / f"pdf-{n_pages}-{copy}.pdf"
+            make_pdf(path, n_pages, seed=seed + len(paths))
+            paths.append(path)
+    return paths
@@ -0,0 +1,119 @@
+"""Deleting a collection must stick, across workers and with ingestion in flight.
+
+Two CollectionManagers on one directory stand in for two worker processes.
+"""
+import asyncio
+import functools
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from app.collection_manager import CollectionManager, CollectionNotFoundError
+from app.document_processor import DocumentProcessor
+from app.jobs import COMPLETED, FAILED, RUNNING, JobQueue, JobStore
+from benchmarks.synthetic import make_chunks
+
+DELETED = "Collection deleted"
+
+
+@pytest.fixture(scope="module")
+def chunks():
+    return make_chunks(200, words_per_chunk=60)
+
+
+def _manager(root: Path) -> CollectionManager:
+    factory = functools.partial(DocumentProcessor, index_backend="incremental")
+    return CollectionManager(root / "collections", factory, memory_budget_bytes=1 << 40, default_path=root)
+
+
+def _add(chunks, doc_id: str):
+    return lambda processor: processor.add_documents(chunks, doc_id)
+
+
+def test_deleted_collection_is_gone_for_a_stale_worker(tmp_path, chunks):
+    a, b = _manager(tmp_path), _manager(tmp_path)
+    a.update("docs", _add(chunks, "old"))
+    version_before = b.get("docs").version
+    a.delete("docs")
+
+    with pytest.raises(CollectionNotFoundError):
+        b.get("docs")
+    assert "docs" not in b.names()
+
+    # The other worker writes to it again before it has noticed the delete
+    a.update("docs", _add(chunks, "new"))
+    b.update("docs", _add(chunks, "newer"))
+    assert sorted(a.get("docs").list_documents()) == ["new", "newer"]
+    assert b.get("docs").version > version_before
+
+
+def test_delete_waits_for_a_save_in_progress(tmp_path, chunks):
+    a, b = _manager(tmp_path), _manager(tmp_path)
+    a.update("docs", _add(chunks, "first"))
+    saving = threading.Event()
+
+    def slow_add(processor: DocumentProcessor):
+        saving.set()
+        time.sleep(0.5)
+        processor.add_documents(chunks, "second")
+
+    writer = threading.Thread(target=a.update, args=("docs", slow_add))
+    writer.start()
+    saving.wait()
+    deleted = b.delete("docs")
+    writer.join()
+
+    assert deleted
+    assert not a.exists("docs") and not b.exists("docs")
+
+
+async def _run_pending_jobs(root: Path, chunks) -> Dict:
+    manager = _manager(root)
+    store = JobStore(root / "jobs.db")
+    gate = asyncio.Event()
+
+    async def handler(job: Dict, report) -> Dict:
+        await gate.wait()
+
+        def add(processor: DocumentProcessor):
+            # As main.ingest_job does, under the collection's writer lock
+            if store.get(job["job_id"])["status"] == FAILED:
+                raise RuntimeError(DELETED)
+            processor.add_documents(chunks, job["job_id"])
+
+        await asyncio.to_thread(manager.update, job["collection"], add)
+        return {"doc_id": job["job_id"]}
+
+    manager.update("docs", _add(chunks, "existing"))
+    queue = JobQueue(store, handler, concurrency=1, max_queued=100)
+    await queue.start()
+    jobs = {}
+    for n, collection in enumerate(["docs", "docs", "other", "docs"]):
+        job_id = store.create(f"doc-{n}.txt", root / f"doc-{n}.txt", collection=collection)["job_id"]
+        await queue.submit(job_id)
+        jobs[job_id] = collection
+    while not any(store.get(job_id)["status"] == RUNNING for job_id in jobs):
+        await asyncio.sleep(0.01)
+    cancel = functools.partial(store.cancel_collection, "docs", DELETED)
+    await asyncio.to_thread(manager.delete, "docs", cancel)
+    gate.set()
+    finished = [await queue.wait(job_id) for job_id in jobs]
+    await queue.stop()
+    return {
+        "jobs": [(jobs[job["job_id"]], job["status"], job["error"]) for job in finished],
+        "docs_exists": manager.exists("docs"),
+        "other_documents": len(manager.get("other").list_documents()),
+    }
+
+
+def test_pending_jobs_of_a_deleted_collection_fail(tmp_path, chunks):
+    result = asyncio.run(_run_pending_jobs(tmp_path, chunks))
+
+    for collection, status, error in result["jobs"]:
+        expected = (FAILED, DELETED) if collection == "docs" else (COMPLETED, None)
+        assert (status, error) == expected, collection
+    assert not result["docs_exists"], "a job recreated the deleted collection"
+    assert result["other_documents"] == 1
@@ -0,0 +1,24 @@
+from app.context_builder import ContextBuilder, count_tokens
+
+HITS = [
+    (0.9, "Retrieval augmented generation grounds answers in indexed documents. It needs a search index."),
+    (0.5, "Unrelated text about the weather. It rained all week."),
+]
+
+
+def test_budget_keeps_best_sentences():
+    passages, stats = ContextBuilder(token_budget=20).build("how does retrieval augmented generation work", HITS)
+    assert passages[0].startswith("Retrieval augmented generation")
+    assert stats["tokens_out"] <= 20
+    assert not stats["truncated"]
+
+
+def test_budget_below_every_sentence_truncates_the_best_one():
+    passages, stats = ContextBuilder(token_budget=3).build("how does retrieval augmented generation work", HITS)
+    assert passages == ["Retrieval augmented generation"]
+    assert count_tokens(passages[0]) == 3
+    assert stats["truncated"] and stats["tokens_out"] == 3
+
+
+def test_no_hits_means_no_context():
+    assert ContextBuilder(token_budget=3).build("anything", [])[0] == []
@@ -0,0 +1,58 @@
+"""Hot reloads of indexes that are not used as saved.
+
+An index saved with one backend, or in the legacy ``documents.json`` layout, is
+rebuilt on load. Getting it again must neither hot-reload it nor bump its version,
+since nothing new was published on disk; a later publish is picked up once.
+"""
+import functools
+import json
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+
+from app.collection_manager import DEFAULT_COLLECTION, CollectionManager
+from app.document_processor import DocumentProcessor
+from benchmarks.synthetic import make_document
+
+
+@pytest.fixture(scope="module")
+def text():
+    return make_document(200_000, seed=1)
+
+
+def _manager(root: Path, backend: str) -> CollectionManager:
+    factory = functools.partial(DocumentProcessor, index_backend=backend)
+    return CollectionManager(root / "collections", factory, memory_budget_bytes=1 << 40, default_path=root)
+
+
+def _gets(manager: CollectionManager, times: int) -> List[Tuple[int, int]]:
+    """(version, hot reloads so far) after each of ``times`` gets."""
+    return [(manager.get(DEFAULT_COLLECTION).version, manager.hot_reloads) for _ in range(times)]
+
+
+def test_rebuilt_backend_is_not_reloaded(tmp_path, text):
+    writer = DocumentProcessor(index_backend="tfidf")
+    writer.create_index(writer.process_pasted_text(text))
+    writer.save_index(tmp_path)
+    reader = _manager(tmp_path, "incremental")
+
+    gets = _gets(reader, 3)
+    assert [version for version, _ in gets] == [gets[0][0]] * 3
+    assert [reloads for _, reloads in gets] == [gets[0][1]] * 3
+
+    # Another worker publishes a change; the reader must reload it once
+    writer.add_documents(writer.process_pasted_text(make_document(20_000, seed=2)))
+    writer.save_index(tmp_path)
+    (first_version, first_reloads), (second_version, second_reloads) = _gets(reader, 2)
+    assert first_reloads == gets[-1][1] + 1
+    assert first_version > gets[-1][0]
+    assert (second_version, second_reloads) == (first_version, first_reloads)
+
+
+def test_legacy_index_is_not_reloaded(tmp_path, text):
+    chunks = DocumentProcessor().process_pasted_text(text)
+    (tmp_path / "documents.json").write_text(json.dumps(chunks))
+
+    gets = _gets(_manager(tmp_path, "incremental"), 3)
+    assert gets == [gets[0]] * 3
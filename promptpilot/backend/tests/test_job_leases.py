@@ -0,0 +1,98 @@
+"""Several workers sharing one job table must run every job exactly once.
+
+Each JobQueue gets its own JobStore connection, like separate uvicorn workers.
+"""
+import asyncio
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+from app.jobs import COMPLETED, RUNNING, JobQueue, JobStore
+
+LEASE_S = 0.5
+
+
+def _queues(db: Path, workers: int, runs: Counter, delay_s: float) -> List[JobQueue]:
+    async def handler(job: Dict, report) -> Dict:
+        runs[job["job_id"]] += 1
+        await asyncio.sleep(delay_s)
+        return {"doc_id": job["job_id"]}
+
+    return [JobQueue(JobStore(db), handler, concurrency=2, max_queued=1000, lease_s=LEASE_S) for _ in range(workers)]
+
+
+async def _wait_until(condition, timeout_s: float) -> bool:
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+def test_store_is_shared_by_threads(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    job_id = store.create("doc.txt", tmp_path / "doc.txt")["job_id"]
+
+    def report(thread: int):
+        for n in range(50):
+            # Each update merges into the stored progress, so a lost update drops a key
+            store.update(job_id, progress={f"{thread}-{n}": n})
+
+    threads = [threading.Thread(target=report, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.get(job_id)["progress"]) == 8 * 50
+
+
+def test_shared_job_table_runs_each_job_once(tmp_path):
+    db = tmp_path / "jobs.db"
+
+    async def run():
+        store = JobStore(db)
+        job_ids = []
+        for n in range(40):
+            job = store.create(f"doc-{n}.txt", tmp_path / f"doc-{n}.txt")
+            if n % 4 == 0:
+                # Left running by a process that crashed before leases existed
+                store.update(job["job_id"], status=RUNNING, stage="extract")
+            job_ids.append(job["job_id"])
+        runs = Counter()
+        queues = _queues(db, 4, runs, delay_s=0.02)
+        await asyncio.gather(*(queue.start() for queue in queues))
+        completed = await _wait_until(
+            lambda: all(store.get(job_id)["status"] == COMPLETED for job_id in job_ids), timeout_s=60
+        )
+        await asyncio.gather(*(queue.stop() for queue in queues))
+        return completed, [runs[job_id] for job_id in job_ids]
+
+    completed, runs = asyncio.run(run())
+    assert completed
+    assert set(runs) == {1}
+
+
+def test_crashed_workers_job_is_resumed(tmp_path):
+    db = tmp_path / "jobs.db"
+
+    async def run():
+        store = JobStore(db)
+        runs = Counter()
+        crashed = _queues(db, 1, runs, delay_s=60)[0]
+        survivor = _queues(db, 1, runs, delay_s=0.02)[0]
+        await crashed.start()
+        job_id = store.create("crash.txt", tmp_path / "crash.txt")["job_id"]
+        await crashed.submit(job_id)
+        await _wait_until(lambda: runs[job_id] == 1, timeout_s=10)
+        # Die without stop(): the job stays running under a lease nobody renews
+        for task in crashed._workers:
+            task.cancel()
+        await survivor.start()
+        completed = await _wait_until(lambda: store.get(job_id)["status"] == COMPLETED, timeout_s=10 * LEASE_S)
+        await survivor.stop()
+        return completed, runs[job_id]
+
+    assert asyncio.run(run()) == (True, 2)
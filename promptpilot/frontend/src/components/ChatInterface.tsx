@@ -1,6 +1,7 @@
 "use client";
 
 import { useState, useEffect } from "react";
+import { waitForJobs } from "@/lib/uploadJobs";
 
 interface Message {
   role: "user" | "assistant";
@@ -192,7 +193,8 @@ export default function ChatInterface({
 
       const data = await response.json();
       setUploadProgress("Processing files...");
-      await new Promise((resolve) => setTimeout(resolve, 1000));
+      // Ingestion runs in the background; wait until the files are indexed
+      await waitForJobs(data.jobs, setUploadProgress);
 
       setUploadProgress("Upload complete!");
       files.forEach((file) => {
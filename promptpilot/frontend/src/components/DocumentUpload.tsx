@@ -1,6 +1,7 @@
 "use client";
 
 import { useState } from "react";
+import { waitForJobs } from "@/lib/uploadJobs";
 
 interface DocumentUploadProps {
   onUploadComplete: () => void;
@@ -112,11 +113,11 @@ export default function DocumentUpload({
       }
 
       const data = await response.json();
-      console.log("Upload successful:", data);
+      console.log("Upload accepted:", data);
       setUploadProgress("Processing files...");
 
-      // Wait a moment to show the processing message
-      await new Promise((resolve) => setTimeout(resolve, 1000));
+      // Ingestion runs in the background; wait until the files are indexed
+      await waitForJobs(data.jobs, setUploadProgress);
 
       setUploadProgress("Upload complete!");
       files.forEach((file) => onContentAdded("document", file.name));
@@ -0,0 +1,56 @@
+export interface UploadJob {
+  job_id: string;
+  filename: string;
+  status: "queued" | "running" | "completed" | "failed";
+  stage: string;
+  error: string | null;
+  progress: {
+    pages_extracted?: number | null;
+    chunks_produced?: number;
+    chunks_indexed?: number;
+  };
+}
+
+// Polls the backend until every ingestion job has completed, reporting the
+// current stage along the way. Throws if any job fails.
+export async function waitForJobs(
+  jobs: UploadJob[],
+  onProgress: (message: string) => void,
+  intervalMs = 1000
+): Promise<UploadJob[]> {
+  let pending = jobs;
+  const finished: UploadJob[] = [];
+
+  while (pending.length > 0) {
+    const latest = await Promise.all(
+      pending.map(async (job) => {
+        const response = await fetch(
+          `http://localhost:8000/api/jobs/${job.job_id}`
+        );
+        if (!response.ok) {
+          throw new Error(`Failed to fetch status for ${job.filename}`);
+        }
+        return (await response.json()) as UploadJob;
+      })
+    );
+
+    for (const job of latest) {
+      if (job.status === "failed") {
+        throw new Error(`Processing ${job.filename} failed: ${job.error}`);
+      }
+    }
+    finished.push(...latest.filter((job) => job.status === "completed"));
+    pending = latest.filter((job) => job.status !== "completed");
+
+    if (pending.length > 0) {
+      const job = pending[0];
+      const chunks = job.progress.chunks_produced;
+      onProgress(
+        `Processing ${job.filename}: ${job.stage}` +
+          (chunks ? ` (${chunks} chunks)` : "")
+      );
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  }
+  return finished;
+}